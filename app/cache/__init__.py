@@ -0,0 +1,300 @@
+import asyncio
+import os
+import tempfile
+import time
+from functools import lru_cache
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.cache.base import CacheBackend
+from app.cache.memory import MemoryBackend
+from app.cache.serialization import Versioned, dumps_key
+from app.metrics import CACHE_REQUESTS
+from app.tracing import add_span_event
+
+load_dotenv()
+
+# "memory" keeps every cache in its worker, "sqlite" shares them between the workers of a host and "redis" between
+# every worker and host
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+
+# Database file of the sqlite backend, put it in /dev/shm to keep it in memory
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "togetherwherever_cache.db"))
+CACHE_SQLITE_MAX_ENTRIES = int(os.getenv("CACHE_SQLITE_MAX_ENTRIES", 200000))
+
+# Server of the redis backend, and how long to wait for it before answering lookups as misses
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", 0.5))
+
+# Prefix of every key in the shared backends, so deployments can share a server
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "tw:")
+
+# Namespace versions outlive every entry of the namespace, entries are never kept longer than this
+NAMESPACE_TTL = 7 * 24 * 3600
+
+# Namespace versions kept in the memory of a worker when caches are not shared
+NAMESPACE_VERSIONS_MAXSIZE = int(os.getenv("NAMESPACE_VERSIONS_MAXSIZE", 100000))
+
+
+class NamespaceVersions(MemoryBackend):
+    """
+    Namespace versions of this process, evicting the least recently used namespace first.
+
+    A namespace whose version was evicted gets the highest version evicted so far, so the entries stored under its
+    forgotten version are never read again.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.evicted_version = 0
+
+    def on_evict(self, key: Hashable, item: Tuple[float, Any]):
+        self.evicted_version = max(self.evicted_version, item[1])
+
+    def get(self, key: Hashable) -> int:
+        version = super().get(key)
+
+        return self.evicted_version if version is None else version
+
+
+namespace_versions = NamespaceVersions(NAMESPACE_VERSIONS_MAXSIZE)
+
+
+@lru_cache(maxsize=None)
+def get_shared_backend() -> Optional[CacheBackend]:
+    """
+    Get the backend shared by the caches, from CACHE_BACKEND.
+
+    :return: The backend, None when every cache keeps its entries in memory.
+    """
+    if CACHE_BACKEND == "sqlite":
+        from app.cache.sqlite import SQLiteBackend
+        return SQLiteBackend(CACHE_SQLITE_PATH, CACHE_SQLITE_MAX_ENTRIES)
+
+    if CACHE_BACKEND == "redis":
+        from app.cache.redis import RedisBackend
+        return RedisBackend(CACHE_REDIS_URL, CACHE_REDIS_TIMEOUT)
+
+    if CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected memory, sqlite or redis.")
+
+    return None
+
+
+def get_namespace_key(namespace: str) -> Hashable:
+    """
+    Get the key of the version of a namespace in the backend of the namespace versions.
+
+    :param namespace: The namespace, e.g. trip_namespace(trip_id).
+    :return: The key.
+    """
+    return namespace if get_shared_backend() is None else f"{CACHE_KEY_PREFIX}namespace:{namespace}"
+
+
+def get_namespace_version(namespace: str) -> int:
+    """
+    Get the current version of a namespace, which every entry of the namespace is stored with.
+
+    :param namespace: The namespace, e.g. trip_namespace(trip_id).
+    :return: The version, 0 when the namespace was never invalidated.
+    """
+    return (get_shared_backend() or namespace_versions).get(get_namespace_key(namespace)) or 0
+
+
+async def invalidate_namespace(namespace: str):
+    """
+    Invalidate every entry stored in a namespace, in every cache and every worker sharing the backend.
+
+    The namespace moves to a new version, so its old entries no longer match it and are replaced or expire.
+
+    :param namespace: The namespace, e.g. trip_namespace(trip_id).
+    """
+    # Versions are never reused, even when an old version expired and the namespace restarted from 0
+    version = time.time_ns()
+    backend = get_shared_backend()
+
+    if backend is None:
+        namespace_versions.set(get_namespace_key(namespace), version, NAMESPACE_TTL)
+    else:
+        await asyncio.to_thread(backend.set, get_namespace_key(namespace), version, NAMESPACE_TTL)
+
+
+def trip_namespace(trip_id: int) -> str:
+    """
+    Get the namespace of the cache entries of a trip, invalidated when the trip changes.
+
+    :param trip_id: The ID of the trip.
+    :return: The namespace.
+    """
+    return f"trip:{trip_id}"
+
+
+class TTLCache:
+    """
+    Cache whose entries expire after a fixed time-to-live, stored in the backend set by CACHE_BACKEND.
+
+    With the memory backend every cache is an LRU of up to maxsize entries in its worker. With the sqlite and redis
+    backends the entries are serialized and shared, maxsize is then left to the backend. Tuples stored in shared
+    caches are read back as lists.
+
+    The async methods (aget, aset, adelete) are the ones to use from the event loop: shared backends block on their
+    storage, so they are run on a thread. The sync methods are for sync code and in-memory caches.
+
+    maxsize: Maximum number of entries kept in memory, the least recently used entry is evicted first
+    ttl: Number of seconds an entry stays valid
+    name: Name of the cache in its shared keys and in the cache_requests_total metric, required for shared caches
+    shared: False to keep the cache in memory whatever the backend, for lookups too frequent for a round trip
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, name: Optional[str] = None, shared: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        shared_backend = get_shared_backend() if shared else None
+        if shared_backend is not None and name is None:
+            raise ValueError("Shared caches need a name.")
+        self.backend = shared_backend or MemoryBackend(maxsize)
+        self.is_shared = shared_backend is not None
+        self._hits = CACHE_REQUESTS.labels(name, "hit") if name else None
+        self._misses = CACHE_REQUESTS.labels(name, "miss") if name else None
+
+    def get_key(self, key: Hashable, namespace: Optional[str] = None):
+        """
+        Get the key of an entry in the backend.
+
+        :param key: The cache key.
+        :param namespace: The namespace of the entry.
+        :return: The backend key.
+        """
+        if not self.is_shared:
+            return key if namespace is None else (namespace, key)
+
+        prefix = f"{CACHE_KEY_PREFIX}{self.name}:"
+        if namespace is not None:
+            prefix += f"{namespace}:"
+
+        return prefix + dumps_key(key)
+
+    async def run(self, func: Callable, key: Hashable, namespace: Optional[str], *args) -> Any:
+        """
+        Run a method from the event loop, on a thread when it reads or writes a shared backend.
+
+        :param func: The method, e.g. self.get.
+        :param key: The cache key.
+        :param namespace: The namespace of the entry, whose version is in the shared backend if there is one.
+        :param args: The other arguments of the method.
+        :return: The result of the method.
+        """
+        if not self.is_shared and (namespace is None or get_shared_backend() is None):
+            return func(key, *args, namespace=namespace)
+
+        return await asyncio.to_thread(func, key, *args, namespace=namespace)
+
+    def get(self, key: Hashable, default: Any = None, namespace: Optional[str] = None) -> Any:
+        """
+        Get a value from the cache.
+
+        Entries of a namespace are stored with the namespace version, they are found only when it is still current. In
+        shared caches the version and the entry are read in a single round trip.
+
+        :param key: The cache key.
+        :param default: The value returned when the key is missing or expired.
+        :param namespace: The namespace the value was stored in.
+        :return: The cached value or the default.
+        """
+        backend_key = self.get_key(key, namespace)
+
+        if namespace is None:
+            value = self.backend.get(backend_key)
+        else:
+            if self.is_shared:
+                version, entry = self.backend.get_many([get_namespace_key(namespace), backend_key])
+                version = version or 0
+            else:
+                version, entry = get_namespace_version(namespace), self.backend.get(backend_key)
+            value = entry.value if entry is not None and entry.version == version else None
+
+        self.record_lookup(value)
+
+        return default if value is None else value
+
+    def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        """
+        Get several values from the cache, in a single round trip in shared caches.
+
+        :param keys: The cache keys, outside of any namespace.
+        :param default: The value returned for the keys missing or expired.
+        :return: The cached value or the default of every key.
+        """
+        values = self.backend.get_many([self.get_key(key) for key in keys])
+
+        for value in values:
+            self.record_lookup(value)
+
+        return [default if value is None else value for value in values]
+
+    def record_lookup(self, value: Any):
+        """
+        Count a lookup as a hit or a miss in the metrics and the current trace span.
+
+        :param value: The value found, None for a miss.
+        """
+        if self._hits is not None:
+            (self._misses if value is None else self._hits).inc()
+            add_span_event("cache.lookup", cache__name=self.name, cache__hit=value is not None)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, namespace: Optional[str] = None):
+        """
+        Store a value in the cache.
+
+        :param key: The cache key.
+        :param value: The value to store, JSON serializable or bytes for shared caches.
+        :param ttl: Time-to-live in seconds, defaults to the cache TTL.
+        :param namespace: The namespace to store the value in, invalidated with invalidate_namespace.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if namespace is not None:
+            ttl = min(ttl, NAMESPACE_TTL)
+            value = Versioned(get_namespace_version(namespace), value)
+
+        self.backend.set(self.get_key(key, namespace), value, ttl)
+
+    def delete(self, key: Hashable, namespace: Optional[str] = None):
+        """
+        Remove a value from the cache.
+
+        :param key: The cache key.
+        :param namespace: The namespace the value was stored in.
+        """
+        self.backend.delete(self.get_key(key, namespace))
+
+    def clear(self):
+        self.backend.clear(f"{CACHE_KEY_PREFIX}{self.name}:" if self.is_shared else "")
+
+    async def aget(self, key: Hashable, default: Any = None, namespace: Optional[str] = None) -> Any:
+        """
+        Get a value from the cache without blocking the event loop, see get.
+        """
+        return await self.run(self.get, key, namespace, default)
+
+    async def aget_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        """
+        Get several values from the cache without blocking the event loop, see get_many.
+        """
+        if not self.is_shared:
+            return self.get_many(keys, default)
+
+        return await asyncio.to_thread(self.get_many, keys, default)
+
+    async def aset(self, key: Hashable, value: Any, ttl: Optional[float] = None, namespace: Optional[str] = None):
+        """
+        Store a value in the cache without blocking the event loop, see set.
+        """
+        await self.run(self.set, key, namespace, value, ttl)
+
+    async def adelete(self, key: Hashable, namespace: Optional[str] = None):
+        """
+        Remove a value from the cache without blocking the event loop, see delete.
+        """
+        await self.run(self.delete, key, namespace)
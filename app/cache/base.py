@@ -0,0 +1,54 @@
+from typing import Any, List, Optional
+
+
+class CacheBackend:
+    """
+    Storage of the cache entries, with an expiry per entry.
+
+    Backends never raise when their storage is unavailable, the lookup is then answered as a miss so requests fall back
+    to computing the value. Their methods block, TTLCache runs them on a thread when called from the event loop.
+    """
+
+    def get(self, key) -> Optional[Any]:
+        """
+        Get a value.
+
+        :param key: The key, a tuple for in-memory backends and a string for shared backends.
+        :return: The value, None when the key is missing or expired.
+        """
+        raise NotImplementedError
+
+    def get_many(self, keys: List) -> List[Optional[Any]]:
+        """
+        Get several values, in a single round trip in shared backends.
+
+        :param keys: The keys.
+        :return: The value of every key, None when the key is missing or expired.
+        """
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value: Any, ttl: float):
+        """
+        Store a value.
+
+        :param key: The key.
+        :param value: The value, not None.
+        :param ttl: Time-to-live in seconds.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Remove a value.
+
+        :param key: The key.
+        """
+        raise NotImplementedError
+
+    def clear(self, prefix: str = ""):
+        """
+        Remove every value, or the values whose key starts with a prefix in shared backends.
+
+        :param prefix: The key prefix.
+        """
+        raise NotImplementedError
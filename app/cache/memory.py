@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional, Tuple
+
+from app.cache.base import CacheBackend
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU storage, values are kept as they are without serialization.
+
+    maxsize: Maximum number of entries kept, the least recently used entry is evicted first. None for no limit, expired
+        entries are then only removed when looked up.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._data[key]
+                item = None
+            elif item is not None:
+                self._data.move_to_end(key)
+
+        return None if item is None else item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self.on_evict(*self._data.popitem(last=False))
+
+    def on_evict(self, key: Hashable, item: Tuple[float, Any]):
+        """
+        Called with the lock held when the least recently used entry is evicted to make room.
+
+        :param key: The key of the entry.
+        :param item: The expiry and value of the entry.
+        """
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Any, List, Optional
+
+from app.cache.base import CacheBackend
+from app.cache.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Keys deleted per command when clearing a cache
+CLEAR_BATCH_SIZE = 500
+
+# Seconds the server is left alone after an error, so an unreachable server does not slow every request down
+RETRY_AFTER_ERROR_SECONDS = 5
+
+
+class RedisBackend(CacheBackend):
+    """
+    Storage in a Redis server, or any server speaking its protocol, shared by every worker and host.
+
+    Requires the redis package, which is only imported when this backend is used.
+
+    url: URL of the server, e.g. redis://localhost:6379/0
+    timeout: Seconds to wait for the server before answering a lookup as a miss
+    """
+
+    def __init__(self, url: str, timeout: float):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package: pip install redis") from e
+
+        self.errors = redis.RedisError
+        # RESP2 is spoken by every Redis-protocol server, including scripts/mock_redis.py
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout, protocol=2)
+        self.retry_at = 0.0
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def on_error(self, action: str, error: Exception):
+        logger.warning("Error %s the Redis cache, bypassing it for %ss: %s", action, RETRY_AFTER_ERROR_SECONDS, error)
+        self.retry_at = time.monotonic() + RETRY_AFTER_ERROR_SECONDS
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.is_available():
+            return None
+
+        try:
+            data = self.client.get(key)
+        except self.errors as e:
+            self.on_error("reading", e)
+            return None
+
+        return None if data is None else loads(data)
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not self.is_available():
+            return [None] * len(keys)
+
+        try:
+            values = self.client.mget(keys)
+        except self.errors as e:
+            self.on_error("reading", e)
+            return [None] * len(keys)
+
+        return [None if data is None else loads(data) for data in values]
+
+    def set(self, key: str, value: Any, ttl: float):
+        # Redis rejects expiries that are not positive
+        if ttl <= 0 or not self.is_available():
+            return
+
+        try:
+            self.client.set(key, dumps(value), px=max(int(ttl * 1000), 1))
+        except self.errors as e:
+            self.on_error("writing", e)
+
+    def delete(self, key: str):
+        if not self.is_available():
+            return
+
+        try:
+            self.client.delete(key)
+        except self.errors as e:
+            self.on_error("writing", e)
+
+    def clear(self, prefix: str = ""):
+        if not self.is_available():
+            return
+
+        try:
+            keys = []
+            for key in self.client.scan_iter(match=f"{prefix}*", count=CLEAR_BATCH_SIZE):
+                keys.append(key)
+                if len(keys) == CLEAR_BATCH_SIZE:
+                    self.client.delete(*keys)
+                    keys = []
+            if keys:
+                self.client.delete(*keys)
+        except self.errors as e:
+            self.on_error("writing", e)
@@ -0,0 +1,84 @@
+import struct
+import zlib
+from typing import Any, NamedTuple
+
+import orjson
+
+# First byte of every serialized value
+FORMAT_JSON = 0
+FORMAT_BYTES = 1
+FLAG_VERSIONED = 0x40
+FLAG_COMPRESSED = 0x80
+
+# Namespace version of a versioned value, between the first byte and the data
+VERSION_STRUCT = struct.Struct(">Q")
+
+# Values larger than this are compressed, smaller ones rarely shrink enough to pay for decompressing them
+COMPRESS_MIN_BYTES = 1024
+
+
+class Versioned(NamedTuple):
+    """
+    Value of an entry stored in a namespace, with the version of the namespace it was stored under
+
+    version: The namespace version
+    value: The value
+    """
+    version: int
+    value: Any
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serialize a cache value: bytes as they are (e.g. rendered responses), other values as JSON, compressed with zlib
+    when they are large.
+
+    Tuples are read back as lists, callers unpacking them are not affected.
+
+    :param value: The value, bytes or JSON serializable, or a Versioned one of them.
+    :return: The serialized value.
+    """
+    if isinstance(value, Versioned):
+        data = dumps(value.value)
+        return bytes((data[0] | FLAG_VERSIONED,)) + VERSION_STRUCT.pack(value.version) + data[1:]
+
+    if isinstance(value, bytes):
+        value_format, data = FORMAT_BYTES, value
+    else:
+        value_format, data = FORMAT_JSON, orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            value_format, data = value_format | FLAG_COMPRESSED, compressed
+
+    return bytes((value_format,)) + data
+
+
+def loads(data: bytes) -> Any:
+    """
+    Deserialize a cache value written by dumps.
+
+    :param data: The serialized value.
+    :return: The value.
+    """
+    value_format, data = data[0], data[1:]
+
+    if value_format & FLAG_VERSIONED:
+        version, = VERSION_STRUCT.unpack_from(data)
+        return Versioned(version, loads(bytes((value_format & ~FLAG_VERSIONED,)) + data[VERSION_STRUCT.size:]))
+
+    if value_format & FLAG_COMPRESSED:
+        data = zlib.decompress(data)
+
+    return data if value_format & ~FLAG_COMPRESSED == FORMAT_BYTES else orjson.loads(data)
+
+
+def dumps_key(key: Any) -> str:
+    """
+    Serialize a cache key, e.g. a tuple of IDs, to a string.
+
+    :param key: The key, JSON serializable.
+    :return: The serialized key.
+    """
+    return orjson.dumps(key).decode()
@@ -0,0 +1,120 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional
+
+from app.cache.base import CacheBackend
+from app.cache.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Expired entries are removed, and the cache trimmed to its maximum size, every this many writes of a process
+PRUNE_INTERVAL = 1000
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Storage in a local SQLite database shared by the workers of a host, e.g. in /dev/shm to keep it in memory.
+
+    The database is in WAL mode so lookups are not blocked by the writes of other workers. Every thread opens its own
+    connection.
+
+    path: Path of the database file, created if it does not exist
+    max_entries: Maximum number of entries kept, the entries closest to expiry are evicted first
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current thread, opening it and creating the table on first use.
+
+        :return: The connection.
+        """
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            # Autocommit, every statement is its own transaction
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+            self._local.connection = connection
+
+        return connection
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            row = self.get_connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Error reading the SQLite cache: %s", e)
+            return None
+
+        return None if row is None else loads(row[0])
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        try:
+            rows = dict(self.get_connection().execute(
+                f"SELECT key, value FROM cache WHERE key IN ({', '.join('?' * len(keys))}) AND expires_at > ?",
+                (*keys, time.time())
+            ).fetchall())
+        except sqlite3.Error as e:
+            logger.warning("Error reading the SQLite cache: %s", e)
+            return [None] * len(keys)
+
+        return [None if key not in rows else loads(rows[key]) for key in keys]
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            connection = self.get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, dumps(value), time.time() + ttl)
+            )
+            if next(self._writes) % PRUNE_INTERVAL == 0:
+                self.prune(connection)
+        except sqlite3.Error as e:
+            logger.warning("Error writing the SQLite cache: %s", e)
+
+    def prune(self, connection: sqlite3.Connection):
+        """
+        Remove the expired entries, then the entries closest to expiry while there are more than max_entries.
+
+        :param connection: The connection.
+        """
+        connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        excess = connection.execute("SELECT count(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)", (excess,)
+            )
+
+    def delete(self, key: str):
+        try:
+            self.get_connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("Error writing the SQLite cache: %s", e)
+
+    def clear(self, prefix: str = ""):
+        try:
+            # Keys only contain the prefix and JSON, substr avoids escaping the LIKE wildcards of the prefix
+            self.get_connection().execute(
+                "DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+        except sqlite3.Error as e:
+            logger.warning("Error writing the SQLite cache: %s", e)
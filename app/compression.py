@@ -0,0 +1,132 @@
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from starlette.datastructures import MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Optional, responses are only compressed with gzip without it
+    brotli = None
+
+load_dotenv()
+
+# Responses smaller than this are sent as they are, compressing them saves less than it costs
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+
+# Compression levels, from 1 (fastest) to 9 for gzip and 11 for brotli
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+# Larger responses are compressed in a worker thread, so the event loop keeps serving other requests meanwhile
+THREAD_MIN_BYTES = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def get_accepted_encoding(scope) -> Optional[str]:
+    """
+    Choose the encoding of a response from the Accept-Encoding header of its request, brotli when available.
+
+    :param scope: The ASGI scope of the request.
+    :return: "br", "gzip", or None to send the response uncompressed.
+    """
+    accept_encoding = ""
+    for name, value in scope["headers"]:
+        if name == b"accept-encoding":
+            accept_encoding = value.decode("latin-1").lower()
+            break
+
+    accepted = {}
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            accepted[encoding.strip()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+
+    default_quality = accepted.get("*", 0)
+    if brotli is not None and accepted.get("br", default_quality) > 0:
+        return "br"
+    if accepted.get("gzip", default_quality) > 0:
+        return "gzip"
+
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a response body.
+
+    :param body: The body.
+    :param encoding: "br" or "gzip".
+    :return: The compressed body.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON and text responses of at least COMPRESSION_MIN_BYTES with brotli or gzip.
+
+    Streamed responses, e.g. the NDJSON planning details, are sent uncompressed so every record reaches the client as
+    soon as it is ready. ETags of compressed responses are made weak, as the bytes differ from the uncompressed ones.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        encoding = get_accepted_encoding(scope) if scope["type"] == "http" else None
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+
+            # The response start is held back until the first body message tells whether it is streamed
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+
+            if (message.get("more_body", False) or len(body) < COMPRESSION_MIN_BYTES
+                    or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= THREAD_MIN_BYTES:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+
+            await send(start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1 +1,3 @@
-from app.database.connection import engine, SessionLocal, get_db
+from app.database.connection import engine, SessionLocal, get_db, async_engine, AsyncSessionLocal, get_async_db
+from app.database.routing import get_async_read_db, get_trip_read_db, get_user_read_db, record_write
+from app.database.instrumentation import query_budget
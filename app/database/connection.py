@@ -2,6 +2,8 @@ import os
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
 load_dotenv()
@@ -9,12 +11,70 @@ load_dotenv()
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Connection pools. Each engine has its own pool: the async engine and every replica are sized by DB_POOL_SIZE and
+# DB_MAX_OVERFLOW, while the sync engine only runs the startup migrations and the scripts, so it keeps a small pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", 1))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", 2))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Async drivers used for each database backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_engine_options(url: URL, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> dict:
+    """
+    Get the connection pool options of an engine.
+
+    :param url: The database URL.
+    :param pool_size: The number of connections kept open by the pool of the engine.
+    :param max_overflow: The number of connections the pool may open on top of pool_size.
+    :return: Keyword arguments for create_engine and create_async_engine.
+    """
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+
+    # SQLite uses its own pool classes, which are not sized
+    if url.get_backend_name() != "sqlite":
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=DB_POOL_TIMEOUT)
+
+    return options
+
+
+def get_async_url(url: str) -> URL:
+    """
+    Get the async driver URL of a database URL, e.g. postgresql:// becomes postgresql+asyncpg://.
+
+    :param url: The database URL.
+    :return: The database URL using the async driver.
+    """
+    url = make_url(url)
+
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_url(DATABASE_URL)
+
+# Create the SQLAlchemy engine, used by the startup migrations and the scripts
+engine = create_engine(
+    DATABASE_URL,
+    **get_engine_options(make_url(DATABASE_URL), pool_size=DB_SYNC_POOL_SIZE, max_overflow=DB_SYNC_MAX_OVERFLOW)
+)
+
+# Async engine, used by the endpoints so they do not block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **get_engine_options(make_url(ASYNC_DATABASE_URL)))
 
 # SessionLocal is used for creating database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Loaded objects stay usable after a commit, as async sessions cannot lazy load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 # Dependency to get DB session
 def get_db():
@@ -23,3 +83,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
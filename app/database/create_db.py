@@ -1,8 +1,60 @@
-from sqlalchemy import inspect
+import os
+
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
 from sqlalchemy_utils import database_exists, create_database
 
 from app.database.connection import DATABASE_URL, engine
-from app.models import Base
+
+# Migrations live next to this module, so they are found without alembic.ini (the Docker image only ships ./app)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Revision matching the schema created by Base.metadata.create_all before migrations were introduced
+BASELINE_REVISION = "0001"
+
+# Key of the Postgres advisory lock held while migrating, so replicas starting together migrate one at a time
+MIGRATIONS_LOCK_KEY = 804_211_337
+
+
+def get_alembic_config() -> Config:
+    """
+    Get the Alembic configuration of the application migrations.
+
+    :return: The Alembic configuration.
+    """
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+
+    return config
+
+
+def get_head_revision(config: Config) -> str:
+    """
+    Get the latest migration revision, from the migration scripts.
+
+    :param config: The Alembic configuration.
+    :return: The head revision.
+    """
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def get_current_revision(connection: Connection) -> Optional[str]:
+    """
+    Get the migration revision the database schema is at.
+
+    :param connection: The database connection.
+    :return: The revision, None when the database has no alembic_version table.
+    """
+    if connection.execute(text("SELECT to_regclass('alembic_version')")).scalar() is None:
+        return None
+
+    return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
 
 
 def check_tables():
@@ -23,23 +75,68 @@ def check_tables():
         print("All required tables exist.")
 
 
+def run_migrations():
+    """
+    Upgrade the database schema to the latest migration.
+
+    The migrations run in one transaction holding an advisory lock, so when several containers start at once
+    one migrates and the others wait for it, then find the schema current.
+    Databases created before migrations were introduced have the tables but no alembic_version table,
+    they are stamped with the baseline revision so only the later migrations are applied.
+
+    :return: None
+    """
+    config = get_alembic_config()
+
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+
+        head_revision = get_head_revision(config)
+        if get_current_revision(connection) == head_revision:
+            print(f"Database schema was migrated to revision {head_revision} meanwhile.")
+            return
+
+        config.attributes["connection"] = connection
+
+        tables = set(inspect(connection).get_table_names())
+        if "trips" in tables and "alembic_version" not in tables:
+            print(f"Existing schema without migrations found. Stamping revision {BASELINE_REVISION}...")
+            command.stamp(config, BASELINE_REVISION)
+
+        command.upgrade(config, "head")
+
+
 def setup_database():
     """
-    Set up the database by creating it if it does not exist and creating tables if they do not exist.
+    Set up the database by creating it if it does not exist and migrating its schema to the latest revision.
+
+    Runs before every start of the app, so when the schema is current it only reads the alembic_version row.
 
     :return: None
     """
-    # Check if the database exists, create it if not
-    if not database_exists(DATABASE_URL):
+    head_revision = get_head_revision(get_alembic_config())
+
+    try:
+        with engine.connect() as connection:
+            current_revision = get_current_revision(connection)
+    except OperationalError:
+        # Checking whether the database exists connects to the server's default database, only do it when
+        # connecting to ours failed
+        if database_exists(DATABASE_URL):
+            raise
+
         print("Database does not exist. Creating database...")
         create_database(DATABASE_URL)
         print("Database created successfully!")
-    else:
-        print("Database already exists.")
+        current_revision = None
+
+    if current_revision == head_revision:
+        print(f"Database schema is up to date (revision {head_revision}).")
+        return
 
-    # Create tables if they do not exist
-    print("Checking and creating tables...")
-    Base.metadata.create_all(bind=engine)
+    # Apply pending migrations
+    print(f"Migrating database schema from revision {current_revision} to {head_revision}...")
+    run_migrations()
     check_tables()
 
 
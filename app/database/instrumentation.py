@@ -0,0 +1,310 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.database.connection import (
+    DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_SYNC_MAX_OVERFLOW, DB_SYNC_POOL_SIZE, async_engine, engine, get_engine_options,
+)
+from app.database.routing import replica_engines
+from app.metrics import (
+    DB_POOL_CONNECTIONS_IN_USE, DB_POOL_CONNECTIONS_MAX, DB_POOL_CONNECTIONS_OPEN, REQUEST_DB_DURATION,
+    REQUEST_DB_QUERIES, get_route_path,
+)
+from app.tracing import TRACING_ENABLED, tracer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Add the query count, DB time and repeated statements of every request as X-DB-* response headers
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "false").lower() == "true"
+
+# Log the query count and DB time of every request as a JSON line
+SQL_METRICS_LOG = os.getenv("SQL_METRICS_LOG", "false").lower() == "true"
+
+# A statement run this many times in one request is logged as a likely N+1 query
+SQL_REPEATED_QUERY_THRESHOLD = int(os.getenv("SQL_REPEATED_QUERY_THRESHOLD", 5))
+
+# What to do when an endpoint exceeds its query budget: "off", "warn" to log it or "raise" to fail (tests)
+SQL_QUERY_BUDGET_MODE = os.getenv("SQL_QUERY_BUDGET_MODE", "warn").lower()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised in "raise" budget mode when a request runs more queries than its endpoint's budget.
+    """
+
+
+@dataclass
+class QueryStats:
+    """
+    SQL statements run while handling a request
+
+    count: Number of statements executed, an executemany counts once
+    duration: Total time spent executing them, in seconds
+    fingerprints: Number of executions of each statement, with literals and IN lists normalized
+    budget: Maximum number of statements the endpoint may run, None when unlimited
+    """
+    count: int = 0
+    duration: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+    budget: Optional[int] = None
+
+    @property
+    def repeated(self) -> int:
+        """
+        Number of executions of statements that already ran in the request.
+        """
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+    def most_repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """
+        Get the statements run at least a number of times.
+
+        :param threshold: The minimum number of executions.
+        :return: The statements and their number of executions, most executed first.
+        """
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count >= threshold]
+
+
+# Statistics of the request being handled, None outside of requests
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@lru_cache(maxsize=1024)
+def get_statement_fingerprint(statement: str) -> str:
+    """
+    Normalize a SQL statement so executions differing only in their values are counted together.
+
+    :param statement: The SQL statement.
+    :return: The statement with literals replaced by ? and IN lists collapsed.
+    """
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+    statement = re.sub(r"\bIN \([^()]*\)", "IN (...)", statement, flags=re.IGNORECASE)
+
+    return " ".join(statement.split())
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+
+    if query_stats.get() is not None:
+        context._query_start_time = time.perf_counter()
+
+    if TRACING_ENABLED:
+        # Literals are replaced in the recorded statement, so no user data ends up in the traces
+        operation = statement.split(None, 1)[0].upper() if statement.strip() else "SQL"
+        attributes = {
+            "db.system.name": conn.engine.dialect.name,
+            "db.namespace": conn.engine.url.database,
+            "db.operation.name": operation,
+            "db.query.text": get_statement_fingerprint(statement),
+            "server.address": conn.engine.url.host,
+        }
+        context._trace_span = tracer.start_span(operation, kind=SpanKind.CLIENT, attributes={
+            key: value for key, value in attributes.items() if value is not None
+        })
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace_span = getattr(context, "_trace_span", None)
+    if trace_span is not None:
+        trace_span.end()
+
+    stats = query_stats.get()
+    if stats is None:
+        return
+
+    stats.count += 1
+    stats.fingerprints[get_statement_fingerprint(statement)] += 1
+
+    start_time = getattr(context, "_query_start_time", None)
+    if start_time is not None:
+        stats.duration += time.perf_counter() - start_time
+
+
+def handle_error(exception_context):
+    trace_span = getattr(exception_context.execution_context, "_trace_span", None)
+    if trace_span is not None:
+        trace_span.record_exception(exception_context.original_exception)
+        trace_span.set_status(Status(StatusCode.ERROR))
+        trace_span.end()
+
+
+def instrument_engine(sync_engine: Engine, name: str, pool_size: int = DB_POOL_SIZE,
+                      max_overflow: int = DB_MAX_OVERFLOW):
+    """
+    Record the statements executed by an engine into the statistics of the current request and as trace spans, and
+    the use of its connection pool into the db_pool_* metrics.
+
+    :param sync_engine: The engine, or the sync_engine of an async engine.
+    :param name: Name of the engine in the metrics.
+    :param pool_size: The pool_size the engine was created with, see get_engine_options.
+    :param max_overflow: The max_overflow the engine was created with, see get_engine_options.
+    """
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+    # Counted from pool events rather than read from the pool, so the gauges of every worker add up
+    pool = sync_engine.pool
+    in_use = DB_POOL_CONNECTIONS_IN_USE.labels(name)
+    opened = DB_POOL_CONNECTIONS_OPEN.labels(name)
+    pool_options = get_engine_options(sync_engine.url, pool_size, max_overflow)
+    if "pool_size" in pool_options:
+        # An unlimited overflow (-1) is not counted
+        DB_POOL_CONNECTIONS_MAX.labels(name).set(pool_options["pool_size"] + max(pool_options["max_overflow"], 0))
+
+    event.listen(pool, "checkout", lambda *args: in_use.inc())
+    event.listen(pool, "checkin", lambda *args: in_use.dec())
+    event.listen(pool, "connect", lambda *args: opened.inc())
+    event.listen(pool, "close", lambda *args: opened.dec())
+    event.listen(pool, "close_detached", lambda *args: opened.dec())
+
+
+instrument_engine(engine, "primary", DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW)
+instrument_engine(async_engine.sync_engine, "primary_async")
+for number, replica in enumerate(replica_engines, start=1):
+    instrument_engine(replica.sync_engine, f"replica_{number}")
+
+
+def query_budget(max_queries: int):
+    """
+    Create a dependency setting the maximum number of SQL statements an endpoint may run per request.
+
+    Usage: @router.get("/", dependencies=[Depends(query_budget(10))])
+
+    :param max_queries: The query budget.
+    :return: The dependency.
+    """
+    async def set_query_budget():
+        stats = query_stats.get()
+        if stats is not None:
+            stats.budget = max_queries
+
+    return set_query_budget
+
+
+def get_request_path(scope) -> str:
+    """
+    Get the route path of a request, e.g. /api/trips/{trip_id}, or its URL path when no route matched.
+
+    :param scope: The ASGI scope of the request.
+    :return: The path.
+    """
+    route = scope.get("route")
+
+    return getattr(route, "path", scope["path"])
+
+
+def get_budget_overrun(scope, stats: QueryStats) -> Optional[str]:
+    """
+    Check the statements run by a request against its endpoint's query budget.
+
+    :param scope: The ASGI scope of the request.
+    :param stats: The SQL statistics of the request.
+    :return: A message describing the overrun, None when the request is within its budget or budgets are off.
+    """
+    if SQL_QUERY_BUDGET_MODE == "off" or stats.budget is None or stats.count <= stats.budget:
+        return None
+
+    return f"{scope['method']} {get_request_path(scope)} ran {stats.count} queries, over its budget of {stats.budget}"
+
+
+class SQLInstrumentationMiddleware:
+    """
+    ASGI middleware collecting the SQL statistics of every HTTP request.
+
+    The statistics are added as response headers when SQL_DEBUG_HEADERS is set, logged when SQL_METRICS_LOG is set,
+    and checked against the endpoint's query budget once the response, including streamed bodies, is complete.
+
+    In "raise" budget mode the budget is also checked before the response starts, so the request fails with a 500
+    instead of a response the client already received. Statements run while a body is streamed come after that point,
+    so going over the budget there is only logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        status_code = None
+
+        async def send_with_stats(message):
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+                if SQL_QUERY_BUDGET_MODE == "raise":
+                    overrun = get_budget_overrun(scope, stats)
+                    if overrun is not None:
+                        raise QueryBudgetExceeded(overrun)
+
+                if SQL_DEBUG_HEADERS:
+                    message.setdefault("headers", [])
+                    message["headers"] = [
+                        *message["headers"],
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.duration * 1000:.1f}".encode()),
+                        (b"x-db-repeated-queries", str(stats.repeated).encode()),
+                    ]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            query_stats.reset(token)
+
+        self.report(scope, stats, status_code)
+
+    @staticmethod
+    def report(scope, stats: QueryStats, status_code: Optional[int]):
+        """
+        Log the statistics of a completed request and check its query budget.
+
+        :param scope: The ASGI scope of the request.
+        :param stats: The SQL statistics of the request.
+        :param status_code: The response status code.
+        """
+        path = get_request_path(scope)
+
+        REQUEST_DB_QUERIES.labels(scope["method"], get_route_path(scope)).observe(stats.count)
+        REQUEST_DB_DURATION.labels(scope["method"], get_route_path(scope)).observe(stats.duration)
+
+        if SQL_METRICS_LOG:
+            logger.info(json.dumps({
+                "method": scope["method"],
+                "path": path,
+                "status": status_code,
+                "db_queries": stats.count,
+                "db_time_ms": round(stats.duration * 1000, 1),
+                "db_repeated_queries": stats.repeated,
+            }))
+
+        for statement, count in stats.most_repeated(SQL_REPEATED_QUERY_THRESHOLD):
+            logger.warning("Possible N+1 query in %s %s: ran %d times: %s", scope["method"], path, count, statement[:200])
+
+        overrun = get_budget_overrun(scope, stats)
+        if overrun is not None:
+            logger.warning(overrun)
@@ -0,0 +1,116 @@
+"""Initial schema, as created by Base.metadata.create_all before migrations were introduced
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("first_name", sa.String(), nullable=True),
+        sa.Column("last_name", sa.String(), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=True),
+        sa.Column("preferences", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "trips",
+        sa.Column("trip_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("owner", sa.String(), nullable=False),
+        sa.Column("trip_name", sa.String(), nullable=True),
+        sa.Column("dest_name", sa.String(), nullable=True),
+        sa.Column("dest_id", sa.String(), nullable=False),
+        sa.Column("dest_lat", sa.Float(), nullable=False),
+        sa.Column("dest_lon", sa.Float(), nullable=False),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=False),
+        sa.Column("duration", sa.Integer(), nullable=True),
+        sa.Column("companion", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["owner"], ["users.username"]),
+        sa.PrimaryKeyConstraint("trip_id"),
+    )
+    op.create_index("ix_trips_trip_id", "trips", ["trip_id"])
+
+    op.create_table(
+        "trip_days",
+        sa.Column("trip_day_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("trip_id", sa.Integer(), nullable=False),
+        sa.Column("day_number", sa.Integer(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=True),
+        sa.Column("vote_status", sa.Enum("pending", "voting", "complete", name="vote_status_enum"), nullable=False),
+        sa.ForeignKeyConstraint(["trip_id"], ["trips.trip_id"]),
+        sa.PrimaryKeyConstraint("trip_day_id"),
+    )
+    op.create_index("ix_trip_days_trip_day_id", "trip_days", ["trip_day_id"])
+
+    op.create_table(
+        "activities",
+        sa.Column("activity_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("trip_day_id", sa.Integer(), nullable=False),
+        sa.Column("activity_dest_id", sa.String(), nullable=False),
+        sa.Column("activity_dest_name", sa.String(), nullable=True),
+        sa.Column("activity_dest_lat", sa.Float(), nullable=True),
+        sa.Column("activity_dest_lon", sa.Float(), nullable=True),
+        sa.Column("activity_number", sa.Integer(), nullable=True),
+        sa.Column("activity_period", sa.Enum("morning", "afternoon", "night", name="activity_period_enum"),
+                  nullable=False),
+        sa.ForeignKeyConstraint(["trip_day_id"], ["trip_days.trip_day_id"]),
+        sa.PrimaryKeyConstraint("activity_id"),
+    )
+    op.create_index("ix_activities_activity_id", "activities", ["activity_id"])
+
+    op.create_table(
+        "recommended_places",
+        sa.Column("recommended_place_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("trip_id", sa.Integer(), nullable=False),
+        sa.Column("trip_day_id", sa.Integer(), nullable=False),
+        sa.Column("dest_id", sa.String(), nullable=False),
+        sa.Column("dest_name", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["trip_id"], ["trips.trip_id"]),
+        sa.ForeignKeyConstraint(["trip_day_id"], ["trip_days.trip_day_id"]),
+        sa.PrimaryKeyConstraint("recommended_place_id"),
+    )
+    op.create_index("ix_recommended_places_recommended_place_id", "recommended_places", ["recommended_place_id"])
+
+    op.create_table(
+        "vote_scores",
+        sa.Column("vote_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("recommended_place_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("vote_score", sa.Integer(), nullable=False),
+        sa.Column("is_voted", sa.Boolean(), nullable=True),
+        sa.CheckConstraint("vote_score >= 0 AND vote_score <= 10", name="check_vote_score"),
+        sa.ForeignKeyConstraint(["recommended_place_id"], ["recommended_places.recommended_place_id"]),
+        sa.ForeignKeyConstraint(["username"], ["users.username"]),
+        sa.PrimaryKeyConstraint("vote_id"),
+    )
+    op.create_index("ix_vote_scores_vote_id", "vote_scores", ["vote_id"])
+
+
+def downgrade():
+    op.drop_table("vote_scores")
+    op.drop_table("recommended_places")
+    op.drop_table("activities")
+    op.drop_table("trip_days")
+    op.drop_table("trips")
+    op.drop_table("users")
+    sa.Enum(name="activity_period_enum").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="vote_status_enum").drop(op.get_bind(), checkfirst=True)
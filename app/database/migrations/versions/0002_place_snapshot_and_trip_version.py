@@ -0,0 +1,45 @@
+"""Store candidate details on recommended places and add the trip version counter
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def get_snapshot_columns():
+    return [
+        sa.Column("dest_desc", sa.String(), nullable=True),
+        sa.Column("dest_photo_name", sa.String(), nullable=True),
+        sa.Column("dest_photo", sa.String(), nullable=True),
+        sa.Column("dest_opening_hours", sa.JSON(), nullable=True),
+        sa.Column("dest_lat", sa.Float(), nullable=True),
+        sa.Column("dest_lon", sa.Float(), nullable=True),
+        sa.Column("snapshot_updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("photo_updated_at", sa.DateTime(timezone=True), nullable=True),
+    ]
+
+
+def upgrade():
+    # Databases set up by create_all before the migrations got the snapshot columns added on startup
+    existing_columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("recommended_places")}
+    for column in get_snapshot_columns():
+        if column.name not in existing_columns:
+            op.add_column("recommended_places", column)
+
+    op.add_column("trips", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    op.drop_column("trips", "version")
+
+    for column in reversed(get_snapshot_columns()):
+        op.drop_column("recommended_places", column.name)
@@ -0,0 +1,34 @@
+"""Add composite indexes for the hot query paths
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A trip has one row per day number, and a member one vote per recommended place
+    op.create_index("ix_trip_days_trip_id_day_number", "trip_days", ["trip_id", "day_number"], unique=True)
+    op.create_index("ix_vote_scores_recommended_place_id_username", "vote_scores",
+                    ["recommended_place_id", "username"], unique=True)
+
+    # Not unique, concurrent vote completion could write duplicated plans before it was made atomic
+    op.create_index("ix_activities_trip_day_id_activity_number", "activities", ["trip_day_id", "activity_number"])
+    op.create_index("ix_recommended_places_trip_day_id_dest_id", "recommended_places", ["trip_day_id", "dest_id"])
+    op.create_index("ix_recommended_places_trip_id", "recommended_places", ["trip_id"])
+
+
+def downgrade():
+    op.drop_index("ix_recommended_places_trip_id", table_name="recommended_places")
+    op.drop_index("ix_recommended_places_trip_day_id_dest_id", table_name="recommended_places")
+    op.drop_index("ix_activities_trip_day_id_activity_number", table_name="activities")
+    op.drop_index("ix_vote_scores_recommended_place_id_username", table_name="vote_scores")
+    op.drop_index("ix_trip_days_trip_id_day_number", table_name="trip_days")
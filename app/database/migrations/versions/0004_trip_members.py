@@ -0,0 +1,72 @@
+"""Move the trip companions from the comma-separated string to the trip_members table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trip_members",
+        sa.Column("trip_member_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("trip_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["trip_id"], ["trips.trip_id"]),
+        sa.ForeignKeyConstraint(["username"], ["users.username"]),
+        sa.PrimaryKeyConstraint("trip_member_id"),
+    )
+    op.create_index("ix_trip_members_trip_member_id", "trip_members", ["trip_member_id"])
+    op.create_index("ix_trip_members_trip_id_username", "trip_members", ["trip_id", "username"], unique=True)
+    op.create_index("ix_trip_members_username_trip_id", "trip_members", ["username", "trip_id"])
+
+    # Companions keep their order and the owner comes last, as the string was read before.
+    # Duplicates and usernames without a user are skipped.
+    op.execute("""
+        WITH members AS (
+            SELECT t.trip_id, trim(c.username) AS username, c.position
+            FROM trips t
+            CROSS JOIN LATERAL unnest(string_to_array(t.companion, ',')) WITH ORDINALITY AS c(username, position)
+            UNION ALL
+            SELECT trip_id, owner, 2147483647
+            FROM trips
+        ), unique_members AS (
+            SELECT DISTINCT ON (m.trip_id, m.username) m.trip_id, m.username, m.position
+            FROM members m
+            JOIN users u ON u.username = m.username
+            ORDER BY m.trip_id, m.username, m.position
+        )
+        INSERT INTO trip_members (trip_id, username)
+        SELECT trip_id, username
+        FROM unique_members
+        ORDER BY trip_id, position
+    """)
+
+    op.drop_column("trips", "companion")
+
+
+def downgrade():
+    op.add_column("trips", sa.Column("companion", sa.String(), nullable=True))
+
+    op.execute("""
+        UPDATE trips t
+        SET companion = m.companion
+        FROM (
+            SELECT tm.trip_id, string_agg(tm.username, ',' ORDER BY tm.trip_member_id) AS companion
+            FROM trip_members tm
+            JOIN trips t ON t.trip_id = tm.trip_id AND tm.username <> t.owner
+            GROUP BY tm.trip_id
+        ) m
+        WHERE t.trip_id = m.trip_id
+    """)
+
+    op.drop_table("trip_members")
@@ -0,0 +1,40 @@
+"""Index usernames for the paginated user directory search
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade():
+    # Byte-wise order, serves the keyset pagination and prefix ranges whatever the database collation is
+    op.create_index("ix_users_username_c", "users", [sa.text('username COLLATE "C"')])
+
+    # Trigrams, serve the substring search. pg_trgm ships with the PostgreSQL contrib modules, without it the
+    # substring search still works but scans the users
+    bind = op.get_bind()
+    if not bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar():
+        logger.warning("pg_trgm is not available, the users are not indexed for substring search.")
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index("ix_users_username_trgm", "users", ["username"], postgresql_using="gin",
+                    postgresql_ops={"username": "gin_trgm_ops"})
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_users_username_trgm")
+    op.drop_index("ix_users_username_c", table_name="users")
@@ -0,0 +1,29 @@
+"""Add the planning vote status, held by a day while its plan is built
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Allowed in the migration transaction since PostgreSQL 12, the value is only used once it is committed
+    op.execute("ALTER TYPE vote_status_enum ADD VALUE IF NOT EXISTS 'planning' AFTER 'voting'")
+
+
+def downgrade():
+    # Enum values cannot be dropped, the type is recreated without it
+    op.execute("UPDATE trip_days SET vote_status = 'voting' WHERE vote_status = 'planning'")
+    op.execute("ALTER TYPE vote_status_enum RENAME TO vote_status_enum_old")
+    op.execute("CREATE TYPE vote_status_enum AS ENUM ('pending', 'voting', 'complete')")
+    op.execute("ALTER TABLE trip_days ALTER COLUMN vote_status TYPE vote_status_enum "
+               "USING vote_status::text::vote_status_enum")
+    op.execute("DROP TYPE vote_status_enum_old")
@@ -0,0 +1,35 @@
+"""Store destination details on activities
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def get_snapshot_columns():
+    return [
+        sa.Column("activity_dest_desc", sa.String(), nullable=True),
+        sa.Column("activity_dest_photo_name", sa.String(), nullable=True),
+        sa.Column("activity_dest_opening_hours", sa.JSON(), nullable=True),
+        sa.Column("snapshot_updated_at", sa.DateTime(timezone=True), nullable=True),
+    ]
+
+
+def upgrade():
+    # Activities planned before have no snapshot, their details are fetched when they are viewed
+    for column in get_snapshot_columns():
+        op.add_column("activities", column)
+
+
+def downgrade():
+    for column in reversed(get_snapshot_columns()):
+        op.drop_column("activities", column.name)
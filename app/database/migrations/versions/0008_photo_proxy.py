@@ -0,0 +1,26 @@
+"""Drop the photo URLs stored on recommended places, photos are served from their resource name
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_column("recommended_places", "photo_updated_at")
+    op.drop_column("recommended_places", "dest_photo")
+
+
+def downgrade():
+    # The URLs are not restored, they had expired anyway
+    op.add_column("recommended_places", sa.Column("dest_photo", sa.String(), nullable=True))
+    op.add_column("recommended_places", sa.Column("photo_updated_at", sa.DateTime(timezone=True), nullable=True))
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.database.connection import async_engine, get_async_url, get_engine_options
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Read replicas, comma-separated database URLs. Reads go to the primary when none is set
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+
+# A replica lagging further behind the primary, or not answering, is skipped until its next check
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 5))
+REPLICA_LAG_CHECK_TIMEOUT = float(os.getenv("REPLICA_LAG_CHECK_TIMEOUT", 2))
+
+# Reads of a trip or user written to within this window go to the primary, so writes are seen right away
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", 10))
+
+# Replication lag in seconds, 0 when the replica has replayed everything it received, NULL when unknown
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+replica_engines = [
+    create_async_engine(get_async_url(url), **get_engine_options(make_url(url)))
+    for url in REPLICA_DATABASE_URLS
+]
+
+# When each replica was last checked and its lag at the time
+replica_lags: Dict[AsyncEngine, Tuple[float, float]] = {}
+
+# Trips and users written to recently, by every worker sharing the cache backend
+recent_writes = TTLCache(maxsize=100000, ttl=READ_AFTER_WRITE_SECONDS, name="recent_writes")
+
+
+class RoutingSession(Session):
+    """
+    Session sending SELECT statements to the replica chosen for it, and everything else to the primary.
+
+    Once the session has written, its following reads go to the primary too so it sees its own changes.
+    The replica is passed in the session info, sessions without one only use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+
+        if replica is None or self.info.get("has_written"):
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+        if self._flushing or not isinstance(clause, Select):
+            self.info["has_written"] = True
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+        return replica.sync_engine
+
+
+# Async sessions for read endpoints, writes made while reading (e.g. refreshed snapshots) still go to the primary
+AsyncReadSessionLocal = async_sessionmaker(async_engine, sync_session_class=RoutingSession, autoflush=False,
+                                           expire_on_commit=False)
+
+
+async def record_write(*keys: Hashable):
+    """
+    Record that data was written, so reads of it go to the primary for READ_AFTER_WRITE_SECONDS.
+
+    :param keys: The written data, e.g. ("trip", trip_id) or ("user", username).
+    """
+    for key in keys:
+        await recent_writes.aset(key, True)
+
+
+async def is_recently_written(key: Hashable) -> bool:
+    """
+    Check whether data was written within READ_AFTER_WRITE_SECONDS.
+
+    :param key: The data, e.g. ("trip", trip_id).
+    :return: True if reads of the data should go to the primary.
+    """
+    return await recent_writes.aget(key, False)
+
+
+async def get_replica_lag(replica: AsyncEngine) -> float:
+    """
+    Get the replication lag of a replica, checked at most once every REPLICA_LAG_CHECK_INTERVAL seconds.
+
+    :param replica: The replica engine.
+    :return: The lag in seconds, infinite when the replica is unavailable.
+    """
+    now = time.monotonic()
+    checked_at, lag = replica_lags.get(replica, (None, float("inf")))
+
+    if checked_at is not None and now - checked_at < REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+
+    # Concurrent requests keep using the previous lag while this one checks
+    replica_lags[replica] = (now, lag)
+
+    try:
+        if replica.dialect.name != "postgresql":
+            lag = 0.0
+        else:
+            async with replica.connect() as connection:
+                value = (await asyncio.wait_for(connection.execute(REPLICA_LAG_QUERY),
+                                                REPLICA_LAG_CHECK_TIMEOUT)).scalar()
+            lag = float("inf") if value is None else float(value)
+    except Exception as e:
+        logger.warning("Replica %s is unavailable: %s", replica.url, e)
+        lag = float("inf")
+
+    replica_lags[replica] = (now, lag)
+
+    return lag
+
+
+async def get_replica(key: Optional[Hashable] = None) -> Optional[AsyncEngine]:
+    """
+    Choose a replica to read from.
+
+    :param key: The data being read, e.g. ("trip", trip_id), read from the primary when it was recently written.
+    :return: A random replica within REPLICA_MAX_LAG_SECONDS, None to read from the primary.
+    """
+    if not replica_engines or (key is not None and await is_recently_written(key)):
+        return None
+
+    lags = await asyncio.gather(*(get_replica_lag(replica) for replica in replica_engines))
+    replicas: List[AsyncEngine] = [
+        replica for replica, lag in zip(replica_engines, lags) if lag <= REPLICA_MAX_LAG_SECONDS
+    ]
+
+    return random.choice(replicas) if replicas else None
+
+
+# Session reading from a replica, or from the primary when no replica is suitable
+async def open_read_db(key: Optional[Hashable] = None):
+    replica = await get_replica(key)
+
+    async with AsyncReadSessionLocal(info={"replica": replica}) as db:
+        yield db
+
+
+# Dependency to get an async DB session reading from a replica
+async def get_async_read_db():
+    async for db in open_read_db():
+        yield db
+
+
+# Dependency to get an async DB session reading a trip, from the primary if the trip was just written
+async def get_trip_read_db(trip_id: int):
+    async for db in open_read_db(("trip", trip_id)):
+        yield db
+
+
+# Dependency to get an async DB session reading a user's trips, from the primary if the user just created one
+async def get_user_read_db(username: str):
+    async for db in open_read_db(("user", username)):
+        yield db
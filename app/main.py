@@ -1,16 +1,45 @@
-from fastapi import FastAPI
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.compression import CompressionMiddleware
+from app.database.instrumentation import SQLInstrumentationMiddleware
+from app.metrics import PrometheusMiddleware, mark_process_dead, track_request_in_progress
+from app.profiling import ProfilingMiddleware
+from app.tracing import is_excluded_from_tracing, setup_tracing, shutdown_tracing
+
 from app.routers import (
     discover,
     auth,
     create_new_trip,
+    metrics,
+    my_trips,
+    photos,
     planning_details,
     users_data,
     vote
 )
 
-app = FastAPI()
+# Uvicorn only configures its own loggers, the records of the app modules are printed with this format and level
+logging.basicConfig(format="%(levelname)s:     %(name)s - %(message)s")
+logging.getLogger("app").setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Live gauges of a stopped worker would otherwise stay in the aggregated metrics
+    mark_process_dead()
+    shutdown_tracing()
+
+
+setup_tracing()
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(track_request_in_progress)],
+              telemetry={"exclude": is_excluded_from_tracing})
 
 # CORS
 app.add_middleware(
@@ -19,11 +48,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor"],  # Cursor of the next page of the users directory
 )
 
+# Brotli or gzip compression of large JSON responses
+app.add_middleware(CompressionMiddleware)
+
+# Latency and in-flight requests per route, exposed on /metrics
+app.add_middleware(PrometheusMiddleware)
+
+# Query count and DB time of every request
+app.add_middleware(SQLInstrumentationMiddleware)
+
+# Profiles of sampled requests and requests sending the X-Profile header
+app.add_middleware(ProfilingMiddleware)
+
 app.include_router(discover.router)
 app.include_router(auth.router)
 app.include_router(create_new_trip.router)
+app.include_router(metrics.router)
+app.include_router(my_trips.router)
+app.include_router(photos.router)
 app.include_router(planning_details.router)
 app.include_router(users_data.router)
 app.include_router(vote.router)
@@ -0,0 +1,149 @@
+import os
+import time
+
+from fastapi import Request
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+
+# Set PROMETHEUS_MULTIPROC_DIR to an empty directory when running several uvicorn workers, every worker then
+# writes its metrics there and /metrics aggregates them. It must be set before the app starts.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Request latencies, from a few milliseconds for cached reads to tens of seconds for plan generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle HTTP requests, until the response is complete",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per HTTP request",
+    ["method", "route"], buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent running SQL statements per HTTP request",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+
+UPSTREAM_REQUESTS = Counter(
+    "google_api_requests_total", "Requests to the Google Places and Routes APIs",
+    ["api", "status"],
+)
+UPSTREAM_DURATION = Histogram(
+    "google_api_request_duration_seconds", "Time of requests to the Google Places and Routes APIs",
+    ["api"], buckets=LATENCY_BUCKETS,
+)
+
+DB_POOL_CONNECTIONS_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Database connections checked out of the pool",
+    ["engine"], multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS_OPEN = Gauge(
+    "db_pool_connections_open", "Database connections opened by the pool, in use or idle",
+    ["engine"], multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS_MAX = Gauge(
+    "db_pool_connections_max", "Maximum number of database connections of the pool, overflow included",
+    ["engine"], multiprocess_mode="livesum",
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Lookups of the caches",
+    ["cache", "result"],
+)
+
+PASSWORD_HASHES_PENDING = Gauge(
+    "password_hashes_pending", "Password hashes running or waiting for a hashing thread",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASHES_REJECTED = Counter(
+    "password_hashes_rejected_total", "Password hashes refused because the hashing queue was full",
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_wait_seconds", "Time password hashes waited for a hashing thread",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Get the registry to expose, aggregating every worker in multiprocess mode.
+
+    :return: The registry.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return registry
+
+
+def mark_process_dead():
+    """
+    Remove the live gauges of this worker from the aggregated metrics, when it shuts down.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def get_route_path(scope) -> str:
+    """
+    Get the path template of the route a request was routed to.
+
+    :param scope: The ASGI scope of the request.
+    :return: The route path, "unmatched" when no route matched so unknown paths do not create new series.
+    """
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+async def track_request_in_progress(request: Request):
+    """
+    Dependency of every route counting its requests in progress, once the request is routed.
+
+    Usage: FastAPI(dependencies=[Depends(track_request_in_progress)])
+
+    :param request: The request.
+    """
+    in_progress = REQUESTS_IN_PROGRESS.labels(request.method, get_route_path(request.scope))
+    in_progress.inc()
+    try:
+        yield
+    finally:
+        in_progress.dec()
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request per route, until its response is complete.
+
+    Requests in progress are counted by track_request_in_progress and SQL statistics by SQLInstrumentationMiddleware.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start_time = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.labels(scope["method"], get_route_path(scope), str(status_code)).observe(
+                time.perf_counter() - start_time
+            )
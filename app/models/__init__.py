@@ -4,3 +4,4 @@ from app.models.trip_days import TripDays
 from app.models.user import User
 from app.models.vote_scores import VoteScores
 from app.models.recommended_places import RecommendedPlaces
+from app.models.trip_members import TripMembers
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, Enum, Float
+from sqlalchemy import Column, Integer, ForeignKey, String, Enum, Float, Index, JSON, DateTime
 
 from app.models import Base
 
@@ -11,9 +11,16 @@ class Activities(Base):
     trip_day_id: Foreign key to the trip day
     activity_dest_id: Google Places Destination ID
     activity_dest_name: Name of the destination
+    activity_dest_desc: Editorial summary of the destination
+    activity_dest_photo_name: Google Places photo resource name of the destination, served by the photos endpoint
+    activity_dest_opening_hours: Formatted opening hours of the destination
+    activity_dest_lat: Latitude of the destination
+    activity_dest_lon: Longitude of the destination
     activity_start_time: Start time of the activity
     activity_end_time: End time of the activity
     activity_number: Activity number in the day (Activity 1, Activity 2 etc.)
+    activity_period: Period of the day of the activity
+    snapshot_updated_at: When the destination details were fetched from Google Places API
     """
     __tablename__ = "activities"
 
@@ -21,7 +28,13 @@ class Activities(Base):
     trip_day_id = Column(Integer, ForeignKey("trip_days.trip_day_id"), nullable=False)
     activity_dest_id = Column(String, nullable=False)
     activity_dest_name = Column(String)
+    activity_dest_desc = Column(String)
+    activity_dest_photo_name = Column(String)
+    activity_dest_opening_hours = Column(JSON)
     activity_dest_lat = Column(Float)
     activity_dest_lon = Column(Float)
     activity_number = Column(Integer)  # Activity 1, Activity 2 etc.
     activity_period = Column(Enum("morning", "afternoon", "night", name="activity_period_enum"), nullable=False, default="morning")
+    snapshot_updated_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (Index("ix_activities_trip_day_id_activity_number", "trip_day_id", "activity_number"),)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, String
+from sqlalchemy import Column, Integer, ForeignKey, String, Float, JSON, DateTime, Index
 
 from app.models import Base
 
@@ -11,6 +11,12 @@ class RecommendedPlaces(Base):
     trip_day_id: Foreign key to the trip day
     dest_id: Google Places Destination ID
     dest_name: Name of the destination
+    dest_desc: Editorial summary of the destination
+    dest_photo_name: Google Places photo resource name of the destination, served by the photos endpoint
+    dest_opening_hours: Formatted opening hours of the destination
+    dest_lat: Latitude of the destination
+    dest_lon: Longitude of the destination
+    snapshot_updated_at: When the destination details were fetched from Google Places API
     """
     __tablename__ = "recommended_places"
 
@@ -19,3 +25,14 @@ class RecommendedPlaces(Base):
     trip_day_id = Column(Integer, ForeignKey("trip_days.trip_day_id"), nullable=False)
     dest_id = Column(String, nullable=False)
     dest_name = Column(String)
+    dest_desc = Column(String)
+    dest_photo_name = Column(String)
+    dest_opening_hours = Column(JSON)
+    dest_lat = Column(Float)
+    dest_lon = Column(Float)
+    snapshot_updated_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_recommended_places_trip_day_id_dest_id", "trip_day_id", "dest_id"),
+        Index("ix_recommended_places_trip_id", "trip_id"),
+    )
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, ForeignKey, Date, Enum
+from sqlalchemy import Column, Integer, ForeignKey, Date, Enum, Index
+from sqlalchemy.orm import relationship
 
 from app.models import Base
 
@@ -11,6 +12,10 @@ class TripDays(Base):
     trip_id: Foreign key to the trip
     day_number: Day number in the trip (Day 1, Day 2 etc.)
     date: Date of the day
+    vote_status: pending, then voting once it has recommendations, planning while the plan of the voted day is
+        built and complete once it is planned
+    activities: Activities of the day, ordered by activity number
+    recommended_places: Recommended places of the day
     """
     __tablename__ = "trip_days"
 
@@ -18,4 +23,11 @@ class TripDays(Base):
     trip_id = Column(Integer, ForeignKey("trips.trip_id"), nullable=False)
     day_number = Column(Integer, nullable=False)  # Day 1, Day 2 etc.
     date = Column(Date)
-    vote_status = Column(Enum("pending", "voting", "complete", name="vote_status_enum"), nullable=False)
+    vote_status = Column(Enum("pending", "voting", "planning", "complete", name="vote_status_enum"), nullable=False)
+
+    # One row per day number of a trip
+    __table_args__ = (Index("ix_trip_days_trip_id_day_number", "trip_id", "day_number", unique=True),)
+
+    trip = relationship("Trips", back_populates="days")
+    activities = relationship("Activities", order_by="Activities.activity_number")
+    recommended_places = relationship("RecommendedPlaces", order_by="RecommendedPlaces.recommended_place_id")
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+
+from app.models import Base
+
+
+class TripMembers(Base):
+    """
+    Model for storing the members of a trip's travel group, including the owner
+
+    trip_member_id: Unique identifier for the membership, members are listed in the order they were added
+    trip_id: Foreign key to the trip
+    username: Foreign key to the member
+    """
+    __tablename__ = "trip_members"
+
+    trip_member_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    trip_id = Column(Integer, ForeignKey("trips.trip_id"), nullable=False)
+    username = Column(String, ForeignKey("users.username"), nullable=False)
+
+    __table_args__ = (
+        # Members of a trip, and membership checks
+        Index("ix_trip_members_trip_id_username", "trip_id", "username", unique=True),
+        # Trips of a member, newest first
+        Index("ix_trip_members_username_trip_id", "username", "trip_id"),
+    )
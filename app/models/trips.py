@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, String, Date, Float, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 
 # Base is used for model class definitions
 Base = declarative_base()
@@ -16,6 +17,10 @@ class Trips(Base):
     start_date: Start date of the trip
     end_date: End date of the trip
     duration: Number of days for the trip
+    version: Incremented on every change to the trip, used to cache and revalidate planning details
+    days: Days of the trip, ordered by day number
+    members: Members of the travel group, the companions followed by the owner. Loaded together with the trip,
+             as they are needed for every membership check
     """
     __tablename__ = "trips"
 
@@ -30,4 +35,7 @@ class Trips(Base):
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
     duration = Column(Integer)  # Number of days
-    companion = Column(String)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    days = relationship("TripDays", back_populates="trip", order_by="TripDays.day_number")
+    members = relationship("TripMembers", order_by="TripMembers.trip_member_id", lazy="selectin")
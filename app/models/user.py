@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index
 
 from app.models import Base
 
@@ -16,3 +16,8 @@ class User(Base):
     last_name = Column(String)
     hashed_password = Column(String)
     preferences = Column(String)
+
+
+# User directory search, see users_data.search_users
+Index("ix_users_username_c", User.username.collate("C"))
+Index("ix_users_username_trgm", User.username, postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"})
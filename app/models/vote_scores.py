@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, Boolean, Index
 
 from app.models import Base
 
@@ -15,5 +15,9 @@ class VoteScores(Base):
     vote_score = Column(Integer, nullable=False, default=0)
     is_voted = Column(Boolean, default=False)
 
-    # Enforce vote_score range
-    __table_args__ = (CheckConstraint("vote_score >= 0 AND vote_score <= 10", name="check_vote_score"),)
+    __table_args__ = (
+        # Enforce vote_score range
+        CheckConstraint("vote_score >= 0 AND vote_score <= 10", name="check_vote_score"),
+        # One vote per member for each recommended place
+        Index("ix_vote_scores_recommended_place_id_username", "recommended_place_id", "username", unique=True),
+    )
@@ -0,0 +1,305 @@
+import asyncio
+import cProfile
+import functools
+import hmac
+import inspect
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+
+from app.tracing import TRACING_ENABLED, tracer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Share of requests profiled, e.g. 0.01 for one in a hundred. 0 profiles only requests sending the header below
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0))
+
+# Requests with the header "X-Profile: <token>" are profiled, the header is ignored when no token is set
+PROFILING_HEADER_TOKEN = os.getenv("PROFILING_HEADER_TOKEN")
+
+# Directory the profiles are written to
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+
+# "sampling" to sample the stack of the event loop thread, "cprofile" to trace every function call (slower)
+PROFILING_MODE = os.getenv("PROFILING_MODE", "sampling").lower()
+
+# Time between two stack samples in sampling mode, in milliseconds
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", 5))
+
+
+class RequestProfile:
+    """
+    Time spent in the named spans of a profiled request.
+
+    span_times: Microseconds spent in every span path, excluding the time of its child spans
+    """
+
+    def __init__(self):
+        self.span_times = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, path: Tuple[str, ...], microseconds: int):
+        # Spans also end in worker threads, e.g. in functions run with asyncio.to_thread
+        with self._lock:
+            self.span_times[path] += microseconds
+
+
+# Profile of the request being handled, None when it is not profiled
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+# Innermost span being timed in the current context
+current_span: ContextVar[Optional["profile_span"]] = ContextVar("current_span", default=None)
+
+
+class profile_span:
+    """
+    Named span of a profiled request, timing a block or every call of a function. It is also recorded as an
+    OpenTelemetry span when tracing is enabled.
+
+    Usage:
+        with profile_span("google.place_details"):
+            ...
+
+        @profile_span("get_recommendations")
+        def get_recommendations(...):
+
+    Spans only record anything while a profiled request is handled or tracing is enabled, otherwise they cost a context
+    variable lookup.
+    Spans started in tasks and threads created inside a span are nested under it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path: Tuple[str, ...] = ()
+        self.children_time = 0.0
+        self._start_time = None
+        self._token = None
+        self._trace_span = None
+
+    def __enter__(self):
+        if TRACING_ENABLED:
+            self._trace_span = tracer.start_as_current_span(self.name)
+            self._trace_span.__enter__()
+
+        self._profile = current_profile.get()
+        if self._profile is None:
+            return self
+
+        parent = current_span.get()
+        self._parent = parent
+        self.path = (parent.path if parent else ()) + (self.name,)
+        self._token = current_span.set(self)
+        self._start_time = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profile is not None:
+            elapsed = time.perf_counter() - self._start_time
+            current_span.reset(self._token)
+
+            # Concurrent children can add up to more than the span itself
+            self._profile.add(self.path, int(max(elapsed - self.children_time, 0) * 1_000_000))
+            if self._parent is not None:
+                self._parent.children_time += elapsed
+
+        if self._trace_span is not None:
+            self._trace_span.__exit__(exc_type, exc_value, traceback)
+
+        return False
+
+    def __call__(self, func):
+        name = self.name
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if current_profile.get() is None and not TRACING_ENABLED:
+                    return await func(*args, **kwargs)
+                with profile_span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if current_profile.get() is None and not TRACING_ENABLED:
+                    return func(*args, **kwargs)
+                with profile_span(name):
+                    return func(*args, **kwargs)
+
+        return wrapper
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread sampling the stack of another thread at a fixed interval, counting the samples of every stack.
+
+    thread_id: Identifier of the sampled thread
+    interval: Time between two samples, in seconds
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def write_collapsed_stacks(file_path: str, stacks: Counter, root: str):
+    """
+    Write stacks in the collapsed format of flamegraph.pl, also read by speedscope.
+
+    :param file_path: The file to write.
+    :param stacks: The weight of every stack, frames outermost first.
+    :param root: Frame added at the base of every stack.
+    """
+    with open(file_path, "w") as collapsed_file:
+        for stack, weight in stacks.items():
+            if weight > 0:
+                frames = ";".join(frame.replace(";", ",").replace(" ", "_") for frame in (root, *stack))
+                collapsed_file.write(f"{frames} {weight}\n")
+
+
+def get_profile_name(scope) -> str:
+    """
+    Get the base file name of the profile of a request, from its route and trip ID.
+
+    :param scope: The ASGI scope of the routed request.
+    :return: The file name, without extension.
+    """
+    route = getattr(scope.get("route"), "path", "unmatched")
+    query = parse_qs(scope.get("query_string", b"").decode())
+    trip_id = scope.get("path_params", {}).get("trip_id") or query.get("trip_id", [None])[0]
+
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}_{scope['method']}_{re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-')}"
+    if trip_id is not None:
+        name += f"_trip-{re.sub(r'[^0-9A-Za-z]+', '', str(trip_id))}"
+
+    return f"{name}_{uuid.uuid4().hex[:6]}"
+
+
+def is_profile_requested(scope) -> bool:
+    """
+    Check whether a request is to be profiled, from the sample rate and the X-Profile header.
+
+    :param scope: The ASGI scope of the request.
+    :return: Whether to profile the request.
+    """
+    if PROFILING_HEADER_TOKEN:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, PROFILING_HEADER_TOKEN.encode())
+
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling a sample of requests, and requests sending the X-Profile header with the configured token.
+
+    Every profiled request writes to PROFILING_DIR, named after its route and trip ID:
+    - <name>.spans.txt: microseconds spent in every named span, as collapsed stacks
+    - <name>.stacks.txt: stack samples of the event loop thread, as collapsed stacks (sampling mode)
+    - <name>.prof: cProfile statistics (cprofile mode)
+    The name is returned in the X-Profile-Name response header.
+
+    Profilers see the whole event loop thread, so the stacks of concurrent requests are included. One request is
+    profiled at a time per worker.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.is_profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.is_profiling or not is_profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.is_profiling = True
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        name = None
+
+        async def send_with_name(message):
+            nonlocal name
+            if message["type"] == "http.response.start":
+                name = get_profile_name(scope)
+                message["headers"] = [*message.get("headers", []), (b"x-profile-name", name.encode())]
+            await send(message)
+
+        if PROFILING_MODE == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), PROFILING_INTERVAL_MS / 1000)
+            profiler.start()
+
+        start_time = time.perf_counter()
+        try:
+            with profile_span("request"):
+                await self.app(scope, receive, send_with_name)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            if PROFILING_MODE == "cprofile":
+                profiler.disable()
+            else:
+                profiler.stop()
+            current_profile.reset(token)
+            self.is_profiling = False
+
+        # The profiler is stopped, so its results are written on a thread instead of blocking the event loop
+        await asyncio.to_thread(self.write_profile, name or get_profile_name(scope), scope, profile, profiler, elapsed)
+
+    @staticmethod
+    def write_profile(name: str, scope, profile: RequestProfile, profiler, elapsed: float):
+        """
+        Write the profile files of a request.
+
+        :param name: Base file name of the profile.
+        :param scope: The ASGI scope of the request.
+        :param profile: The span times of the request.
+        :param profiler: The cProfile profiler or stack sampler that ran during the request.
+        :param elapsed: Duration of the request, in seconds.
+        """
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        base_path = os.path.join(PROFILING_DIR, name)
+        root = f"{scope['method']} {getattr(scope.get('route'), 'path', scope['path'])}"
+
+        # The root span is renamed after the route, known once the request is routed
+        span_times = Counter({path[1:]: time for path, time in profile.span_times.items()})
+        write_collapsed_stacks(f"{base_path}.spans.txt", span_times, root)
+
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(f"{base_path}.prof")
+        else:
+            write_collapsed_stacks(f"{base_path}.stacks.txt", profiler.stacks, root)
+
+        logger.info("Profiled %s in %.0f ms: %s", root, elapsed * 1000, base_path)
@@ -1,42 +1,122 @@
+import asyncio
+import hashlib
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, APIRouter, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.cache import TTLCache
+from app.database import get_async_db
+from app.metrics import PASSWORD_HASH_WAIT, PASSWORD_HASHES_PENDING, PASSWORD_HASHES_REJECTED
 from app.models import User
+from app.routers.recommendation_model import get_members
 from app.schemas import CreateNewUser
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login/token")
+
+# The same scheme, letting requests without a token through to authorize_request
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login/token", auto_error=False)
+
+# Whether the trip and user endpoints require the bearer token of the user they name and of a member of the trip
+REQUIRE_AUTH = os.getenv("REQUIRE_AUTH", "false").lower() == "true"
+
+# bcrypt cost factor, hashes with another cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# Threads hashing passwords, apart from the request threadpool so login bursts do not starve other requests
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+
+# Hashes allowed to wait for a thread, requests beyond it are answered 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 32))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 # JWT secret and algorithm
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = float(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# Verified tokens kept, each until it expires, so authenticating a request does not decode its JWT again
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+# How long the ID of an authenticated user is kept before checking again that the user exists
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 300))
+
+# JWT payloads keyed by the SHA-256 of their token, the tokens themselves are not kept. Both caches are looked up on
+# every authenticated request, so they stay in the memory of each worker whatever the cache backend.
+verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60, name="verified_tokens",
+                           shared=False)
+
+# User IDs keyed by username
+authenticated_users = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL, name="authenticated_users",
+                               shared=False)
+
+
+# Password hashes submitted and not finished in this process, running or waiting for a thread
+password_hashes_pending = 0
+
+
+async def run_password_hash(func: Callable, *args):
+    """
+    Run a bcrypt function on the password hashing executor.
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+    :param func: The function, e.g. pwd_context.hash.
+    :param args: Arguments of the function.
+    :return: The result of the function.
+    """
+    global password_hashes_pending
 
+    queued = max(password_hashes_pending - PASSWORD_HASH_WORKERS, 0)
+    if queued >= PASSWORD_HASH_MAX_QUEUE:
+        PASSWORD_HASHES_REJECTED.inc()
+        logger.warning("Password hash queue full (%d waiting), rejecting the request", queued)
+        raise HTTPException(status_code=503, detail="Too many login attempts, please retry",
+                            headers={"Retry-After": "1"})
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+    submitted_at = time.perf_counter()
 
+    def run():
+        PASSWORD_HASH_WAIT.observe(time.perf_counter() - submitted_at)
+        return func(*args)
 
-def create_user(db: Session, user: CreateNewUser):
-    hashed_password = pwd_context.hash(user.password)
+    password_hashes_pending += 1
+    PASSWORD_HASHES_PENDING.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_hash_executor, run)
+    finally:
+        password_hashes_pending -= 1
+        PASSWORD_HASHES_PENDING.dec()
+
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
+
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+
+async def create_user(db: AsyncSession, user: CreateNewUser):
+    hashed_password = await run_password_hash(pwd_context.hash, user.password)
 
     # Convert list to comma-separated string
     user_preferences = ",".join(user.preferences)
@@ -50,29 +130,37 @@ def create_user(db: Session, user: CreateNewUser):
         preferences=user_preferences
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/register")
-def register_user(user: CreateNewUser, db: Session = Depends(get_db)):
-    db_user = get_user_by_username(db, username=user.username)
+async def register_user(user: CreateNewUser, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail=f"Username '{user.username}' is already registered")
-    db_user = get_user_by_email(db, email=user.email)
+    db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail=f"Email '{user.email}' is already registered")
-    return create_user(db=db, user=user)
+    return await create_user(db=db, user=user)
 
 
 # Authenticate the user
-def authenticate_user(username: str, password: str, db: Session):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+
+    is_valid, new_hash = await run_password_hash(pwd_context.verify_and_update, password, user.hashed_password)
+    if not is_valid:
         return False
+
+    # The hash was made with another BCRYPT_ROUNDS, store it with the current one
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     return user
 
 
@@ -89,8 +177,9 @@ def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None):
 
 
 @router.post("/login/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),
+                                 db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -105,15 +194,124 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 
 
 def verify_token(token: str = Depends(oauth2_scheme)):
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    payload = verified_tokens.get(token_hash)
+    if payload is not None:
+        # The cache TTL is a monotonic approximation of exp, the payload is only trusted until exp itself
+        if payload["exp"] > time.time():
+            return payload
+        verified_tokens.delete(token_hash)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=403, detail="Token is invalid or expired")
-        return payload
     except JWTError:
         raise HTTPException(status_code=403, detail="Token is invalid or expired")
 
+    # Tokens without an expiry are never cached
+    if "exp" in payload:
+        verified_tokens.set(token_hash, payload, ttl=payload["exp"] - time.time())
+
+    return payload
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    The user authenticated by the bearer token of a request
+
+    user_id: The user ID
+    username: The username
+    """
+    user_id: int
+    username: str
+
+
+async def get_current_user(payload: Dict = Depends(verify_token),
+                           db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    """
+    Get the user authenticated by the bearer token of a request.
+
+    Usage: async def endpoint(user: CurrentUser = Depends(get_current_user))
+
+    :param payload: The verified JWT payload.
+    :param db: Database session, only used when the user is not cached.
+    :return: The authenticated user.
+    """
+    username = payload["sub"]
+    user_id = authenticated_users.get(username)
+
+    if user_id is None:
+        user_id = await db.scalar(select(User.user_id).where(User.username == username))
+        if user_id is None:
+            raise HTTPException(status_code=403, detail="Token is invalid or expired")
+        authenticated_users.set(username, user_id)
+
+    return CurrentUser(user_id=user_id, username=username)
+
+
+async def is_trip_member(trip_id: int, username: str, db: AsyncSession) -> bool:
+    """
+    Check whether a user is a member of a trip, from the trip members cache of get_members.
+
+    :param trip_id: The ID of the trip.
+    :param username: The username.
+    :param db: Database session, only used when the trip members are not cached.
+    :return: Whether the user is a member of the trip.
+    """
+    return username in await get_members(trip_id, db)
+
+
+async def get_current_trip_member(trip_id: int, user: CurrentUser = Depends(get_current_user),
+                                  db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    """
+    Get the user authenticated by the bearer token of a request on a trip, who must be a member of the trip.
+
+    Usage: async def endpoint(trip_id: int, user: CurrentUser = Depends(get_current_trip_member))
+
+    :param trip_id: The ID of the trip, from the request.
+    :param user: The authenticated user.
+    :param db: Database session, only used when the trip members are not cached.
+    :return: The authenticated user.
+    """
+    if not await is_trip_member(trip_id, user.username, db):
+        raise HTTPException(status_code=403, detail="Not a member of this trip")
+
+    return user
+
+
+async def authorize_request(trip_id: Optional[int] = None, username: Optional[str] = None,
+                            token: Optional[str] = Depends(optional_oauth2_scheme),
+                            db: AsyncSession = Depends(get_async_db)) -> Optional[CurrentUser]:
+    """
+    Check that a request is made by the user it names and by a member of its trip, when REQUIRE_AUTH is set.
+
+    Usage: @router.get("/", dependencies=[Depends(authorize_request)]), trip_id and username being query parameters
+    of the endpoint. Endpoints reading them from the body call it themselves.
+
+    :param trip_id: The ID of the trip of the request, None when it is not about a trip.
+    :param username: The username the request is made as, None when it names no user.
+    :param token: The bearer token of the request.
+    :param db: Database session, only used when the user or the trip members are not cached.
+    :return: The authenticated user, None when authentication is not required.
+    """
+    if not REQUIRE_AUTH:
+        return None
+
+    if token is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    user = await get_current_user(verify_token(token), db)
+    if username is not None and username != user.username:
+        raise HTTPException(status_code=403, detail="Not allowed to act as another user")
+
+    if trip_id is not None:
+        await get_current_trip_member(trip_id, user, db)
+
+    return user
+
 
 @router.get("/login/verify-token/{token}")
 async def verify_user_token(token: str):
@@ -1,162 +1,212 @@
-from datetime import timedelta
-from typing import List
-
-import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from app.database import get_db
-from app.models import Trips, TripDays, RecommendedPlaces, VoteScores
-from app.routers.recommendation_model import get_travel_group_preferences, get_recommendations, \
-    get_nearby_destinations, get_members
-from app.schemas import CreateNewTrip
-
-router = APIRouter(prefix="/api/create-new-trip", tags=["create-new-trip"])
-
-
-async def create_recommendations(trip_id: int, lat: float, lon: float, db: Session, previous_dest: List = None) -> pd.DataFrame:
-    """
-    Create recommendations for a trip.
-
-    :param trip_id: The ID of the trip.
-    :param lat: The latitude of the destination.
-    :param lon: The longitude of the destination.
-    :param db: Database session.
-    :param previous_dest: The previous destinations from the previous day.
-    :return: The recommendations.
-    """
-    # Get the travel group preferences
-    travel_group_preferences = get_travel_group_preferences(trip_id, db)
-
-    # Get nearby destinations from Google Places API
-    nearby_places = await get_nearby_destinations(lat, lon)
-
-    if previous_dest:
-        nearby_places = nearby_places[~nearby_places["AttractionId"].isin(previous_dest)]
-
-    # Get recommendations
-    recommendations = get_recommendations(travel_group_preferences, nearby_places)
-
-    return recommendations
-
-
-def creat_new_trip_record(trip: CreateNewTrip, db: Session):
-    """
-    Create a new trip record in the database.
-
-    :param trip: The trip details.
-    :param db: Database session.
-    """
-    # Create a new trip record
-    new_trip = Trips(
-        owner=trip.owner,
-        trip_name=trip.trip_name,
-        dest_id=trip.dest_id,
-        dest_name=trip.dest_name,
-        dest_lat=trip.dest_lat,
-        dest_lon=trip.dest_lon,
-        start_date=trip.start_date,
-        end_date=trip.end_date,
-        duration=trip.duration,
-        companion=trip.companion  # Comma-separated string of companion IDs
-    )
-
-    db.add(new_trip)
-    db.commit()
-    db.refresh(new_trip)
-
-    # Create trip days records
-    for day in range(trip.duration):
-        new_trip_day = TripDays(
-            trip_id=new_trip.trip_id,
-            day_number=day + 1,
-            date=trip.start_date + timedelta(days=day + 1),
-            vote_status="pending"
-        )
-
-        db.add(new_trip_day)
-        db.commit()
-        db.refresh(new_trip_day)
-
-    return new_trip
-
-
-def create_recommendations_record(trip_id: int, recommendations: pd.DataFrame, db: Session, day_number: int = 1):
-    """
-    Create a new recommendations record in the database.
-
-    :param trip_id: The ID of the trip.
-    :param recommendations: The recommendations.
-    :param db: Database session.
-    :param day_number: The day number for which the recommendations are created.
-    """
-    trip_day = db.query(TripDays).filter(TripDays.trip_id == trip_id, TripDays.day_number == day_number).first()
-
-    members = get_members(trip_id, db)
-
-    for idx, row in recommendations.iterrows():
-        new_recommendation = RecommendedPlaces(
-            trip_id=trip_id,
-            trip_day_id=trip_day.trip_day_id,
-            dest_id=row["AttractionId"],
-            dest_name=row["Attraction"],
-        )
-
-        db.add(new_recommendation)
-        db.commit()
-        db.refresh(new_recommendation)
-
-        create_vote_scores_records(new_recommendation.recommended_place_id, members, db)
-
-    # change the vote status to voting
-    trip_day.vote_status = "voting"
-    db.commit()
-    db.refresh(trip_day)
-
-
-def create_vote_scores_records(recommended_place_id: int, members: List[str], db: Session):
-    """
-    Create a new vote scores record in the database.
-
-    :param recommended_place_id: The ID of the recommended place.
-    :param members: The list of members in the travel group.
-    :param db: Database session.
-    """
-    for member in members:
-        new_vote_score = VoteScores(
-            recommended_place_id=recommended_place_id,
-            username=member,
-        )
-
-        db.add(new_vote_score)
-        db.commit()
-        db.refresh(new_vote_score)
-
-
-@router.post('/')
-async def create_new_trip(trip: CreateNewTrip, db: Session = Depends(get_db)):
-    """
-    Create a new trip and store it in the database.
-    """
-    # Validate date range
-    if trip.start_date > trip.end_date:
-        raise HTTPException(status_code=400, detail="Start date must be before end date")
-
-    try:
-        # Create a new trip record
-        new_trip = creat_new_trip_record(trip, db)
-
-        # Create recommendations
-        recommendations = await create_recommendations(new_trip.trip_id, new_trip.dest_lat, new_trip.dest_lon, db)
-
-        # Create recommendations record
-        create_recommendations_record(new_trip.trip_id, recommendations, db)
-
-        return {
-            "message": "Trip created successfully",
-            "trip_id": new_trip.trip_id
-        }
-
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error creating trip: {str(e)}")
+import asyncio
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_db, record_write, query_budget
+from app.models import Trips, TripDays, RecommendedPlaces, VoteScores, TripMembers
+from app.routers.auth import authorize_request, optional_oauth2_scheme
+from app.routers.planning_details import get_destination_snapshot
+from app.routers.recommendation_model import get_users_preferences, get_recommendations, get_nearby_destinations
+from app.schemas import CreateNewTrip
+
+router = APIRouter(prefix="/api/create-new-trip", tags=["create-new-trip"])
+
+
+async def create_recommendations(travel_group_preferences: pd.DataFrame, lat: float, lon: float,
+                                 previous_dest: List = None) -> pd.DataFrame:
+    """
+    Create recommendations for a trip.
+
+    :param travel_group_preferences: The preferences of the travel group.
+    :param lat: The latitude of the destination.
+    :param lon: The longitude of the destination.
+    :param previous_dest: The previous destinations from the previous day.
+    :return: The recommendations.
+    """
+    # Get nearby destinations from Google Places API
+    nearby_places = await get_nearby_destinations(lat, lon)
+
+    if previous_dest:
+        nearby_places = nearby_places[~nearby_places["AttractionId"].isin(previous_dest)]
+
+    # Get recommendations
+    recommendations = get_recommendations(travel_group_preferences, nearby_places)
+
+    return recommendations
+
+
+async def get_recommendation_snapshots(recommendations: pd.DataFrame) -> List[Dict]:
+    """
+    Fetch the details shown on the ballot of every recommended place, to be stored with them.
+
+    :param recommendations: The recommendations.
+    :return: The recommended places, with the columns of RecommendedPlaces but the trip and day.
+    """
+    snapshots = await asyncio.gather(
+        *(get_destination_snapshot(dest_id) for dest_id in recommendations["AttractionId"])
+    )
+
+    return [
+        {"dest_id": dest_id, **snapshot}
+        for dest_id, snapshot in zip(recommendations["AttractionId"], snapshots)
+    ]
+
+
+def get_new_trip_members(trip: CreateNewTrip) -> List[str]:
+    """
+    Get the members of a new trip.
+
+    :param trip: The trip details.
+    :return: The usernames of the members, the companions (comma-separated usernames) followed by the owner.
+    """
+    companions = [username.strip() for username in trip.companion.split(",") if username.strip()]
+
+    return list(dict.fromkeys(companions + [trip.owner]))
+
+
+async def creat_new_trip_record(trip: CreateNewTrip, members: List[str], db: AsyncSession):
+    """
+    Create a new trip record in the database.
+
+    The records are only flushed, the caller commits them together with the first day's recommendations.
+
+    :param trip: The trip details.
+    :param members: The members of the trip, from get_new_trip_members.
+    :param db: Database session.
+    """
+    # Create a new trip record
+    new_trip = Trips(
+        owner=trip.owner,
+        trip_name=trip.trip_name,
+        dest_id=trip.dest_id,
+        dest_name=trip.dest_name,
+        dest_lat=trip.dest_lat,
+        dest_lon=trip.dest_lon,
+        start_date=trip.start_date,
+        end_date=trip.end_date,
+        duration=trip.duration
+    )
+
+    db.add(new_trip)
+    await db.flush()
+
+    # Create trip members records
+    await db.execute(
+        insert(TripMembers),
+        [{"trip_id": new_trip.trip_id, "username": username} for username in members]
+    )
+
+    # The members look at the new trip right after it is created, so their reads go to the primary for a while
+    await record_write(("trip", new_trip.trip_id), *(("user", username) for username in members))
+
+    # Create trip days records
+    await db.execute(
+        insert(TripDays),
+        [
+            {
+                "trip_id": new_trip.trip_id,
+                "day_number": day + 1,
+                "date": trip.start_date + timedelta(days=day + 1),
+                "vote_status": "pending"
+            }
+            for day in range(trip.duration)
+        ]
+    )
+
+    return new_trip
+
+
+async def create_recommendations_record(trip_id: int, places: List[Dict], members: List[str], db: AsyncSession,
+                                        day_number: int = 1):
+    """
+    Create a new recommendations record in the database and open the day for voting.
+
+    The records are not committed, so they are written together with the caller's other changes.
+
+    :param trip_id: The ID of the trip.
+    :param places: The recommended places, from get_recommendation_snapshots.
+    :param members: The members of the travel group.
+    :param db: Database session.
+    :param day_number: The day number for which the recommendations are created.
+    """
+    # change the vote status to voting
+    trip_day_id = (await db.execute(
+        update(TripDays)
+        .where(TripDays.trip_id == trip_id, TripDays.day_number == day_number)
+        .values(vote_status="voting")
+        .returning(TripDays.trip_day_id)
+    )).scalar_one()
+
+    if places:
+        recommended_place_ids = (await db.scalars(
+            insert(RecommendedPlaces).returning(RecommendedPlaces.recommended_place_id, sort_by_parameter_order=True),
+            [{"trip_id": trip_id, "trip_day_id": trip_day_id, **place} for place in places]
+        )).all()
+
+        await create_vote_scores_records(recommended_place_ids, members, db)
+
+
+async def create_vote_scores_records(recommended_place_ids: List[int], members: List[str], db: AsyncSession):
+    """
+    Create a new vote scores record in the database for every member and recommended place.
+
+    :param recommended_place_ids: The IDs of the recommended places.
+    :param members: The list of members in the travel group.
+    :param db: Database session.
+    """
+    await db.execute(
+        insert(VoteScores),
+        [
+            {
+                "recommended_place_id": recommended_place_id,
+                "username": member,
+                "vote_score": 0,
+                "is_voted": False
+            }
+            for recommended_place_id in recommended_place_ids
+            for member in members
+        ]
+    )
+
+
+@router.post('/', dependencies=[Depends(query_budget(16))])
+async def create_new_trip(trip: CreateNewTrip, token: Optional[str] = Depends(optional_oauth2_scheme),
+                          db: AsyncSession = Depends(get_async_db)):
+    """
+    Create a new trip and store it in the database.
+    """
+    await authorize_request(username=trip.owner, token=token, db=db)
+
+    # Validate date range
+    if trip.start_date > trip.end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+
+    members = get_new_trip_members(trip)
+
+    try:
+        travel_group_preferences = await get_users_preferences(members, db)
+        # Ends the read transaction, so no connection is held while Google Places API is called
+        await db.commit()
+
+        # Create recommendations, with the details stored with them
+        recommendations = await create_recommendations(travel_group_preferences, trip.dest_lat, trip.dest_lon)
+        places = await get_recommendation_snapshots(recommendations)
+
+        # The trip, its days and the first day's recommendations are written in one short transaction
+        new_trip = await creat_new_trip_record(trip, members, db)
+        await create_recommendations_record(new_trip.trip_id, places, members, db)
+        await db.commit()
+
+        return {
+            "message": "Trip created successfully",
+            "trip_id": new_trip.trip_id
+        }
+
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating trip: {str(e)}")
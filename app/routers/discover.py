@@ -1,17 +1,58 @@
 import asyncio
 import json
 import os
+import time
 from typing import List, Dict
+from urllib.parse import parse_qs, urlsplit
 
 import requests
 from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, Query
 
+from app.metrics import UPSTREAM_DURATION, UPSTREAM_REQUESTS
+from app.profiling import profile_span
+from app.schemas import DiscoverPlaceDetails
+from app.tracing import set_span_attributes
+
 load_dotenv()
 
 router = APIRouter(prefix="/api/discover-place-details", tags=["discover"])
 
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
+# Overridden to point at a mock server for load tests, see scripts/mock_google.py
+GOOGLE_PLACES_BASE_URL = os.getenv("GOOGLE_PLACES_BASE_URL", "https://places.googleapis.com/v1")
+
+
+async def google_request(api: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Send a request to a Google API from a worker thread, recording its status and latency in the google_api_* metrics
+    and a trace span with its field mask.
+
+    :param api: Name of the API call in the metrics, e.g. "place_details".
+    :param method: The HTTP method.
+    :param url: The URL.
+    :param kwargs: Arguments of requests.request.
+    :return: The response.
+    """
+    start_time = time.perf_counter()
+    status = "error"
+
+    try:
+        with profile_span(f"google.{api}"):
+            # The field mask is a header for searches and route matrices and a query parameter for place details
+            set_span_attributes(
+                google__api=api,
+                http__request__method=method,
+                google__field_mask=kwargs.get("headers", {}).get("X-Goog-FieldMask")
+                or parse_qs(urlsplit(url).query).get("fields", [None])[0],
+            )
+            res = await asyncio.to_thread(requests.request, method, url, **kwargs)
+            set_span_attributes(http__response__status_code=res.status_code)
+        status = str(res.status_code)
+        return res
+    finally:
+        UPSTREAM_REQUESTS.labels(api, status).inc()
+        UPSTREAM_DURATION.labels(api).observe(time.perf_counter() - start_time)
 
 
 async def get_photo(photo_name: str, max_height: str = 300, max_width: str = 300) -> str:
@@ -23,8 +64,8 @@ async def get_photo(photo_name: str, max_height: str = 300, max_width: str = 300
     :return: Photo URL
     """
     headers = {'X-Goog-Api-Key': GOOGLE_PLACES_API_KEY}
-    url = f"https://places.googleapis.com/v1/{photo_name}/media?maxHeightPx={max_height}&maxWidthPx={max_width}"
-    res = requests.get(url, headers=headers, allow_redirects=False)
+    url = f"{GOOGLE_PLACES_BASE_URL}/{photo_name}/media?maxHeightPx={max_height}&maxWidthPx={max_width}"
+    res = await google_request("place_photo", "GET", url, headers=headers, allow_redirects=False)
 
     if res.status_code == 302:  # Google redirects to actual image
         return res.headers["Location"]
@@ -33,6 +74,7 @@ async def get_photo(photo_name: str, max_height: str = 300, max_width: str = 300
         return None
 
 
+@profile_span("get_nearby_places")
 async def get_nearby_places(lat: float, lon: float, max_result: int, radius: int, g_fields: str) -> List[Dict]:
     """
     Get nearby places from Google Places API (Nearby Search).
@@ -63,7 +105,7 @@ async def get_nearby_places(lat: float, lon: float, max_result: int, radius: int
 
 
 async def get_nearby_places_from_api(g_fields, lat, lon, max_result, radius):
-    url = "https://places.googleapis.com/v1/places:searchNearby"
+    url = f"{GOOGLE_PLACES_BASE_URL}/places:searchNearby"
     payload = json.dumps({
         # Exclude certain place types to avoid irrelevant results
         "excludedTypes": ["car_dealer", "car_rental", "car_repair", "car_wash", "electric_vehicle_charging_station",
@@ -92,7 +134,7 @@ async def get_nearby_places_from_api(g_fields, lat, lon, max_result, radius):
         'X-Goog-Api-Key': GOOGLE_PLACES_API_KEY,
         'X-Goog-FieldMask': g_fields
     }
-    res = requests.request("POST", url, headers=headers, data=payload)
+    res = await google_request("nearby_search", "POST", url, headers=headers, data=payload)
     try:
         response = res.json()
     except requests.exceptions.JSONDecodeError:
@@ -100,6 +142,7 @@ async def get_nearby_places_from_api(g_fields, lat, lon, max_result, radius):
     return response
 
 
+@profile_span("open_hours_format")
 def open_hours_format(opening_hours: List[Dict]) -> Dict[str, Dict[str, str]]:
     """
     Format opening hours from Google Places API.
@@ -142,12 +185,12 @@ async def get_place_details(dest_id: str, g_fields: str) -> Dict:
     :param g_fields: Fields to fetch
     :return: Place details
     """
-    url = f"https://places.googleapis.com/v1/places/{dest_id}?fields={g_fields}"
+    url = f"{GOOGLE_PLACES_BASE_URL}/places/{dest_id}?fields={g_fields}"
     headers = {
         'Content-Type': 'application/json',
         'X-Goog-Api-Key': GOOGLE_PLACES_API_KEY
     }
-    res = requests.get(url, headers=headers)
+    res = await google_request("place_details", "GET", url, headers=headers)
     if res.status_code != 200:
         raise HTTPException(status_code=res.status_code, detail=f"Google Places API error: {res.text}")
     try:
@@ -157,7 +200,7 @@ async def get_place_details(dest_id: str, g_fields: str) -> Dict:
     return response
 
 
-@router.get("/")
+@router.get("/", responses={200: {"model": DiscoverPlaceDetails}})
 async def discover_place_details(dest_id: str = Query(..., min_length=1)) -> Dict:
     """
     Fetch place details from Google Places API (Place Details).
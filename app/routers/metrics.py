@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.metrics import get_registry
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("", include_in_schema=False)
+def get_metrics() -> Response:
+    """
+    Get the metrics of the app in the Prometheus text format, summed over every worker in multiprocess mode.
+
+    :return: The metrics.
+    """
+    return Response(generate_latest(get_registry()), media_type=CONTENT_TYPE_LATEST)
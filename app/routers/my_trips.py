@@ -0,0 +1,64 @@
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_user_read_db, query_budget
+from app.models import Trips, TripMembers
+from app.routers.auth import authorize_request
+from app.routers.recommendation_model import get_trip_members
+
+router = APIRouter(prefix="/api/my-trips", tags=["my-trips"])
+
+
+@router.get("/", dependencies=[Depends(query_budget(4)), Depends(authorize_request)])
+async def get_my_trips(username: str, limit: int = Query(20, ge=1, le=100), cursor: Optional[int] = None,
+                       db: AsyncSession = Depends(get_user_read_db)) -> Dict:
+    """
+    Get the trips a user is a member of, newest first.
+
+    The trips are paginated by keyset on the trip ID, so every page is an index range scan on the user's
+    memberships however many trips come before it.
+
+    :param username: The username of the user.
+    :param limit: The maximum number of trips to return.
+    :param cursor: The nextCursor of the previous page, the first page when omitted.
+    :param db: Database session.
+    :return: The trips of the page and the cursor of the next page, None on the last page.
+    """
+    query = (
+        select(Trips)
+        .join(TripMembers, TripMembers.trip_id == Trips.trip_id)
+        .where(TripMembers.username == username)
+        .order_by(TripMembers.trip_id.desc())
+        .limit(limit + 1)  # One more trip tells whether there is a next page
+    )
+
+    if cursor is not None:
+        query = query.where(TripMembers.trip_id < cursor)
+
+    trips = (await db.execute(query)).scalars().all()
+    next_cursor = trips[limit - 1].trip_id if len(trips) > limit else None
+
+    return {
+        "trips": [
+            {
+                "tripId": trip.trip_id,
+                "tripName": trip.trip_name,
+                "destName": trip.dest_name,
+                "startDate": trip.start_date,
+                "lastDate": trip.end_date,
+                "owner": trip.owner,
+                "companion": [
+                    {
+                        "username": user,
+                        "profilePic": "not yet implemented"
+                    }
+                    for user in get_trip_members(trip)
+                ]
+            }
+            for trip in trips[:limit]
+        ],
+        "nextCursor": next_cursor
+    }
@@ -0,0 +1,66 @@
+import os
+import re
+from typing import Optional
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import RedirectResponse
+
+from app.cache import TTLCache
+from app.routers.discover import get_photo
+
+load_dotenv()
+
+router = APIRouter(prefix="/api/photos", tags=["photos"])
+
+# Base URL of the API as clients reach it, prefixed to the photo URLs of the responses, which are relative when empty
+API_BASE_URL = os.getenv("API_BASE_URL", "").rstrip("/")
+# How long a photo URL returned by Google Places API is reused, they expire after a while
+PHOTO_URL_CACHE_TTL = float(os.getenv("PHOTO_URL_CACHE_TTL", 3600))
+
+# Google Places photo resource names, e.g. places/{place_id}/photos/{photo_id}
+PHOTO_NAME_PATTERN = re.compile(r"places/[^/]+/photos/[^/]+")
+
+# Google photo URLs keyed by (photo name, size)
+photo_url_cache = TTLCache(maxsize=4096, ttl=PHOTO_URL_CACHE_TTL, name="photo_url")
+
+
+def get_photo_url(photo_name: Optional[str], size: int = 300) -> str:
+    """
+    Get the URL of a photo served by the API.
+
+    Unlike the URLs returned by Google Places API it does not expire, so it can be stored and served in cached
+    responses. It redirects to a current Google URL.
+
+    :param photo_name: The Google Places photo resource name.
+    :param size: The maximum width and height of the photo.
+    :return: The URL, empty when there is no photo.
+    """
+    if not photo_name:
+        return ""
+
+    return f"{API_BASE_URL}/api/photos/{quote(photo_name)}?size={size}"
+
+
+@router.get("/{photo_name:path}", response_class=RedirectResponse, status_code=302)
+async def redirect_to_photo(photo_name: str, size: int = Query(300, ge=1, le=4800)) -> RedirectResponse:
+    """
+    Redirect to the photo from Google Places API.
+
+    :param photo_name: The Google Places photo resource name.
+    :param size: The maximum width and height of the photo.
+    :return: The redirect, which clients may cache for PHOTO_URL_CACHE_TTL.
+    """
+    if not PHOTO_NAME_PATTERN.fullmatch(photo_name):
+        raise HTTPException(status_code=404, detail="Photo not found.")
+
+    url = await photo_url_cache.aget((photo_name, size))
+
+    if url is None:
+        url = await get_photo(photo_name, str(size), str(size))
+        if url is None:
+            raise HTTPException(status_code=404, detail="Photo not found.")
+        await photo_url_cache.aset((photo_name, size), url)
+
+    return RedirectResponse(url, status_code=302, headers={"Cache-Control": f"max-age={int(PHOTO_URL_CACHE_TTL)}"})
@@ -1,21 +1,163 @@
+import asyncio
+import contextvars
+import hashlib
 import json
+import logging
 import os
-from typing import List, Dict
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Set, Tuple, FrozenSet, AsyncIterator
 
+import orjson
 import requests
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update, func, distinct, select, Select, Update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.cache import TTLCache, invalidate_namespace, trip_namespace
+from app.database import AsyncSessionLocal, get_trip_read_db, record_write, query_budget
 from app.models import Trips, TripDays, RecommendedPlaces, VoteScores, Activities
-from app.routers.discover import get_photo, get_place_details, open_hours_format
+from app.profiling import profile_span
+from app.routers.auth import authorize_request
+from app.routers.discover import get_place_details, google_request, open_hours_format
+from app.routers.photos import get_photo_url
+from app.routers.recommendation_model import get_trip_members
+from app.routers.travel_time import TRAVEL_SPEED_KMH, estimate_legs
+from app.schemas import PlanningDetails
 
 router = APIRouter(prefix="/api/planning-details", tags=["planning-details"])
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
+GOOGLE_ROUTES_BASE_URL = os.getenv("GOOGLE_ROUTES_BASE_URL", "https://routes.googleapis.com")
+TRIP_PHOTO_CACHE_TTL = float(os.getenv("TRIP_PHOTO_CACHE_TTL", 3600))
+PLANNING_DETAILS_CACHE_TTL = float(os.getenv("PLANNING_DETAILS_CACHE_TTL", 600))
+# Maximum number of trip days assembled at the same time for one request
+PLANNING_DAY_CONCURRENCY = int(os.getenv("PLANNING_DAY_CONCURRENCY", 4))
+# "estimate" answers with local estimates and refines them in the background, "routes" waits for Google Routes API
+TRAVEL_TIME_STRATEGY = os.getenv("TRAVEL_TIME_STRATEGY", "estimate")
+# Travel mode of the estimates and of Google Routes API, one of TRAVEL_SPEED_KMH
+TRAVEL_MODE = os.getenv("TRAVEL_MODE", "DRIVE").upper()
+if TRAVEL_MODE not in TRAVEL_SPEED_KMH:
+    raise ValueError(f"Unknown TRAVEL_MODE {TRAVEL_MODE!r}, expected one of {', '.join(TRAVEL_SPEED_KMH)}.")
+ROUTE_CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", 7 * 24 * 3600))
+
+# Trip header photos only depend on the main destination, so they are shared between all trips and requests
+trip_photo_cache = TTLCache(maxsize=1024, ttl=TRIP_PHOTO_CACHE_TTL, name="trip_photo")
+
+# Rendered planning details keyed by (trip_id, trip version, username, fields) in the namespace of the trip, a new
+# version makes old entries unreachable
+planning_details_cache = TTLCache(maxsize=2048, ttl=PLANNING_DETAILS_CACHE_TTL, name="planning_details")
+
+# Google Routes API results keyed by (from dest ID, to dest ID, travel mode)
+route_cache = TTLCache(maxsize=10000, ttl=ROUTE_CACHE_TTL, name="route")
+
+# Running background route refinements, also keeps a reference to the tasks until they finish
+route_refinements = {}
+
+# Running background refreshes of the stored details of recommended places keyed by trip ID, also keeps a reference
+# to the tasks until they finish
+place_refreshes = {}
+
+# Sub-resources of the planning details that can be selected with the include query parameter
+PLANNING_DETAILS_PARTS = ("photos", "candidates", "activities", "distances")
+
+
+@dataclass(frozen=True)
+class PlanningDetailsFields:
+    """
+    The parts of the planning details requested by the client
+
+    days: Sorted and disjoint (first, last) ranges of the day numbers to include, None for every day
+    include: Sub-resources to include, a subset of PLANNING_DETAILS_PARTS
+    """
+    days: Optional[Tuple[Tuple[int, int], ...]] = None
+    include: FrozenSet[str] = frozenset(PLANNING_DETAILS_PARTS)
+
+    @property
+    def key(self) -> str:
+        days = "all" if self.days is None else ",".join(f"{first}-{last}" for first, last in self.days)
+        return f"days={days};include={','.join(sorted(self.include))}"
+
+    @property
+    def last_day(self) -> Optional[int]:
+        return self.days[-1][1] if self.days else None
+
+    def has_day(self, day_number: int) -> bool:
+        return self.days is None or any(first <= day_number <= last for first, last in self.days)
+
+
+def parse_planning_details_fields(days: Optional[str], include: Optional[str]) -> PlanningDetailsFields:
+    """
+    Parse the field selection query parameters of the planning details.
+
+    :param days: Comma-separated day numbers and ranges, e.g. "1,3-5". An empty value selects no days.
+    :param include: Comma-separated sub-resources from PLANNING_DETAILS_PARTS.
+    :return: The requested fields.
+    """
+    selected_days = None
+
+    if days is not None:
+        ranges = []
+        try:
+            for part in filter(None, (part.strip() for part in days.split(","))):
+                first, _, last = part.partition("-")
+                ranges.append((int(first), int(last or first)))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid days: '{days}'")
+
+        if any(first < 1 or last < first for first, last in ranges):
+            raise HTTPException(status_code=400, detail=f"Invalid days: '{days}', ranges go from day 1 upwards")
+
+        # Ranges are kept as they are rather than expanded, and merged so equivalent selections share a cache key
+        merged_ranges = []
+        for first, last in sorted(ranges):
+            if merged_ranges and first <= merged_ranges[-1][1] + 1:
+                merged_ranges[-1] = (merged_ranges[-1][0], max(merged_ranges[-1][1], last))
+            else:
+                merged_ranges.append((first, last))
+        selected_days = tuple(merged_ranges)
+
+    selected_parts = frozenset(PLANNING_DETAILS_PARTS)
+
+    if include is not None:
+        selected_parts = frozenset(filter(None, (part.strip() for part in include.split(","))))
+        unknown_parts = selected_parts - set(PLANNING_DETAILS_PARTS)
+        if unknown_parts:
+            raise HTTPException(status_code=400, detail=f"Unknown include values: {', '.join(sorted(unknown_parts))}")
+
+    return PlanningDetailsFields(days=selected_days, include=selected_parts)
+
+
+def trip_version_bump(trip_id: int) -> Update:
+    """
+    Build the statement marking a trip as changed, so cached planning details and ETags of the trip are not used.
+
+    :param trip_id: The ID of the trip.
+    :return: The UPDATE statement.
+    """
+    return update(Trips).where(Trips.trip_id == trip_id).values(version=Trips.version + 1)
+
+
+async def bump_trip_version(trip_id: int, db: AsyncSession):
+    """
+    Mark a trip as changed, so cached planning details and ETags of the trip are no longer used.
+
+    The caller is responsible for committing the session.
+
+    :param trip_id: The ID of the trip.
+    :param db: Database session.
+    """
+    await db.execute(trip_version_bump(trip_id))
+    await record_write(("trip", trip_id))
+    await invalidate_namespace(trip_namespace(trip_id))
 
 
 async def get_trip_photo(dest_id: str) -> str:
@@ -25,17 +167,37 @@ async def get_trip_photo(dest_id: str) -> str:
     :param dest_id: The ID of the destination.
     :return: The photo of the destination.
     """
+    photo = await trip_photo_cache.aget(dest_id)
+    if photo is not None:
+        return photo
+
     g_fields = "id,photos"
     response = await get_place_details(dest_id, g_fields)
 
-    photo_names = [photo["name"] for photo in response.get("photos", [])]
-
-    photo = await get_photo(photo_names[0], "800", "800") if photo_names else ""
+    photo = get_photo_url(response["photos"][0]["name"], 800) if response.get("photos") else ""
+    await trip_photo_cache.aset(dest_id, photo)
 
     return photo
 
 
-def get_number_of_votes(trip_day_id: int, members: List, db: Session) -> int:
+def number_of_votes_query(trip_day_id: int, members: List) -> Select:
+    """
+    Build the query counting the members who have voted for a trip day.
+
+    :param trip_day_id: The ID of the trip day.
+    :param members: The list of members in the trip.
+    :return: The SELECT statement.
+    """
+    return (
+        select(func.count(distinct(VoteScores.username)))
+        .join(RecommendedPlaces, VoteScores.recommended_place_id == RecommendedPlaces.recommended_place_id)
+        .where(RecommendedPlaces.trip_day_id == trip_day_id,
+               VoteScores.username.in_(members),
+               VoteScores.is_voted.is_(True))
+    )
+
+
+async def get_number_of_votes(trip_day_id: int, members: List, db: AsyncSession) -> int:
     """
     Get the number of votes for a trip day.
 
@@ -44,54 +206,70 @@ def get_number_of_votes(trip_day_id: int, members: List, db: Session) -> int:
     :param db: Database session.
     :return: The number of votes for the trip day.
     """
-    place = db.query(RecommendedPlaces).filter(RecommendedPlaces.trip_day_id == trip_day_id).first()
+    return (await db.execute(number_of_votes_query(trip_day_id, members))).scalar()
 
-    vote_count = 0
 
-    for member in members:
-        vote_status = get_user_vote_status(member, place, db)
+async def get_voted_members(trip_id: int, db: AsyncSession) -> Dict[int, Set[str]]:
+    """
+    Get the members who have voted, for every day of a trip.
 
-        if vote_status:
-            vote_count += 1
+    :param trip_id: The ID of the trip.
+    :param db: Database session.
+    :return: The usernames of the members who have voted, keyed by trip day ID.
+    """
+    rows = await db.execute(
+        select(RecommendedPlaces.trip_day_id, VoteScores.username)
+        .join(VoteScores, VoteScores.recommended_place_id == RecommendedPlaces.recommended_place_id)
+        .where(RecommendedPlaces.trip_id == trip_id, VoteScores.is_voted.is_(True))
+        .distinct()
+    )
 
-    return vote_count
+    voted_members = defaultdict(set)
 
+    for trip_day_id, username in rows:
+        voted_members[trip_day_id].add(username)
 
-def get_user_vote_status(username: str, place, db: Session) -> bool:
+    return voted_members
+
+
+async def load_trip(trip_id: int, db: AsyncSession) -> Optional[Trips]:
     """
-    Get the vote status of a user for a trip day.
+    Load a trip together with its days, activities and recommended places.
+
+    The whole trip is loaded in a fixed number of queries, whatever the number of days and activities.
 
-    :param username: The username of the user.
-    :param place: Place details from the database.
+    :param trip_id: The ID of the trip.
     :param db: Database session.
-    :return: The vote status of the user.
+    :return: The trip, or None if it does not exist.
     """
-    vote_score = db.query(VoteScores).filter(VoteScores.recommended_place_id == place.recommended_place_id,
-                                             VoteScores.username == username).first()
+    result = await db.execute(
+        select(Trips)
+        .options(
+            selectinload(Trips.days).selectinload(TripDays.activities),
+            selectinload(Trips.days).selectinload(TripDays.recommended_places)
+        )
+        .where(Trips.trip_id == trip_id)
+    )
 
-    return vote_score.is_voted
+    return result.scalar_one_or_none()
 
 
-async def get_destinations_details(dest_id: str) -> Dict:
+async def get_destinations_details(dest_id: str, with_photo: bool = True) -> Dict:
     """
     Get the details of destinations.
 
     :param dest_id: The Google Places Destination ID.
+    :param with_photo: Whether to include the photo of the destination.
     :return: The details of suitable destinations.
     """
-    g_fields = "id,displayName,editorialSummary,photos,location,regularOpeningHours"
+    g_fields = "id,displayName,editorialSummary,location,regularOpeningHours"
+    if with_photo:
+        g_fields += ",photos"
     response = await get_place_details(dest_id, g_fields)
 
-    photo = ""
-
-    if response.get("photos"):
-        photo_name = response["photos"][0]["name"]
-        photo = await get_photo(photo_name)
-
     place_details = {
         "destID": response.get("id"),
         "destName": response.get("displayName")["text"],
-        "photo": photo,
         "desc": response.get("editorialSummary")["text"] if response.get("editorialSummary") else "",
         "openingHours": open_hours_format(
             response.get("regularOpeningHours")["periods"] if response.get("regularOpeningHours") else []),
@@ -99,26 +277,169 @@ async def get_destinations_details(dest_id: str) -> Dict:
         "lon": response.get("location", {}).get("longitude")
     }
 
+    if with_photo:
+        place_details["photo"] = get_photo_url(response["photos"][0]["name"] if response.get("photos") else None)
+
     return place_details
 
 
-async def get_activities_details(trip_day_id: int, db: Session, period: str = None) -> List:
+async def get_destination_snapshot(dest_id: str) -> Dict:
     """
+    Get the details of a destination in the shape stored on a recommended place.
 
-    :return:
+    :param dest_id: The Google Places Destination ID.
+    :return: The recommended place column values.
     """
-    if period:
-        activities = db.query(Activities).filter(Activities.trip_day_id == trip_day_id, Activities.activity_period == period).all()
-    else:
-        activities = db.query(Activities).filter(Activities.trip_day_id == trip_day_id).all()
+    g_fields = "id,displayName,editorialSummary,photos,location,regularOpeningHours"
+    response = await get_place_details(dest_id, g_fields)
+
+    return {
+        "dest_name": response.get("displayName")["text"],
+        "dest_desc": response.get("editorialSummary")["text"] if response.get("editorialSummary") else "",
+        "dest_photo_name": response["photos"][0]["name"] if response.get("photos") else None,
+        "dest_opening_hours": open_hours_format(
+            response.get("regularOpeningHours")["periods"] if response.get("regularOpeningHours") else []),
+        "dest_lat": response.get("location", {}).get("latitude"),
+        "dest_lon": response.get("location", {}).get("longitude"),
+        "snapshot_updated_at": datetime.now(timezone.utc)
+    }
+
+
+def get_places_to_refresh(places: List[RecommendedPlaces]) -> List[RecommendedPlaces]:
+    """
+    Find the recommended places without stored details.
+
+    :param places: The recommended places.
+    :return: The places without stored details.
+    """
+    return [place for place in places if place.snapshot_updated_at is None]
+
+
+@profile_span("refresh_recommended_places")
+async def refresh_recommended_places(trip_id: int, place_ids: List[int]):
+    """
+    Fill in the missing details of recommended places of a trip, and move the trip to a new version once they are
+    written.
 
-    activities_details = []
+    Uses its own session on the primary, as it runs in the background after the request that scheduled it.
 
-    for activity in activities:
-        activity_details = await get_destinations_details(str(activity.activity_dest_id))
-        activities_details += [activity_details]
+    :param trip_id: The ID of the trip.
+    :param place_ids: The IDs of the recommended places.
+    """
+    async with AsyncSessionLocal() as db:
+        places = (await db.execute(
+            select(RecommendedPlaces).where(RecommendedPlaces.recommended_place_id.in_(place_ids))
+        )).scalars().all()
+
+        # Another worker may have refreshed them meanwhile
+        missing = get_places_to_refresh(places)
+
+        if not missing:
+            return
+
+        snapshots = await asyncio.gather(*(get_destination_snapshot(str(place.dest_id)) for place in missing))
+
+        for place, snapshot in zip(missing, snapshots):
+            for column, value in snapshot.items():
+                setattr(place, column, value)
+
+        await db.execute(trip_version_bump(trip_id))
+        await db.commit()
+
+    await record_write(("trip", trip_id))
+    await invalidate_namespace(trip_namespace(trip_id))
+
+
+def schedule_recommended_places_refresh(places: List[RecommendedPlaces]):
+    """
+    Fetch the stored details of recommended places in the background, when some are missing.
+
+    Reads keep serving the stored details and never write. The refreshed details are served once the trip moves to
+    its new version.
+
+    :param places: The recommended places.
+    """
+    place_ids_by_trip = defaultdict(list)
+    for place in get_places_to_refresh(places):
+        place_ids_by_trip[place.trip_id].append(place.recommended_place_id)
 
-    return activities_details
+    for trip_id, place_ids in place_ids_by_trip.items():
+        if trip_id in place_refreshes:
+            continue
+
+        # Started in an empty context, so its statements are not counted in the request that scheduled it
+        task = asyncio.create_task(refresh_recommended_places(trip_id, place_ids), context=contextvars.Context())
+        place_refreshes[trip_id] = task
+        task.add_done_callback(lambda done, trip_id=trip_id: on_place_refresh_done(trip_id, done))
+
+
+def on_place_refresh_done(trip_id: int, task: asyncio.Task):
+    place_refreshes.pop(trip_id, None)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Error refreshing the recommended places of trip %s", trip_id, exc_info=task.exception())
+
+
+def get_recommended_place_details(place: RecommendedPlaces, with_photo: bool = True) -> Dict:
+    """
+    Format the stored details of a recommended place.
+
+    :param place: The recommended place.
+    :param with_photo: Whether to include the photo of the destination.
+    :return: The details of the destination.
+    """
+    place_details = {
+        "destID": place.dest_id,
+        "destName": place.dest_name,
+        "desc": place.dest_desc or "",
+        "openingHours": place.dest_opening_hours or open_hours_format([]),
+        "lat": place.dest_lat,
+        "lon": place.dest_lon
+    }
+
+    if with_photo:
+        place_details["photo"] = get_photo_url(place.dest_photo_name)
+
+    return place_details
+
+
+async def get_activity_details(activity: Activities, with_photo: bool = True) -> Dict:
+    """
+    Format the stored details of the destination of an activity.
+
+    Activities planned before the details were stored with them get the details from Google Places API.
+
+    :param activity: The activity.
+    :param with_photo: Whether to include the photo of the destination.
+    :return: The details of the destination.
+    """
+    if activity.snapshot_updated_at is None:
+        return await get_destinations_details(str(activity.activity_dest_id), with_photo)
+
+    activity_details = {
+        "destID": activity.activity_dest_id,
+        "destName": activity.activity_dest_name,
+        "desc": activity.activity_dest_desc or "",
+        "openingHours": activity.activity_dest_opening_hours or open_hours_format([]),
+        "lat": activity.activity_dest_lat,
+        "lon": activity.activity_dest_lon
+    }
+
+    if with_photo:
+        activity_details["photo"] = get_photo_url(activity.activity_dest_photo_name)
+
+    return activity_details
+
+
+async def get_activities_details(activities: List[Activities], with_photo: bool = True) -> List:
+    """
+    Get the details of the destinations of activities, what is not stored being fetched for all of them at once.
+
+    :param activities: The activities of a trip day.
+    :param with_photo: Whether to include the photos of the destinations.
+    :return: The details of the destinations.
+    """
+    return list(await asyncio.gather(*(get_activity_details(activity, with_photo) for activity in activities)))
 
 
 async def get_distance(from_lat: float, from_lon: float, to_lat: float, to_lon: float) -> Dict:
@@ -126,7 +447,7 @@ async def get_distance(from_lat: float, from_lon: float, to_lat: float, to_lon:
 
     :return:
     """
-    url = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+    url = f"{GOOGLE_ROUTES_BASE_URL}/distanceMatrix/v2:computeRouteMatrix"
 
     payload = json.dumps({
         "origins": [
@@ -179,8 +500,9 @@ async def get_distance(from_lat: float, from_lon: float, to_lat: float, to_lon:
                 }
             }
         ],
-        "travelMode": "DRIVE",
-        "routingPreference": "TRAFFIC_AWARE"
+        "travelMode": TRAVEL_MODE,
+        # Traffic is only taken into account for motorized modes, the API rejects a preference for the others
+        **({"routingPreference": "TRAFFIC_AWARE"} if TRAVEL_MODE in ("DRIVE", "TWO_WHEELER") else {})
     })
     headers = {
         'Content-Type': 'application/json',
@@ -188,7 +510,7 @@ async def get_distance(from_lat: float, from_lon: float, to_lat: float, to_lon:
         'X-Goog-FieldMask': 'originIndex,destinationIndex,duration,distanceMeters'
     }
 
-    res = requests.request("POST", url, headers=headers, data=payload)
+    res = await google_request("route_matrix", "POST", url, headers=headers, data=payload)
 
     try:
         response = res.json()
@@ -198,77 +520,159 @@ async def get_distance(from_lat: float, from_lon: float, to_lat: float, to_lon:
     return response
 
 
-async def get_distance_details(trip_day_id: int, db: Session) -> List:
+async def get_route(from_id: str, from_lat: float, from_lon: float, to_id: str, to_lat: float,
+                    to_lon: float) -> Optional[Tuple[float, float]]:
+    """
+    Get the distance and travel time of a leg from Google Routes API and cache it.
+
+    :param from_id: The Google Places Destination ID of the origin.
+    :param from_lat: The latitude of the origin.
+    :param from_lon: The longitude of the origin.
+    :param to_id: The Google Places Destination ID of the destination.
+    :param to_lat: The latitude of the destination.
+    :param to_lon: The longitude of the destination.
+    :return: The distance in km and duration in minutes, or None if the Routes API is unavailable.
     """
+    try:
+        dist = await get_distance(from_lat, from_lon, to_lat, to_lon)
+        route = (dist[0]["distanceMeters"] / 1000, int(dist[0]["duration"][:-1]) / 60)
+    except (HTTPException, requests.exceptions.RequestException, KeyError, IndexError, TypeError, ValueError) as e:
+        logger.warning("Error fetching route from %s to %s: %s", from_id, to_id, e)
+        return None
 
-    :return:
+    await route_cache.aset((from_id, to_id, TRAVEL_MODE), route)
+
+    return route
+
+
+def refine_route(from_id: str, from_lat: float, from_lon: float, to_id: str, to_lat: float, to_lon: float):
+    """
+    Fetch a leg from Google Routes API in the background, so later views use it instead of the estimate.
+
+    :param from_id: The Google Places Destination ID of the origin.
+    :param from_lat: The latitude of the origin.
+    :param from_lon: The longitude of the origin.
+    :param to_id: The Google Places Destination ID of the destination.
+    :param to_lat: The latitude of the destination.
+    :param to_lon: The longitude of the destination.
     """
-    activities = db.query(Activities).filter(Activities.trip_day_id == trip_day_id).all()
+    key = (from_id, to_id, TRAVEL_MODE)
 
-    distance = []
+    if key in route_refinements:
+        return
 
-    for number in range(1, len(activities)):
-        from_activity = db.query(Activities).filter(Activities.trip_day_id == trip_day_id, Activities.activity_number == number).first()
-        to_activity = db.query(Activities).filter(Activities.trip_day_id == trip_day_id, Activities.activity_number == number + 1).first()
+    task = asyncio.create_task(get_route(from_id, from_lat, from_lon, to_id, to_lat, to_lon))
+    route_refinements[key] = task
+    task.add_done_callback(lambda _: route_refinements.pop(key, None))
 
-        from_lat = from_activity.activity_dest_lat
-        from_lon = from_activity.activity_dest_lon
 
-        to_lat = to_activity.activity_dest_lat
-        to_lon = to_activity.activity_dest_lon
+@profile_span("get_distance_details")
+async def get_distance_details(activities: List[Activities]) -> List:
+    """
+    Get the distance and travel time between consecutive activities of a trip day.
 
-        dist = await get_distance(from_lat, from_lon, to_lat, to_lon)
+    Legs missing from the route cache are estimated locally. With the "estimate" strategy the estimate is returned
+    at once and refined from Google Routes API in the background, with the "routes" strategy Google Routes API is
+    awaited and the estimate is only used when it fails.
+
+    :param activities: The activities of a trip day, ordered by activity number.
+    :return: The distance details of every leg.
+    """
+    estimates = estimate_legs(
+        [activity.activity_dest_lat for activity in activities],
+        [activity.activity_dest_lon for activity in activities],
+        TRAVEL_MODE
+    )
+
+    legs = [
+        (from_activity.activity_dest_id, from_activity.activity_dest_lat, from_activity.activity_dest_lon,
+         to_activity.activity_dest_id, to_activity.activity_dest_lat, to_activity.activity_dest_lon)
+        for from_activity, to_activity in zip(activities, activities[1:])
+    ]
+
+    routes = await route_cache.aget_many([(leg[0], leg[3], TRAVEL_MODE) for leg in legs])
+
+    if TRAVEL_TIME_STRATEGY == "routes":
+        fetched = await asyncio.gather(*(get_route(*leg) for leg, route in zip(legs, routes) if route is None))
+        fetched = iter(fetched)
+        routes = [route if route is not None else next(fetched) for route in routes]
+    else:
+        for leg, route in zip(legs, routes):
+            if route is None:
+                refine_route(*leg)
+
+    distance = []
 
-        duration = dist[0].get("duration")
-        duration = int(duration[:-1]) / 60
+    for from_activity, to_activity, route, estimate in zip(activities, activities[1:], routes, estimates):
+        distance_km, duration_min = route if route is not None else estimate
 
         distance += [{
             "from": from_activity.activity_dest_name,
             "fromID": from_activity.activity_dest_id,
             "to": to_activity.activity_dest_name,
             "toID": to_activity.activity_dest_id,
-            "distance_km": dist[0].get("distanceMeters") / 1000,
-            "duration_min": duration
+            "distance_km": distance_km,
+            "duration_min": duration_min,
+            "estimated": route is None
         }]
 
     return distance
 
 
-async def get_suitable_dest_list(trip_day_id: int, db: Session) -> List:
+def get_suitable_dest_list(places: List[RecommendedPlaces]) -> List:
     """
     Get the list of suitable destinations for a trip day.
 
-    :param trip_day_id: The ID of the trip day.
-    :param db: Database session.
+    :param places: The recommended places of the trip day.
     :return: The list of suitable destinations.
     """
-    places = db.query(RecommendedPlaces).filter(RecommendedPlaces.trip_day_id == trip_day_id).all()
+    schedule_recommended_places_refresh(places)
+
+    return [get_recommended_place_details(place) for place in places]
 
-    suitable_dests = []
 
-    for place in places:
-        dest_details = await get_destinations_details(str(place.dest_id))
-        suitable_dests.append(dest_details)
+async def get_ballot_dest_list(trip_day_id: int, db: AsyncSession) -> List:
+    """
+    Get the name and photo of every candidate destination of a trip day.
 
-    return suitable_dests
+    :param trip_day_id: The ID of the trip day.
+    :param db: Database session.
+    :return: The list of candidate destinations.
+    """
+    places = (await db.execute(
+        select(RecommendedPlaces)
+        .where(RecommendedPlaces.trip_day_id == trip_day_id)
+        .order_by(RecommendedPlaces.recommended_place_id)
+    )).scalars().all()
+
+    suitable_dests = get_suitable_dest_list(places)
+
+    return [
+        {
+            "destID": dest["destID"],
+            "destName": dest["destName"],
+            "photo": dest["photo"]
+        }
+        for dest in suitable_dests
+    ]
 
 
-async def get_trip_day_details(trip_day_id: int, username: str, db: Session):
+async def get_trip_day_details(trip_day: TripDays, members: List[str], voted_members: Set[str], username: str,
+                               fields: PlanningDetailsFields = PlanningDetailsFields()) -> Dict:
     """
     Get the details of a trip day.
 
-    :param trip_day_id: The ID of the trip day.
+    The database is not used here, so the days of a trip can be assembled concurrently. Sub-resources missing from
+    the requested fields are not computed.
+
+    :param trip_day: The trip day, with its activities and refreshed recommended places loaded.
+    :param members: The members of the trip.
+    :param voted_members: The members who have voted for the trip day.
     :param username: The username of the user who is viewing the details.
-    :param db: Database session.
+    :param fields: The requested fields.
     :return: The details of the trip day.
     """
-    trip_day = db.query(TripDays).filter(TripDays.trip_day_id == trip_day_id).first()
-
-    place = db.query(RecommendedPlaces).filter(RecommendedPlaces.trip_day_id == trip_day_id).first()
-
-    trip = db.query(Trips).filter(Trips.trip_id == trip_day.trip_id).first()
-    members = trip.companion.split(",") if trip.companion else []
-    members += [trip.owner]
+    with_photo = "photos" in fields.include
 
     trip_day_details = {}
 
@@ -281,62 +685,264 @@ async def get_trip_day_details(trip_day_id: int, username: str, db: Session):
         trip_day_details = {
             "day": trip_day.day_number,
             "status": "voting",
-            "members_voted": get_number_of_votes(trip_day_id, members, db),
+            "members_voted": len(voted_members & set(members)),
             "total_members": len(members),
-            "user_voted": get_user_vote_status(username, place, db),
-            "suitableDests": await get_suitable_dest_list(trip_day_id, db)
+            "user_voted": username in voted_members
         }
 
+        if "candidates" in fields.include:
+            trip_day_details["suitableDests"] = [
+                get_recommended_place_details(place, with_photo) for place in trip_day.recommended_places
+            ]
+
+    # if status == "planning" the votes are in and the plan is being written
+    if trip_day.vote_status == "planning":
+        trip_day_details = {"day": trip_day.day_number, "status": "planning"}
+
     # if status == "complete" return the complete details
     if trip_day.vote_status == "complete":
         trip_day_details = {
             "day": trip_day.day_number,
-            "status": "complete",
-            "voted_dests": await get_activities_details(trip_day_id, db),
-            "distance": await get_distance_details(trip_day_id, db),
+            "status": "complete"
         }
 
+        if "activities" in fields.include:
+            trip_day_details["voted_dests"] = await get_activities_details(trip_day.activities, with_photo)
+
+        if "distances" in fields.include:
+            trip_day_details["distance"] = await get_distance_details(trip_day.activities)
+
     return trip_day_details
 
 
-@router.get("/")
-async def get_planing_details(trip_id: int, username: str, db: Session = Depends(get_db)) -> Dict:
+def get_planning_details_etag(trip: Trips, username: str, fields: PlanningDetailsFields) -> str:
+    """
+    Get the ETag of the planning details of a trip as seen by a user.
+
+    :param trip: The trip.
+    :param username: The username of the user who is viewing the details.
+    :param fields: The requested fields.
+    :return: The ETag value.
+    """
+    view_hash = hashlib.sha1(f"{username};{fields.key}".encode()).hexdigest()[:12]
+
+    return f'"{trip.trip_id}-{trip.version}-{view_hash}"'
+
+
+def is_etag_matched(request: Request, etag: str) -> bool:
+    """
+    Check whether the If-None-Match header of a request matches an ETag.
+
+    :param request: The request.
+    :param etag: The current ETag.
+    :return: True if the client already has the current version.
+    """
+    if_none_match = request.headers.get("if-none-match")
+
+    if not if_none_match:
+        return False
+
+    client_etags = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+
+    return "*" in client_etags or etag in client_etags
+
+
+async def prepare_planning_details(trip: Trips, db: AsyncSession,
+                                   fields: PlanningDetailsFields = PlanningDetailsFields()) -> Tuple[Trips, Dict]:
+    """
+    Do all the database work needed to assemble the planning details for a trip.
+
+    :param trip: The trip, loaded with load_trip.
+    :param db: The database session.
+    :param fields: The requested fields.
+    :return: The trip and the members who have voted keyed by trip day ID.
+    """
+    voted_members = await get_voted_members(trip.trip_id, db)
+
+    if "candidates" in fields.include:
+        voting_places = [
+            place
+            for trip_day in trip.days if trip_day.vote_status == "voting" and fields.has_day(trip_day.day_number)
+            for place in trip_day.recommended_places
+        ]
+
+        schedule_recommended_places_refresh(voting_places)
+
+    return trip, voted_members
+
+
+async def iter_planning_details(trip: Trips, members: List[str], voted_members: Dict, username: str,
+                                fields: PlanningDetailsFields = PlanningDetailsFields()) -> AsyncIterator[Dict]:
+    """
+    Assemble the planning details for a trip, yielding the trip header first and then every day in order.
+
+    All days are started at once, within PLANNING_DAY_CONCURRENCY, and each one is yielded as soon as it and the
+    days before it are ready. The database is not used, see prepare_planning_details.
+
+    :param trip: The trip, returned by prepare_planning_details.
+    :param members: The members of the trip.
+    :param voted_members: The members who have voted keyed by trip day ID, returned by prepare_planning_details.
+    :param username: The username of the user who is viewing the details.
+    :param fields: The requested fields.
+    :return: The trip header followed by the details of every day.
+    """
+    semaphore = asyncio.Semaphore(PLANNING_DAY_CONCURRENCY)
+
+    async def get_trip_day_details_limited(trip_day: TripDays) -> Dict:
+        async with semaphore:
+            return await get_trip_day_details(trip_day, members, voted_members[trip_day.trip_day_id], username,
+                                              fields)
+
+    day_tasks = [
+        asyncio.create_task(get_trip_day_details_limited(trip_day))
+        for trip_day in trip.days if fields.has_day(trip_day.day_number)
+    ]
+
+    try:
+        trip_header = {
+            "tripName": trip.trip_name,
+            "startDate": trip.start_date,
+            "lastDate": trip.end_date,
+            "lat": trip.dest_lat,
+            "lon": trip.dest_lon,
+            "companion": [
+                {
+                    "username": user,
+                    "profilePic": "not yet implemented"
+                }
+                for user in members
+            ]
+        }
+
+        if "photos" in fields.include:
+            trip_header["photo"] = await get_trip_photo(trip.dest_id)
+
+        yield trip_header
+
+        for day_task in day_tasks:
+            yield await day_task
+    finally:
+        # The client may stop reading early, the remaining days are not needed anymore
+        for day_task in day_tasks:
+            day_task.cancel()
+
+
+async def assemble_planning_details(trip: Trips, members: List[str], username: str, db: AsyncSession,
+                                    fields: PlanningDetailsFields = PlanningDetailsFields()) -> Dict:
+    """
+    Assemble the planning details for a trip.
+
+    :param trip: The trip, loaded with load_trip.
+    :param members: The members of the trip.
+    :param username: The username of the user who is viewing the details.
+    :param db: The database session.
+    :param fields: The requested fields.
+    :return: The planning details for the trip.
+    """
+    trip, voted_members = await prepare_planning_details(trip, db, fields)
+
+    trip_details = None
+    trip_days = []
+
+    async for details in iter_planning_details(trip, members, voted_members, username, fields):
+        if trip_details is None:
+            trip_details = details
+        else:
+            trip_days.append(details)
+
+    trip_details["trip_day"] = trip_days
+
+    return trip_details
+
+
+async def stream_planning_details(trip: Trips, members: List[str], voted_members: Dict, username: str,
+                                  fields: PlanningDetailsFields) -> AsyncIterator[bytes]:
+    """
+    Encode the planning details for a trip as NDJSON records.
+
+    :param trip: The trip, returned by prepare_planning_details.
+    :param members: The members of the trip.
+    :param voted_members: The members who have voted keyed by trip day ID, returned by prepare_planning_details.
+    :param username: The username of the user who is viewing the details.
+    :param fields: The requested fields.
+    :return: One {"type": "trip"} record, then one {"type": "day"} record per day. A day failing after the response
+             has started ends it with an {"type": "error"} record, as its status can no longer be changed.
+    """
+    record_type = "trip"
+
+    try:
+        async for details in iter_planning_details(trip, members, voted_members, username, fields):
+            yield orjson.dumps({"type": record_type, **details}, option=orjson.OPT_APPEND_NEWLINE)
+            record_type = "day"
+    except Exception:
+        logger.exception("Error streaming the planning details of trip %s", trip.trip_id)
+        yield orjson.dumps({"type": "error", "detail": "Internal Server Error"}, option=orjson.OPT_APPEND_NEWLINE)
+
+
+@router.get("/", dependencies=[Depends(query_budget(12)), Depends(authorize_request)],
+            responses={200: {"model": PlanningDetails, "content": {"application/x-ndjson": {}}}})
+async def get_planing_details(trip_id: int, username: str, request: Request, days: Optional[str] = None,
+                              include: Optional[str] = None, stream: bool = False,
+                              db: AsyncSession = Depends(get_trip_read_db)):
     """
     Get planning details for a trip.
 
+    The response carries an ETag derived from the trip version. A request whose If-None-Match matches it gets
+    304 Not Modified, and an unchanged trip is served from the rendered response cache.
+
     :param trip_id: The ID of the trip.
     :param username: The username of the user who is viewing the details.
+    :param request: The request, used to read If-None-Match.
+    :param days: Comma-separated day numbers and ranges to include, e.g. "1,3-5". All days by default, an empty
+                 value returns the trip header only.
+    :param include: Comma-separated sub-resources to include: photos, candidates, activities, distances.
+                    All of them by default.
+    :param stream: Stream the trip header and then every day as soon as it is ready, as NDJSON records.
     :param db: The database session.
     :return: The planning details for the trip.
     """
-    trip = db.query(Trips).filter(Trips.trip_id == trip_id).first()
+    fields = parse_planning_details_fields(days, include)
+
+    trip = await db.get(Trips, trip_id)
+
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found.")
 
-    members = trip.companion.split(",") if trip.companion else []
-    members += [trip.owner]
+    members = get_trip_members(trip)
 
     if username not in members:
         return {"message": "You are not authorized to view this trip."}
 
-    trip_days = db.query(TripDays).filter(TripDays.trip_id == trip_id).all()
+    if fields.last_day is not None and fields.last_day > trip.duration:
+        raise HTTPException(status_code=400, detail=f"Invalid days: '{days}', the trip has {trip.duration} days")
 
-    trip_details = {
-        "tripName": trip.trip_name,
-        "startDate": trip.start_date,
-        "lastDate": trip.end_date,
-        "photo": await get_trip_photo(trip.dest_id),
-        "lat": trip.dest_lat,
-        "lon": trip.dest_lon,
-        "companion": [
-            {
-                "username": user,
-                "profilePic": "not yet implemented"
-            }
-            for user in members
-        ],
-        "trip_day": [
-            await get_trip_day_details(int(str(trip_day.trip_day_id)), username, db)
-            for trip_day in trip_days
-        ]
-    }
+    if stream:
+        loaded_trip, voted_members = await prepare_planning_details(await load_trip(trip_id, db), db, fields)
+        return StreamingResponse(stream_planning_details(loaded_trip, members, voted_members, username, fields),
+                                 media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
 
-    return trip_details
+    etag = get_planning_details_etag(trip, username, fields)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if is_etag_matched(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cache_key = (trip.trip_id, trip.version, username, fields.key)
+    body = await planning_details_cache.aget(cache_key, namespace=trip_namespace(trip_id))
+
+    if body is None:
+        trip_details = await assemble_planning_details(await load_trip(trip_id, db), members, username, db, fields)
+        # The details only hold JSON types, dates and datetimes, so they skip jsonable_encoder
+        body = orjson.dumps(trip_details)
+
+        has_estimates = any(
+            leg["estimated"] for trip_day in trip_details["trip_day"] for leg in trip_day.get("distance", [])
+        )
+
+        # Estimated travel times are replaced once their routes are refined, so they are neither cached nor tagged
+        if has_estimates:
+            return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+
+        await planning_details_cache.aset(cache_key, body, namespace=trip_namespace(trip_id))
+
+    return Response(content=body, media_type="application/json", headers=headers)
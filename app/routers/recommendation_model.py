@@ -4,59 +4,92 @@ from typing import List
 import pandas as pd
 from dotenv import load_dotenv
 from mlxtend.frequent_patterns import apriori
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Trips, User
+from app.cache import TTLCache
+from app.models import Trips, TripMembers, User
+from app.profiling import profile_span
 from app.routers.discover import get_nearby_places_from_api
 
 load_dotenv()
 
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
 
+# Members of a trip, only written when the trip is created so they are cached without invalidation
+TRIP_MEMBERS_CACHE_TTL = float(os.getenv("TRIP_MEMBERS_CACHE_TTL", 600))
 
-def get_members(trip_id: int, db: Session) -> List[str]:
+trip_members_cache = TTLCache(maxsize=4096, ttl=TRIP_MEMBERS_CACHE_TTL, name="trip_members")
+
+
+def get_trip_members(trip: Trips) -> List[str]:
+    """
+    Get the members of the travel group of a loaded trip.
+
+    :param trip: The trip.
+    :return: List of usernames of the members, the companions followed by the owner.
+    """
+    return [member.username for member in trip.members]
+
+
+async def get_members(trip_id: int, db: AsyncSession) -> List[str]:
     """
     Get the members of the travel group.
 
     :param trip_id: The ID of the trip.
     :param db: Database session.
-    :return: List of usernames of the members.
+    :return: List of usernames of the members, the companions followed by the owner.
     """
-    trip = db.query(Trips).filter(Trips.trip_id == trip_id).first()
-    members = trip.companion.split(",") if trip.companion else []
-    members.append(trip.owner)  # Add the owner to the travel group
+    members = await trip_members_cache.aget(trip_id)
 
-    return members
+    if members is None:
+        members = tuple(await db.scalars(
+            select(TripMembers.username)
+            .where(TripMembers.trip_id == trip_id)
+            .order_by(TripMembers.trip_member_id)
+        ))
+        if members:
+            await trip_members_cache.aset(trip_id, members)
 
+    return list(members)
 
-def get_travel_group_preferences(trip_id: int, db: Session) -> pd.DataFrame:
+
+async def get_users_preferences(usernames: List[str], db: AsyncSession) -> pd.DataFrame:
     """
-    Get the preferences of the travel group.
+    Get the preferences of users.
 
+    :param usernames: The usernames of the users.
     :param db: Database session.
-    :param trip_id: The ID of the trip.
     :return: DataFrame containing UserId and Preferences columns.
     """
-    # Get the companion IDs
-    companions = get_members(trip_id, db)
-
-    # Get the preferences of the travel group
-    travel_group_preferences = (
-        db.query(User).filter(User.username.in_(companions)).all()
-    )
+    users = (await db.scalars(select(User).where(User.username.in_(usernames)))).all()
 
     # Convert to DataFrame with correct structure
-    travel_group_preferences_df = pd.DataFrame(
+    return pd.DataFrame(
         [
             {"UserId": user.username, "Preferences": user.preferences}
-            for user in travel_group_preferences
+            for user in users
         ]
     )
 
-    return travel_group_preferences_df
+
+@profile_span("get_travel_group_preferences")
+async def get_travel_group_preferences(trip_id: int, db: AsyncSession) -> pd.DataFrame:
+    """
+    Get the preferences of the travel group.
+
+    :param db: Database session.
+    :param trip_id: The ID of the trip.
+    :return: DataFrame containing UserId and Preferences columns.
+    """
+    # Get the companion IDs
+    companions = await get_members(trip_id, db)
+
+    # Get the preferences of the travel group
+    return await get_users_preferences(companions, db)
 
 
+@profile_span("one_hot_encode_preferences")
 def one_hot_encode_preferences(travel_group: pd.DataFrame) -> pd.DataFrame:
     """
     One-hot encode the preferences of the travel group.
@@ -83,6 +116,7 @@ def one_hot_encode_preferences(travel_group: pd.DataFrame) -> pd.DataFrame:
     return one_hot
 
 
+@profile_span("extract_group_profile")
 def extract_group_profile(encoded_travel_group: pd.DataFrame) -> pd.DataFrame:
     """
     Extract the group profile from the one-hot encoded preferences.
@@ -109,6 +143,7 @@ def extract_group_profile(encoded_travel_group: pd.DataFrame) -> pd.DataFrame:
         return group_profile
 
 
+@profile_span("get_nearby_destinations")
 async def get_nearby_destinations(lat: float, lon: float, max_result: int = 20, radius: int = 8000) -> pd.DataFrame:
     """
     Get nearby places from Google Places API (Nearby Search).
@@ -136,6 +171,7 @@ async def get_nearby_destinations(lat: float, lon: float, max_result: int = 20,
     return nearby_places_df
 
 
+@profile_span("get_suitable_destinations")
 def get_suitable_destinations(destinations: pd.DataFrame, group_profile: List) -> pd.DataFrame:
     """
     Get suitable destinations based on the group profile.
@@ -163,6 +199,7 @@ def get_suitable_destinations(destinations: pd.DataFrame, group_profile: List) -
     return matched_attractions_formatted
 
 
+@profile_span("rank_recommended_attractions")
 def rank_recommended_attractions(suitable_destinations: pd.DataFrame, group_profile: List) -> pd.DataFrame:
     """
     Rank recommended attractions based on the group profile.
@@ -194,6 +231,7 @@ def rank_recommended_attractions(suitable_destinations: pd.DataFrame, group_prof
     return ranked_attractions
 
 
+@profile_span("get_recommendations")
 def get_recommendations(travel_group: pd.DataFrame, destinations: pd.DataFrame) -> pd.DataFrame:
     """
     Get recommendations for the travel group.
@@ -216,7 +254,8 @@ def get_recommendations(travel_group: pd.DataFrame, destinations: pd.DataFrame)
 
 ####################### After Votes #######################
 
-def get_votes(trip_day_id: int, db: Session) -> pd.DataFrame:
+@profile_span("get_votes")
+async def get_votes(trip_day_id: int, db: AsyncSession) -> pd.DataFrame:
     """
     Retrieve vote scores for a specific trip day and return them as a pivoted DataFrame.
 
@@ -233,7 +272,7 @@ def get_votes(trip_day_id: int, db: Session) -> pd.DataFrame:
         WHERE rp.trip_day_id = :trip_day_id
     """)
 
-    results = db.execute(query, {"trip_day_id": trip_day_id}).fetchall()
+    results = (await db.execute(query, {"trip_day_id": trip_day_id})).fetchall()
 
     # Convert results into a Pandas DataFrame
     df = pd.DataFrame(results, columns=["username", "vote_score", "dest_id"])
@@ -247,6 +286,7 @@ def get_votes(trip_day_id: int, db: Session) -> pd.DataFrame:
     return pivot_df
 
 
+@profile_span("get_binary_matrix_from_vote")
 def get_binary_matrix_from_vote(voting_results: pd.DataFrame) -> pd.DataFrame:
     binary_voting_results = voting_results
     binary_voting_results.iloc[:, 1:] = (binary_voting_results.iloc[:, 1:] >= 5).astype(int)
@@ -254,6 +294,7 @@ def get_binary_matrix_from_vote(voting_results: pd.DataFrame) -> pd.DataFrame:
     return binary_voting_results
 
 
+@profile_span("find_frequent_poi_itemsets")
 def find_frequent_poi_itemsets(binary_voting_results: pd.DataFrame, travel_group: pd.DataFrame) -> pd.DataFrame:
     for_apriori_df = binary_voting_results.drop(columns=["username"])
     members = list(travel_group["UserId"].unique())
@@ -272,8 +313,9 @@ def find_frequent_poi_itemsets(binary_voting_results: pd.DataFrame, travel_group
     return frequent_itemsets
 
 
-def get_best_destinations(trip_day_id: int, travel_group: pd.DataFrame, destinations: pd.DataFrame, db: Session) -> pd.DataFrame:
-    voting_results = get_votes(trip_day_id, db)
+@profile_span("get_best_destinations")
+def get_best_destinations(voting_results: pd.DataFrame, travel_group: pd.DataFrame,
+                          destinations: pd.DataFrame) -> pd.DataFrame:
     binary_voting_results = get_binary_matrix_from_vote(voting_results)
     frequent_itemsets = find_frequent_poi_itemsets(binary_voting_results, travel_group)
 
@@ -0,0 +1,65 @@
+import os
+from typing import List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Average door-to-door speed for each travel mode, in km/h
+TRAVEL_SPEED_KMH = {
+    "DRIVE": float(os.getenv("TRAVEL_SPEED_DRIVE_KMH", 30)),
+    "TWO_WHEELER": float(os.getenv("TRAVEL_SPEED_TWO_WHEELER_KMH", 25)),
+    "TRANSIT": float(os.getenv("TRAVEL_SPEED_TRANSIT_KMH", 20)),
+    "BICYCLE": float(os.getenv("TRAVEL_SPEED_BICYCLE_KMH", 12)),
+    "WALK": float(os.getenv("TRAVEL_SPEED_WALK_KMH", 4.5)),
+}
+
+# Roads are rarely straight, so the great-circle distance is scaled up to approximate the road distance
+TRAVEL_DETOUR_FACTOR = float(os.getenv("TRAVEL_DETOUR_FACTOR", 1.3))
+
+
+def haversine_km(from_lat: np.ndarray, from_lon: np.ndarray, to_lat: np.ndarray, to_lon: np.ndarray) -> np.ndarray:
+    """
+    Calculate the great-circle distance between pairs of points.
+
+    :param from_lat: Latitudes of the origins.
+    :param from_lon: Longitudes of the origins.
+    :param to_lat: Latitudes of the destinations.
+    :param to_lon: Longitudes of the destinations.
+    :return: The distances in kilometers.
+    """
+    from_lat, from_lon, to_lat, to_lon = map(np.radians, (from_lat, from_lon, to_lat, to_lon))
+
+    a = (np.sin((to_lat - from_lat) / 2) ** 2
+         + np.cos(from_lat) * np.cos(to_lat) * np.sin((to_lon - from_lon) / 2) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def estimate_legs(lats: List[float], lons: List[float], travel_mode: str = "DRIVE") -> List[Tuple[float, float]]:
+    """
+    Estimate the distance and travel time of every leg of a route in one pass.
+
+    :param lats: Latitudes of the stops, in visiting order.
+    :param lons: Longitudes of the stops, in visiting order.
+    :param travel_mode: The travel mode, one of TRAVEL_SPEED_KMH.
+    :return: The (distance in km, duration in minutes) of every leg between consecutive stops,
+             (None, None) for legs with an unknown location.
+    """
+    if len(lats) < 2:
+        return []
+
+    # Unknown coordinates become NaN and propagate to their legs only
+    lats = np.array(lats, dtype=float)
+    lons = np.array(lons, dtype=float)
+
+    distance_km = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:]) * TRAVEL_DETOUR_FACTOR
+    duration_min = distance_km / TRAVEL_SPEED_KMH[travel_mode] * 60
+
+    return [
+        (None, None) if np.isnan(distance) else (distance, duration)
+        for distance, duration in zip(np.round(distance_km, 3).tolist(), np.round(duration_min, 1).tolist())
+    ]
@@ -1,32 +1,123 @@
-from typing import Dict, List
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.cache import TTLCache
+from app.database import get_async_read_db, query_budget
 from app.models import User
 
+load_dotenv()
+
+# First page of every search, shared by all users as the companion picker loads it every time it opens
+USERS_DIRECTORY_CACHE_TTL = float(os.getenv("USERS_DIRECTORY_CACHE_TTL", 30))
+
+users_directory_cache = TTLCache(maxsize=1024, ttl=USERS_DIRECTORY_CACHE_TTL, name="users_directory")
+
 router = APIRouter(prefix="/api/get-users-data", tags=["users-data"])
 
 
-@router.get("/")
-async def get_user_data(username: str, db: Session = Depends(get_db)) -> List[Dict]:
+def get_prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Get the smallest string greater than every string starting with a prefix, in byte-wise order.
+
+    Byte-wise order of UTF-8 is code point order, so the last character that is not U+10FFFF is incremented, skipping
+    the surrogates, which cannot be encoded.
+
+    :param prefix: The prefix, not empty.
+    :return: The prefix with its last character incremented, None when every character of it is U+10FFFF.
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+
+    if not prefix:
+        return None
+
+    next_code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= next_code_point <= 0xDFFF:
+        next_code_point = 0xE000
+
+    return prefix[:-1] + chr(next_code_point)
+
+
+async def search_users(q: Optional[str], match: str, cursor: Optional[str], limit: int,
+                       db: AsyncSession) -> List[Tuple[int, str]]:
+    """
+    Search users by username, in byte-wise username order.
+
+    Prefixes are searched as a username range and substrings with LIKE, so both are served by the indexes of
+    migration 0005, as is the keyset pagination.
+
+    :param q: The text to search for, all users when empty.
+    :param match: "prefix" to match the start of usernames, "substring" to match anywhere in them.
+    :param cursor: The last username of the previous page, the first page when None.
+    :param limit: The maximum number of users to return.
+    :param db: Database session.
+    :return: The user ID and username of the users found.
     """
-    Get all user data in the database.
+    username = User.username.collate("C")
+    query = select(User.user_id, User.username).order_by(username).limit(limit)
+
+    if q and match == "prefix":
+        upper_bound = get_prefix_upper_bound(q)
+        query = query.where(username >= q)
+        if upper_bound is not None:
+            query = query.where(username < upper_bound)
+    elif q:
+        query = query.where(User.username.contains(q, autoescape=True))
+
+    if cursor is not None:
+        query = query.where(username > cursor)
+
+    return [(user_id, name) for user_id, name in await db.execute(query)]
+
 
+@router.get("/", dependencies=[Depends(query_budget(2))])
+async def get_user_data(response: Response, username: str, q: Optional[str] = None,
+                        match: str = Query("prefix", pattern="^(prefix|substring)$"),
+                        limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                        db: AsyncSession = Depends(get_async_read_db)) -> List[Dict]:
+    """
+    Get the users matching a search, excluding the user who is requesting them.
+
+    The users are paginated by keyset on the username. When there is a next page, its cursor is sent in the
+    X-Next-Cursor header, percent-encoded as usernames may not fit in a header. The first page of a search is cached
+    for USERS_DIRECTORY_CACHE_TTL seconds.
+
+    :param response: The response, to which the X-Next-Cursor header is added.
     :param username: The username of the user who is requesting the data.
+    :param q: The text to search for in usernames, all users when omitted.
+    :param match: "prefix" to match the start of usernames, "substring" to match anywhere in them.
+    :param limit: The maximum number of users to return.
+    :param cursor: The decoded X-Next-Cursor of the previous page, the first page when omitted.
     :param db: Database session.
-    :return: List of dictionaries containing user data.
+    :return: List of dictionaries containing the users of the page.
     """
-    users = db.query(User).filter(User.username != username).all()
+    users = await users_directory_cache.aget((q, match, limit)) if cursor is None else None
+
+    if users is None:
+        # The requesting user is removed afterward, so the page can be shared. Two more users tell whether there
+        # is a next page even once it is removed.
+        users = await search_users(q, match, cursor, limit + 2, db)
+
+        if cursor is None:
+            await users_directory_cache.aset((q, match, limit), users)
+
+    users = [(user_id, name) for user_id, name in users if name != username]
+    if len(users) > limit:
+        response.headers["X-Next-Cursor"] = quote(users[limit - 1][1], safe="")
 
     user_data = [
         {
-            "userId": user.user_id,
-            "name": user.username,
+            "userId": user_id,
+            "name": name,
             "profileImage": "Not yet implemented"
         }
-        for user in users
+        for user_id, name in users[:limit]
     ]
 
     return user_data
@@ -1,44 +1,56 @@
-from datetime import date
-from typing import Dict, List
+import asyncio
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
 
 import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-
-from app.database import get_db
-from app.models import TripDays, Trips, Activities
-from app.routers.create_new_trip import create_recommendations, create_recommendations_record
+from sqlalchemy import update, select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_db, get_trip_read_db, query_budget
+from app.models import TripDays, Trips, Activities, RecommendedPlaces, VoteScores
+from app.profiling import profile_span
+from app.routers.auth import authorize_request, optional_oauth2_scheme
+from app.routers.create_new_trip import create_recommendations, create_recommendations_record, \
+    get_recommendation_snapshots
 from app.routers.discover import get_place_details, open_hours_format
-from app.routers.planning_details import get_planing_details, get_number_of_votes
+from app.routers.planning_details import get_ballot_dest_list, get_number_of_votes, get_trip_photo, \
+    bump_trip_version, number_of_votes_query
 from app.routers.recommendation_model import get_members, get_best_destinations, get_travel_group_preferences, \
-    get_nearby_destinations, get_recommendations
-from app.schemas import PatchVoteScore
+    get_nearby_destinations, get_recommendations, get_trip_members, get_votes
+from app.schemas import PatchVoteScore, VoteDetails
 
 router = APIRouter(prefix="/api/vote", tags=["vote"])
 
 
-def update_vote_status(trip_id: int, trip_day_id: int, db: Session) -> str:
+async def update_vote_status(trip_id: int, trip_day_id: int, db: AsyncSession) -> bool:
     """
     Update the vote status for a trip day.
 
+    The day is moved from "voting" to "planning" with a single conditional UPDATE, so when several members submit
+    their final votes at the same time exactly one request performs the transition and plans the day. The change is
+    not committed, so it is written together with the votes.
+
     :param trip_id: The ID of the trip.
     :param trip_day_id: The ID of the trip day.
     :param db: The database session.
-    :return: The updated vote status.
+    :return: True if this call completed the voting for the day, False otherwise.
     """
-    members = get_members(trip_id, db)
-    vote_counts = get_number_of_votes(trip_day_id, members, db)
+    members = await get_members(trip_id, db)
+    vote_counts = await get_number_of_votes(trip_day_id, members, db)
     total_members = len(members)
 
-    trip_day = db.query(TripDays).filter(TripDays.trip_day_id == trip_day_id).first()
+    if vote_counts != total_members:
+        return False
 
-    if vote_counts == total_members:
-        trip_day.vote_status = "complete"
-        db.commit()
-        db.refresh(trip_day)
+    completed = (await db.execute(
+        update(TripDays)
+        .where(TripDays.trip_day_id == trip_day_id, TripDays.vote_status == "voting")
+        .values(vote_status="planning")
+        .returning(TripDays.trip_day_id)
+    )).first()
 
-    return trip_day.vote_status
+    return completed is not None
 
 
 def get_period(opening_hours: Dict[str, Dict[str, str]], act_date: date) -> str:
@@ -64,50 +76,58 @@ def get_period(opening_hours: Dict[str, Dict[str, str]], act_date: date) -> str:
     return period
 
 
-async def create_activities_record(trip_id: int, day_number: int, dest_id_lst: List[str], db: Session):
+async def get_activities(dest_id_lst: List[str]) -> List[Dict]:
     """
-    Create activities record for a day.
+    Get the activities of a day from Google Places API, with the destination details shown in the plan.
 
-    :param trip_id: The unique identifier of the trip.
-    :param day_number: The day number of the trip.
-    :param dest_id_lst: The list of destination IDs.
-    :param db: The database session.
-    :return:
+    :param dest_id_lst: The list of destination IDs, in the order of the activities.
+    :return: The activities, with the columns of Activities but the trip day.
     """
-    trip_day = db.query(TripDays).filter(TripDays.trip_id == trip_id, TripDays.day_number == day_number).first()
-
-    g_fields = 'id,displayName,location'
-
-    activity_number = 1
-
-    for dest_id in dest_id_lst:
-        dest_detail = await get_place_details(dest_id, g_fields)
-
-        new_activity = Activities(
-            trip_day_id=trip_day.trip_day_id,
-            activity_dest_id=dest_id,
-            activity_dest_name=dest_detail.get('displayName')["text"],
-            activity_dest_lat=dest_detail.get("location", {}).get("latitude"),
-            activity_dest_lon=dest_detail.get("location", {}).get("longitude"),
-            activity_number=activity_number,
-            activity_period="morning"
-        )
+    g_fields = 'id,displayName,editorialSummary,photos,location,regularOpeningHours'
+
+    dest_details = await asyncio.gather(*(get_place_details(dest_id, g_fields) for dest_id in dest_id_lst))
+    now = datetime.now(timezone.utc)
+
+    return [
+        {
+            "activity_dest_id": dest_id,
+            "activity_dest_name": dest_detail.get('displayName')["text"],
+            "activity_dest_desc":
+                dest_detail["editorialSummary"]["text"] if dest_detail.get("editorialSummary") else "",
+            "activity_dest_photo_name": dest_detail["photos"][0]["name"] if dest_detail.get("photos") else None,
+            "activity_dest_opening_hours": open_hours_format(
+                dest_detail["regularOpeningHours"]["periods"] if dest_detail.get("regularOpeningHours") else []),
+            "activity_dest_lat": dest_detail.get("location", {}).get("latitude"),
+            "activity_dest_lon": dest_detail.get("location", {}).get("longitude"),
+            "activity_number": activity_number,
+            "activity_period": "morning",
+            "snapshot_updated_at": now
+        }
+        for activity_number, (dest_id, dest_detail) in enumerate(zip(dest_id_lst, dest_details), start=1)
+    ]
+
+
+async def create_activities_record(trip_day_id: int, activities: List[Dict], db: AsyncSession):
+    """
+    Create activities record for a day.
 
-        db.add(new_activity)
-        db.commit()
+    The records are not committed, so they are written together with the caller's other changes.
 
-        activity_number += 1
+    :param trip_day_id: The ID of the trip day.
+    :param activities: The activities, from get_activities.
+    :param db: The database session.
+    """
+    await db.execute(insert(Activities), [{"trip_day_id": trip_day_id, **activity} for activity in activities])
 
 
-async def create_complete_plan_after_voting(best_dest: pd.DataFrame, trip_id: int, day_number: int, db: Session):
+@profile_span("get_complete_plan_after_voting")
+async def get_complete_plan_after_voting(best_dest: pd.DataFrame, travel_group_preferences: pd.DataFrame) -> List[Dict]:
     """
-    Create a plan after voting is complete.
+    Get the plan of a day after voting is complete: the best destination followed by the most suitable places near it.
 
     :param best_dest: The best destination for the day.
-    :param trip_id: The unique identifier of the trip.
-    :param day_number: The day number of the trip.
-    :param db: Database session.
-    :return: None
+    :param travel_group_preferences: The preferences of the travel group.
+    :return: The activities of the day, from get_activities.
     """
     best_dest_id = best_dest["AttractionId"].values[0]
 
@@ -118,7 +138,6 @@ async def create_complete_plan_after_voting(best_dest: pd.DataFrame, trip_id: in
 
     nearby_places = await get_nearby_destinations(lat, lon, radius=3000)
 
-    travel_group_preferences = get_travel_group_preferences(trip_id, db)
     suitable_destinations = get_recommendations(travel_group_preferences, nearby_places)
     suitable_destinations = suitable_destinations[suitable_destinations["AttractionId"] != best_dest_id]
     suitable_destinations = suitable_destinations.head(4)
@@ -128,89 +147,150 @@ async def create_complete_plan_after_voting(best_dest: pd.DataFrame, trip_id: in
     for i, dest in suitable_destinations.iterrows():
         act_dest_lst += [dest["AttractionId"]]
 
-    await create_activities_record(trip_id, day_number, act_dest_lst, db)
+    return await get_activities(act_dest_lst)
 
 
-async def create_next_day_recommendations(trip_id: int, day_number: int, db: Session):
+@profile_span("plan_voted_day")
+async def plan_voted_day(trip_id: int, trip_day_id: int, day_number: int, dest_id_lst: List[str], db: AsyncSession):
     """
-    Create recommendations for the next day.
+    Plan a day whose voting is complete, create the next day's recommendations and mark the day complete.
+
+    Everything needed is read first and the read transaction is ended, so no connection is held while Google Places
+    API is called. The plan and the recommendations are then written in one short transaction, which moves the day
+    from "planning" to "complete".
 
     :param trip_id: The unique identifier of the trip.
-    :param day_number: The day number of the trip.
+    :param trip_day_id: The ID of the voted trip day.
+    :param day_number: The day number of the voted trip day.
+    :param dest_id_lst: The destination IDs voted on.
     :param db: Database session.
     """
-    trip = db.query(Trips).filter(Trips.trip_id == trip_id).first()
-    trip_day = db.query(TripDays).filter(TripDays.trip_id == trip_id).all()
-
-    trip_day_ids = [day.trip_day_id for day in trip_day]
+    trip = await db.get(Trips, trip_id)
+    members = await get_members(trip_id, db)
+    travel_group = await get_travel_group_preferences(trip_id, db)
+    voting_results = await get_votes(trip_day_id, db)
 
     # Get all previous activity IDs
-    activities = db.query(Activities).filter(Activities.trip_day_id.in_(trip_day_ids)).all()
-    activities_ids = [activity.activity_dest_id for activity in activities]
+    previous_dest_ids = (await db.scalars(
+        select(Activities.activity_dest_id)
+        .join(TripDays, TripDays.trip_day_id == Activities.trip_day_id)
+        .where(TripDays.trip_id == trip_id)
+    )).all()
+
+    await db.commit()
+
+    # get best destination
+    destinations = await get_destinations(dest_id_lst)
+    best_dest_df = get_best_destinations(voting_results, travel_group, destinations)
+
+    activities = await get_complete_plan_after_voting(best_dest_df, travel_group)
+
+    # Get the recommendations for the next day, without the places already planned
+    has_next_day = day_number < trip.duration
+    if has_next_day:
+        planned_dest_ids = list(previous_dest_ids) + [activity["activity_dest_id"] for activity in activities]
+        recommendations = await create_recommendations(travel_group, trip.dest_lat, trip.dest_lon, planned_dest_ids)
+        next_day_places = await get_recommendation_snapshots(recommendations)
+
+    await create_activities_record(trip_day_id, activities, db)
+
+    if has_next_day:
+        await create_recommendations_record(trip_id, next_day_places, members, db, day_number + 1)
+
+    await db.execute(update(TripDays).where(TripDays.trip_day_id == trip_day_id).values(vote_status="complete"))
+    await bump_trip_version(trip_id, db)
+    await db.commit()
+
 
-    # Get the recommendations for the next day
-    recommendations = await create_recommendations(trip_id, trip.dest_lat, trip.dest_lon, db, activities_ids)
+async def reopen_voting(trip_id: int, trip_day_id: int, db: AsyncSession):
+    """
+    Move a day whose planning failed back to voting, so submitting a vote again plans it.
 
-    create_recommendations_record(trip_id, recommendations, db, day_number)
+    :param trip_id: The unique identifier of the trip.
+    :param trip_day_id: The ID of the trip day.
+    :param db: Database session.
+    """
+    await db.execute(
+        update(TripDays)
+        .where(TripDays.trip_day_id == trip_day_id, TripDays.vote_status == "planning")
+        .values(vote_status="voting")
+    )
+    await bump_trip_version(trip_id, db)
+    await db.commit()
 
 
-@router.get("/vote-details")
+@router.get("/vote-details", dependencies=[Depends(query_budget(8)), Depends(authorize_request)],
+            responses={200: {"model": VoteDetails}})
 async def get_destinations_details_for_vote(trip_id: int, day_number: int, username: str,
-                                            db: Session = Depends(get_db)):
+                                            db: AsyncSession = Depends(get_trip_read_db)) -> Dict:
     """
     Get all destinations details for voting.
 
+    Only the requested day is assembled: its candidates and vote counts plus the trip header.
+
     :param trip_id: The unique identifier of the trip.
     :param day_number: The day number of the trip.
     :param username: The username of the user who is requesting the data.
     :param db: Database session.
     :return: List of dictionaries containing destinations details.
     """
-    trip = db.query(Trips).filter(Trips.trip_id == trip_id).first()
+    trip = await db.get(Trips, trip_id)
+
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found.")
 
-    planning_details = await get_planing_details(trip_id, username, db)
+    members = get_trip_members(trip)
 
-    trip_day = db.query(TripDays).filter(TripDays.trip_id == trip_id, TripDays.day_number == day_number).first()
+    if username not in members:
+        return {"message": "You are not authorized to view this trip."}
+
+    trip_day = (await db.execute(
+        select(TripDays).where(TripDays.trip_id == trip_id, TripDays.day_number == day_number)
+    )).scalars().first()
+
+    if not trip_day:
+        raise HTTPException(status_code=404, detail="Trip day not found.")
 
     destinations = []
     members_voted = ""
     total_members = ""
 
-    for day_details in planning_details["trip_day"]:
-        if day_details["day"] == day_number and day_details["status"] == "voting":
-            for dest in day_details["suitableDests"]:
-                dest_details = {
-                    "destID": dest["destID"],
-                    "destName": dest["destName"],
-                    "photo": dest["photo"]
-                }
-                destinations += [dest_details]
-
-            members_voted = day_details["members_voted"]
-            total_members = day_details["total_members"]
+    if trip_day.vote_status == "voting":
+        destinations, photo = await asyncio.gather(
+            get_ballot_dest_list(trip_day.trip_day_id, db),
+            get_trip_photo(trip.dest_id)
+        )
+        members_voted = (await db.execute(number_of_votes_query(trip_day.trip_day_id, members))).scalar()
+        total_members = len(members)
+    else:
+        photo = await get_trip_photo(trip.dest_id)
 
     vote_details = {
         "trip_id": trip.trip_id,
-        "tripName": planning_details["tripName"],
-        "photo": planning_details["photo"],
-        "startDate": planning_details["startDate"],
-        "lastDate": planning_details["lastDate"],
+        "tripName": trip.trip_name,
+        "photo": photo,
+        "startDate": trip.start_date,
+        "lastDate": trip.end_date,
         "voting_date": trip_day.date,
         "members_voted": members_voted,
         "total_members": total_members,
-        "companion": planning_details["companion"],
+        "companion": [
+            {
+                "username": user,
+                "profilePic": "not yet implemented"
+            }
+            for user in members
+        ],
         "destinations": destinations,
     }
 
     return vote_details
 
 
+@profile_span("get_destinations")
 async def get_destinations(dest_id_lst: List[str]) -> pd.DataFrame:
     g_fields = 'id,displayName,types'
-    destinations = []
-    for dest_id in dest_id_lst:
-        place = await get_place_details(dest_id, g_fields)
-        destinations.append(place)
+    destinations = await asyncio.gather(*(get_place_details(dest_id, g_fields) for dest_id in dest_id_lst))
 
     places_df = pd.DataFrame(
         [
@@ -226,71 +306,73 @@ async def get_destinations(dest_id_lst: List[str]) -> pd.DataFrame:
     return places_df
 
 
-@router.patch("/submit-vote")
-async def update_vote_score(vote_score: PatchVoteScore, db: Session = Depends(get_db)) -> Dict:
+@router.patch("/submit-vote", dependencies=[Depends(query_budget(40))])
+async def update_vote_score(vote_score: PatchVoteScore, token: Optional[str] = Depends(optional_oauth2_scheme),
+                            db: AsyncSession = Depends(get_async_db)) -> Dict:
     """
     Submit and update the vote score for a trip day.
 
+    The votes are written in a short transaction holding the lock of the day. The last votes of the day also move it
+    to "planning" in that transaction, then the request that moved it plans the day with plan_voted_day. If planning
+    fails the day is moved back to voting, so it is not left complete without a plan.
+
     :param vote_score: The vote score details.
+    :param token: The bearer token of the request, checked by authorize_request.
     :param db: The database session.
     :return: The message indicating the success of the operation.
     """
+    await authorize_request(vote_score.trip_id, vote_score.voted_person, token, db)
+
     trip_id = vote_score.trip_id
     day_number = vote_score.trip_day_number
-    trip_day = db.query(TripDays).filter(TripDays.trip_id == trip_id,
-                                         TripDays.day_number == day_number).first()
-
-    trip_day_id = trip_day.trip_day_id
+    # The lock makes the votes of a day wait for each other, so the last one counts every vote and completes the day
+    trip_day = (await db.scalars(
+        select(TripDays).where(TripDays.trip_id == trip_id, TripDays.day_number == day_number).with_for_update()
+    )).first()
 
     if not trip_day:
         raise HTTPException(status_code=404, detail="Trip day not found.")
 
+    trip_day_id = trip_day.trip_day_id
+
     try:
         for dest_id, score in vote_score.scores.items():
-            db.execute(
-                text("""
-                    UPDATE vote_scores vs
-                    SET vote_score = :new_score, is_voted = TRUE
-                    FROM recommended_places rp
-                    WHERE vs.recommended_place_id = rp.recommended_place_id
-                    AND rp.trip_day_id = :trip_day_id
-                    AND rp.dest_id = :dest_id
-                    AND vs.username = :username;
-                """),
-                {
-                    "new_score": score,
-                    "trip_day_id": trip_day_id,
-                    "dest_id": dest_id,
-                    "username": vote_score.voted_person
-                }
+            await db.execute(
+                update(VoteScores)
+                .where(
+                    VoteScores.recommended_place_id.in_(
+                        select(RecommendedPlaces.recommended_place_id)
+                        .where(RecommendedPlaces.trip_day_id == trip_day_id, RecommendedPlaces.dest_id == dest_id)
+                    ),
+                    VoteScores.username == vote_score.voted_person
+                )
+                .values(vote_score=score, is_voted=True)
             )
 
-        db.commit()
-
-        vote_status = update_vote_status(trip_id, trip_day_id, db)
+        day_completed = await update_vote_status(trip_id, trip_day_id, db)
 
-        if vote_status == "complete":
-            trip_duration = db.query(Trips).filter(Trips.trip_id == trip_id).first().duration
-            # get best destination
-            travel_group = get_travel_group_preferences(trip_id, db)
+        await bump_trip_version(trip_id, db)
+        await db.commit()
 
-            destinations = await get_destinations(list(vote_score.scores.keys()))
-            best_dest_df = get_best_destinations(trip_day_id, travel_group, destinations, db)
-
-            await create_complete_plan_after_voting(best_dest_df, trip_id, day_number, db)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error updating vote: {str(e)}")
 
-            if day_number < trip_duration:
-                await create_next_day_recommendations(trip_id, day_number + 1, db)
+    # Only the request that completed the voting generates the plan and the next day's recommendations
+    if day_completed:
+        try:
+            await plan_voted_day(trip_id, trip_day_id, day_number, list(vote_score.scores.keys()), db)
 
-        return {"message": "Vote updated successfully."}
+        except Exception as e:
+            await db.rollback()
+            await reopen_voting(trip_id, trip_day_id, db)
+            raise HTTPException(status_code=500, detail=f"Error planning the day: {str(e)}")
 
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error updating vote: {str(e)}")
+    return {"message": "Vote updated successfully."}
 
 
-@router.get("/vote-status")
-async def get_vote_status(trip_id: int, day_number: int, db: Session = Depends(get_db)) -> Dict:
+@router.get("/vote-status", dependencies=[Depends(query_budget(3)), Depends(authorize_request)])
+async def get_vote_status(trip_id: int, day_number: int, db: AsyncSession = Depends(get_trip_read_db)) -> Dict:
     """
     Get the vote status for a trip day.
 
@@ -299,6 +381,8 @@ async def get_vote_status(trip_id: int, day_number: int, db: Session = Depends(g
     :param db: The database session.
     :return: The vote status for the trip day.
     """
-    trip_day = db.query(TripDays).filter(TripDays.trip_id == trip_id, TripDays.day_number == day_number).first()
+    trip_day = (await db.execute(
+        select(TripDays).where(TripDays.trip_id == trip_id, TripDays.day_number == day_number)
+    )).scalars().first()
 
     return {"vote_status": trip_day.vote_status}
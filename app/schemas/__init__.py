@@ -1,3 +1,6 @@
+from app.schemas.discover import DiscoverPlaceDetails
 from app.schemas.new_trip import CreateNewTrip
 from app.schemas.new_user import CreateNewUser
 from app.schemas.patch_vote_score import PatchVoteScore
+from app.schemas.planning_details import PlanningDetails
+from app.schemas.vote_details import VoteDetails
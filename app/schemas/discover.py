@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class OpeningPeriod(BaseModel):
+    """
+    Pydantic model for the opening hours of a destination on one day of the week.
+
+    open: Opening time, e.g. "09:00"
+    close: Closing time, e.g. "18:00"
+    """
+    open: str
+    close: str
+
+
+class NearbyPlace(BaseModel):
+    """
+    Pydantic model for a place near a discovered destination.
+
+    destID: Google Places Destination ID
+    destName: Name of the place
+    photos: URL of the photo of the place, empty when it has none
+    """
+    destID: str
+    destName: str
+    photos: str
+
+
+class Facilities(BaseModel):
+    """
+    Pydantic model for the facilities of a discovered destination.
+
+    goodForChildren: Whether the destination is good for children, None when unknown
+    accessibility: Accessibility options from Google Places API, e.g. {"wheelchairAccessibleEntrance": true}
+    """
+    goodForChildren: Optional[bool] = None
+    accessibility: Optional[Dict[str, bool]] = None
+
+
+class DiscoverPlaceDetails(BaseModel):
+    """
+    Pydantic model for the details of a discovered destination.
+
+    destID: Google Places Destination ID
+    destName: Name of the destination
+    destType: Google Places types of the destination
+    desc: Description of the destination, empty when it has none
+    rating: Google rating of the destination
+    address: Formatted address of the destination
+    phoneNum: International phone number of the destination
+    fac: Facilities of the destination
+    photos: URLs of the photos of the destination, None for the photos that could not be fetched
+    lat: Latitude of the destination
+    lon: Longitude of the destination
+    nearbyPlaces: Places near the destination
+    openingHours: Opening hours keyed by day of the week, e.g. "Monday"
+    """
+    destID: str
+    destName: str
+    destType: Optional[List[str]] = None
+    desc: str
+    rating: Optional[float] = None
+    address: Optional[str] = None
+    phoneNum: Optional[str] = None
+    fac: Facilities
+    photos: List[Optional[str]]
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    nearbyPlaces: List[NearbyPlace]
+    openingHours: Dict[str, OpeningPeriod]
@@ -0,0 +1,107 @@
+from datetime import date
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.schemas.discover import OpeningPeriod
+
+
+class Companion(BaseModel):
+    """
+    Pydantic model for a member of a trip.
+
+    username: Username of the member
+    profilePic: Profile picture of the member
+    """
+    username: str
+    profilePic: str
+
+
+class DestinationDetails(BaseModel):
+    """
+    Pydantic model for a destination of a trip day, a candidate or a planned activity.
+
+    destID: Google Places Destination ID
+    destName: Name of the destination
+    desc: Description of the destination, empty when it has none
+    openingHours: Opening hours keyed by day of the week, e.g. "Monday"
+    lat: Latitude of the destination
+    lon: Longitude of the destination
+    photo: URL of the photo of the destination, only when photos are included
+    """
+    destID: str
+    destName: str
+    desc: str
+    openingHours: Dict[str, OpeningPeriod]
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    photo: Optional[str] = None
+
+
+class DistanceDetails(BaseModel):
+    """
+    Pydantic model for the leg between two consecutive activities of a trip day.
+
+    from: Name of the origin
+    fromID: Google Places Destination ID of the origin
+    to: Name of the destination
+    toID: Google Places Destination ID of the destination
+    distance_km: Distance in km
+    duration_min: Travel time in minutes
+    estimated: Whether the leg is a local estimate, replaced once Google Routes API answered
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    from_: str = Field(alias="from")
+    fromID: str
+    to: str
+    toID: str
+    distance_km: float
+    duration_min: float
+    estimated: bool
+
+
+class TripDayDetails(BaseModel):
+    """
+    Pydantic model for a day of a trip, its fields depend on its status.
+
+    day: Day number of the trip, e.g. 1, 2, 3, ...
+    status: "pending", "voting" or "complete"
+    members_voted: Number of members who have voted (voting)
+    total_members: Number of members of the trip (voting)
+    user_voted: Whether the viewing user has voted (voting)
+    suitableDests: The candidate destinations (voting)
+    voted_dests: The planned activities (complete)
+    distance: The legs between the planned activities (complete)
+    """
+    day: int
+    status: str
+    members_voted: Optional[int] = None
+    total_members: Optional[int] = None
+    user_voted: Optional[bool] = None
+    suitableDests: Optional[List[DestinationDetails]] = None
+    voted_dests: Optional[List[DestinationDetails]] = None
+    distance: Optional[List[DistanceDetails]] = None
+
+
+class PlanningDetails(BaseModel):
+    """
+    Pydantic model for the planning details of a trip. Fields that were not requested are left out.
+
+    tripName: Name of the trip
+    startDate: Start date of the trip
+    lastDate: End date of the trip
+    lat: Latitude of the main destination
+    lon: Longitude of the main destination
+    companion: The members of the trip, the companions followed by the owner
+    photo: URL of the photo of the main destination, only when photos are included
+    trip_day: The requested days of the trip
+    """
+    tripName: str
+    startDate: date
+    lastDate: date
+    lat: float
+    lon: float
+    companion: List[Companion]
+    photo: Optional[str] = None
+    trip_day: List[TripDayDetails]
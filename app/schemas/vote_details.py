@@ -0,0 +1,46 @@
+from datetime import date
+from typing import List, Optional, Union
+
+from pydantic import BaseModel
+
+from app.schemas.planning_details import Companion
+
+
+class BallotDestination(BaseModel):
+    """
+    Pydantic model for a candidate destination of the day being voted on.
+
+    destID: Google Places Destination ID
+    destName: Name of the destination
+    photo: URL of the photo of the destination
+    """
+    destID: str
+    destName: str
+    photo: Optional[str] = None
+
+
+class VoteDetails(BaseModel):
+    """
+    Pydantic model for the details of a trip day shown to vote on it.
+
+    trip_id: The ID of the trip
+    tripName: Name of the trip
+    photo: URL of the photo of the main destination
+    startDate: Start date of the trip
+    lastDate: End date of the trip
+    voting_date: Date of the trip day
+    members_voted: Number of members who have voted, empty when the day is not being voted on
+    total_members: Number of members of the trip, empty when the day is not being voted on
+    companion: The members of the trip, the companions followed by the owner
+    destinations: The candidate destinations, empty when the day is not being voted on
+    """
+    trip_id: int
+    tripName: str
+    photo: Optional[str] = None
+    startDate: date
+    lastDate: date
+    voting_date: date
+    members_voted: Union[int, str]
+    total_members: Union[int, str]
+    companion: List[Companion]
+    destinations: List[BallotDestination]
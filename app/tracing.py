@@ -0,0 +1,112 @@
+import os
+
+from dotenv import load_dotenv
+from opentelemetry import trace
+
+load_dotenv()
+
+# "off", "file" to append spans as JSON lines to TRACING_FILE, "otlp" to send them to a collector over OTLP/HTTP,
+# set with the standard OTEL_EXPORTER_OTLP_ENDPOINT (http://localhost:4318 by default)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "off").lower()
+TRACING_ENABLED = TRACING_EXPORTER != "off"
+
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+
+# Share of traces recorded, requests carrying a sampled traceparent header are always recorded
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", 1))
+
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "togetherwherever-backend")
+
+# Paths of the requests without a span
+UNTRACED_PATHS = ("/api/auth/login/verify-token/", "/metrics")
+
+tracer = trace.get_tracer("app")
+
+
+def setup_tracing():
+    """
+    Install the tracer provider and exporter set by TRACING_EXPORTER, once per worker before the app starts.
+
+    FastAPI then records a span per request, named after its route and continuing the trace of its traceparent header,
+    parent of the spans of its SQL statements, Google API calls and profile_span blocks.
+    """
+    if not TRACING_ENABLED:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if TRACING_EXPORTER == "file":
+        # Line buffered, so every span is written at once and the workers can append to the same file
+        exporter = ConsoleSpanExporter(out=open(TRACING_FILE, "a", buffering=1),
+                                       formatter=lambda span: span.to_json(indent=None) + "\n")
+    elif TRACING_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError as e:
+            raise RuntimeError("TRACING_EXPORTER=otlp requires the opentelemetry-exporter-otlp-proto-http package: "
+                               "pip install opentelemetry-exporter-otlp-proto-http") from e
+        exporter = OTLPSpanExporter()
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER {TRACING_EXPORTER!r}, expected off, file or otlp.")
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME, "process.pid": os.getpid()}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATE)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def shutdown_tracing():
+    """
+    Export the spans still buffered, when the worker shuts down.
+    """
+    provider = trace.get_tracer_provider()
+    if TRACING_ENABLED and hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+def set_span_attributes(**attributes):
+    """
+    Set attributes on the current span, e.g. the one of the enclosing profile_span. None values are left out.
+
+    :param attributes: The attributes, dots in their names written as double underscores, e.g. google__field_mask.
+    """
+    if not TRACING_ENABLED:
+        return
+
+    span = trace.get_current_span()
+    if span.is_recording():
+        for name, value in attributes.items():
+            if value is not None:
+                span.set_attribute(name.replace("__", "."), value)
+
+
+def add_span_event(name: str, **attributes):
+    """
+    Add an event to the current span, e.g. a cache lookup.
+
+    :param name: The event name.
+    :param attributes: The event attributes, dots in their names written as double underscores.
+    """
+    if not TRACING_ENABLED:
+        return
+
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.add_event(name, {key.replace("__", "."): value for key, value in attributes.items()})
+
+
+def is_excluded_from_tracing(scope) -> bool:
+    """
+    Tell whether a request is left out of the request spans FastAPI records once tracing is set up.
+
+    Token verifications carry the token in their path, which FastAPI would record, and metrics scrapes are noise.
+
+    :param scope: The ASGI scope of the request, before it is routed.
+    :return: True to record no span for the request.
+    """
+    return scope["path"].startswith(UNTRACED_PATHS)
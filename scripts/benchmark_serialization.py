@@ -0,0 +1,270 @@
+"""
+Benchmark of the JSON encoding and compression of the largest responses: planning details, discover and vote details.
+
+Payloads are built from the places of scripts/mock_google.py, shaped like the responses of the endpoints. Every
+encoder is timed on every payload, then the encoded payloads are compressed at the levels used by
+app/compression.py:
+- jsonable_encoder + json: FastAPI's path for endpoints without a return type, and planning details before orjson
+- Dict return type: FastAPI's Pydantic path for endpoints annotated "-> Dict"
+- response model: FastAPI's Pydantic path for endpoints annotated with their response model
+- jsonable_encoder + orjson: ORJSONResponse as the default response class
+- orjson: the planning details body, cached and streamed
+
+Usage: python -m scripts.benchmark_serialization [--days 7] [--places 10] [--iterations 200] [--json report.json]
+"""
+import argparse
+import gzip
+import json
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+from app.routers.discover import open_hours_format
+from app.schemas import DiscoverPlaceDetails, PlanningDetails, VoteDetails
+from scripts.mock_google import get_place, get_place_id
+
+LAT, LON = 13.7563, 100.5018
+
+
+def get_destination_details(place_id: str) -> Dict:
+    place = get_place(place_id)
+
+    return {
+        "destID": place["id"],
+        "destName": place["displayName"]["text"],
+        "desc": place["editorialSummary"]["text"],
+        "openingHours": open_hours_format(place["regularOpeningHours"]["periods"]),
+        "lat": place["location"]["latitude"],
+        "lon": place["location"]["longitude"],
+        "photo": f"https://example.com/mock-photos/{place['photos'][0]['name']}.jpg",
+    }
+
+
+def get_companions(count: int) -> List[Dict]:
+    return [{"username": f"user_{n}", "profilePic": "not yet implemented"} for n in range(count)]
+
+
+def get_planning_details_payload(days: int, places: int) -> Dict:
+    """
+    Build planning details with every day complete but the last one, which is being voted on.
+
+    :param days: Number of days of the trip.
+    :param places: Number of candidate destinations of the day being voted on.
+    :return: The planning details.
+    """
+    trip_days = []
+
+    for day_number in range(1, days):
+        activities = [get_destination_details(get_place_id(LAT, LON, day_number * 100 + n)) for n in range(5)]
+        trip_days.append({
+            "day": day_number,
+            "status": "complete",
+            "voted_dests": activities,
+            "distance": [
+                {
+                    "from": from_activity["destName"],
+                    "fromID": from_activity["destID"],
+                    "to": to_activity["destName"],
+                    "toID": to_activity["destID"],
+                    "distance_km": 3.2,
+                    "duration_min": 11.5,
+                    "estimated": False,
+                }
+                for from_activity, to_activity in zip(activities, activities[1:])
+            ],
+        })
+
+    trip_days.append({
+        "day": days,
+        "status": "voting",
+        "members_voted": 2,
+        "total_members": 4,
+        "user_voted": False,
+        "suitableDests": [get_destination_details(get_place_id(LAT, LON, days * 100 + n)) for n in range(places)],
+    })
+
+    return {
+        "tripName": "Benchmark trip",
+        "startDate": date.today(),
+        "lastDate": date.today() + timedelta(days=days - 1),
+        "lat": LAT,
+        "lon": LON,
+        "companion": get_companions(4),
+        "photo": "https://example.com/mock-photos/trip.jpg",
+        "trip_day": trip_days,
+    }
+
+
+def get_discover_payload() -> Dict:
+    place = get_place(get_place_id(LAT, LON, 0))
+
+    return {
+        "destID": place["id"],
+        "destName": place["displayName"]["text"],
+        "destType": place["types"],
+        "desc": place["editorialSummary"]["text"],
+        "rating": place["rating"],
+        "address": place["formattedAddress"],
+        "phoneNum": place["internationalPhoneNumber"],
+        "fac": {
+            "goodForChildren": place["goodForChildren"],
+            "accessibility": place["accessibilityOptions"],
+        },
+        "photos": [f"https://example.com/mock-photos/{photo['name']}.jpg" for photo in place["photos"]],
+        "lat": place["location"]["latitude"],
+        "lon": place["location"]["longitude"],
+        "nearbyPlaces": [
+            {
+                "destID": nearby["destID"],
+                "destName": nearby["destName"],
+                "photos": nearby["photo"],
+            }
+            for nearby in map(get_destination_details, (get_place_id(LAT, LON, n) for n in range(1, 9)))
+        ],
+        "openingHours": open_hours_format(place["regularOpeningHours"]["periods"]),
+    }
+
+
+def get_vote_details_payload(places: int) -> Dict:
+    return {
+        "trip_id": 1,
+        "tripName": "Benchmark trip",
+        "photo": "https://example.com/mock-photos/trip.jpg",
+        "startDate": date.today(),
+        "lastDate": date.today() + timedelta(days=2),
+        "voting_date": date.today() + timedelta(days=1),
+        "members_voted": 2,
+        "total_members": 4,
+        "companion": get_companions(4),
+        "destinations": [
+            {"destID": details["destID"], "destName": details["destName"], "photo": details["photo"]}
+            for details in map(get_destination_details, (get_place_id(LAT, LON, n) for n in range(places)))
+        ],
+    }
+
+
+def get_encoders(model) -> Dict[str, Callable[[Any], bytes]]:
+    """
+    Get the encoders to compare on a payload.
+
+    :param model: The response model of the payload.
+    :return: The encoders keyed by name.
+    """
+    dict_adapter = TypeAdapter(Dict)
+    model_adapter = TypeAdapter(model)
+
+    return {
+        "jsonable_encoder + json": lambda payload: JSONResponse(jsonable_encoder(payload)).body,
+        "Dict return type": lambda payload: dict_adapter.dump_json(dict_adapter.validate_python(payload)),
+        "response model": lambda payload: model_adapter.dump_json(model_adapter.validate_python(payload),
+                                                                  by_alias=True, exclude_unset=True),
+        "jsonable_encoder + orjson": lambda payload: orjson.dumps(jsonable_encoder(payload)),
+        "orjson": orjson.dumps,
+    }
+
+
+def time_call(func: Callable, argument: Any, iterations: int) -> float:
+    """
+    Time a function, keeping the fastest of three rounds to leave out the noise of other processes.
+
+    :param func: The function.
+    :param argument: The argument of every call.
+    :param iterations: Number of calls per round.
+    :return: The time of one call, in microseconds.
+    """
+    best = float("inf")
+
+    for _ in range(3):
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            func(argument)
+        best = min(best, (time.perf_counter() - start_time) / iterations)
+
+    return best * 1_000_000
+
+
+def get_report(payloads: Dict[str, Any], iterations: int) -> Dict[str, Dict]:
+    """
+    Time every encoder and compression of every payload.
+
+    :param payloads: The payloads and their response models, keyed by name.
+    :param iterations: Number of calls per round.
+    :return: The encoding and compression results of every payload.
+    """
+    report = {}
+
+    for name, (payload, model) in payloads.items():
+        encoders = {}
+        for encoder_name, encoder in get_encoders(model).items():
+            body = encoder(payload)
+            if orjson.loads(body) != orjson.loads(orjson.dumps(payload)):
+                raise ValueError(f"{encoder_name} changed the {name} payload")
+            encoders[encoder_name] = {"us": round(time_call(encoder, payload, iterations), 1), "bytes": len(body)}
+
+        body = orjson.dumps(payload)
+        compressions = {
+            "none": {"us": 0, "bytes": len(body)},
+            f"gzip {GZIP_LEVEL}": {
+                "us": round(time_call(lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0), body, iterations), 1),
+                "bytes": len(gzip.compress(body, GZIP_LEVEL, mtime=0)),
+            },
+        }
+        if brotli is not None:
+            compressions[f"brotli {BROTLI_QUALITY}"] = {
+                "us": round(time_call(lambda data: brotli.compress(data, quality=BROTLI_QUALITY), body, iterations), 1),
+                "bytes": len(brotli.compress(body, quality=BROTLI_QUALITY)),
+            }
+
+        report[name] = {"encoders": encoders, "compression": compressions}
+
+    return report
+
+
+def print_report(report: Dict[str, Dict]):
+    for name, results in report.items():
+        print(f"\n{name}")
+        baseline = results["encoders"]["jsonable_encoder + json"]["us"]
+        print(f"  {'Encoder':<28} {'us/call':>9} {'Speed-up':>9} {'Bytes':>9}")
+        for encoder_name, stats in results["encoders"].items():
+            print(f"  {encoder_name:<28} {stats['us']:>9} {baseline / stats['us']:>8.1f}x {stats['bytes']:>9}")
+
+        uncompressed = results["compression"]["none"]["bytes"]
+        print(f"  {'Compression':<28} {'us/call':>9} {'Ratio':>9} {'Bytes':>9}")
+        for compression_name, stats in results["compression"].items():
+            print(f"  {compression_name:<28} {stats['us']:>9} {stats['bytes'] / uncompressed:>9.2f} "
+                  f"{stats['bytes']:>9}")
+
+    if brotli is None:
+        print("\nbrotli is not installed, only gzip was measured: pip install brotli")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the JSON encoding and compression of responses.")
+    parser.add_argument("--days", type=int, default=7, help="Days of the planning details trip.")
+    parser.add_argument("--places", type=int, default=10, help="Candidate destinations of a day being voted on.")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per encoder and payload, per round.")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file.")
+    args = parser.parse_args()
+
+    payloads = {
+        f"planning details ({args.days} days)": (get_planning_details_payload(args.days, args.places), PlanningDetails),
+        "discover": (get_discover_payload(), DiscoverPlaceDetails),
+        "vote details": (get_vote_details_payload(args.places), VoteDetails),
+    }
+
+    report = get_report(payloads, args.iterations)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Check that the final votes of a trip day, submitted at the same time, complete the day and plan it exactly once.
+
+Seeds a trip whose members have not voted on its first day yet, has every member submit their vote at once, then
+checks the day is complete with a single plan and the next day has a single set of recommendations. The seeded rows
+are deleted at the end.
+
+Set up, as for the load test:
+    python -m scripts.mock_google --port 8090
+    GOOGLE_PLACES_BASE_URL=http://localhost:8090/v1 GOOGLE_ROUTES_BASE_URL=http://localhost:8090 \\
+        uvicorn app.main:app --port 8000 --workers 4
+
+Usage: python -m scripts.check_concurrent_votes [--base-url http://localhost:8000] [--members 8] [--rounds 3]
+"""
+import argparse
+import random
+import sys
+import threading
+import uuid
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import requests
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection
+
+from app.database import engine
+from app.models import User, Trips, TripMembers, TripDays, RecommendedPlaces, VoteScores, Activities
+from scripts.seed_data import seed_trip, seed_users
+
+PLACES_PER_DAY = 5
+
+
+def submit_votes(base_url: str, trip_id: int, members: List[str], dest_ids: List[str]) -> List[int]:
+    """
+    Submit the votes of every member on the first day of a trip at the same time.
+
+    :param base_url: URL of the backend.
+    :param trip_id: The ID of the trip.
+    :param members: The members of the trip.
+    :param dest_ids: The places recommended for the day.
+    :return: The status code of every vote.
+    """
+    barrier = threading.Barrier(len(members))
+
+    def vote(member: str) -> int:
+        payload = {
+            "trip_id": trip_id,
+            "trip_day_number": 1,
+            "voted_person": member,
+            "scores": {dest_id: random.randint(0, 10) for dest_id in dest_ids},
+        }
+        barrier.wait()
+        return requests.patch(f"{base_url}/api/vote/submit-vote", json=payload, timeout=60).status_code
+
+    with ThreadPoolExecutor(max_workers=len(members)) as executor:
+        return list(executor.map(vote, members))
+
+
+def check_trip(connection: Connection, trip_id: int) -> List[str]:
+    """
+    Check the first day of a trip is complete with a single plan, and the second day has a single set of
+    recommendations.
+
+    :param connection: The database connection.
+    :param trip_id: The ID of the trip.
+    :return: The failures found.
+    """
+    days = {day.day_number: day for day in connection.execute(select(TripDays).where(TripDays.trip_id == trip_id))}
+    failures = []
+
+    if days[1].vote_status != "complete":
+        failures.append(f"trip {trip_id}: day 1 is {days[1].vote_status}, expected complete")
+
+    activities, distinct_numbers = connection.execute(
+        select(func.count(), func.count(Activities.activity_number.distinct()))
+        .where(Activities.trip_day_id == days[1].trip_day_id)
+    ).one()
+    if activities == 0 or activities != distinct_numbers:
+        failures.append(f"trip {trip_id}: day 1 has {activities} activities for {distinct_numbers} activity numbers")
+
+    places, distinct_places = connection.execute(
+        select(func.count(), func.count(RecommendedPlaces.dest_id.distinct()))
+        .where(RecommendedPlaces.trip_day_id == days[2].trip_day_id)
+    ).one()
+    if days[2].vote_status != "voting" or places == 0 or places != distinct_places:
+        failures.append(f"trip {trip_id}: day 2 is {days[2].vote_status} with {places} recommendations "
+                        f"of {distinct_places} places")
+
+    return failures
+
+
+def delete_seeded_rows(connection: Connection, trip_ids: List[int], usernames: List[str]):
+    """
+    Delete the seeded trips, with everything the backend created for them, and users.
+
+    :param connection: The database connection.
+    :param trip_ids: The IDs of the seeded trips.
+    :param usernames: The seeded usernames.
+    """
+    trip_day_ids = select(TripDays.trip_day_id).where(TripDays.trip_id.in_(trip_ids))
+    place_ids = select(RecommendedPlaces.recommended_place_id).where(RecommendedPlaces.trip_id.in_(trip_ids))
+
+    connection.execute(delete(VoteScores).where(VoteScores.recommended_place_id.in_(place_ids)))
+    connection.execute(delete(RecommendedPlaces).where(RecommendedPlaces.trip_id.in_(trip_ids)))
+    connection.execute(delete(Activities).where(Activities.trip_day_id.in_(trip_day_ids)))
+    connection.execute(delete(TripDays).where(TripDays.trip_id.in_(trip_ids)))
+    connection.execute(delete(TripMembers).where(TripMembers.trip_id.in_(trip_ids)))
+    connection.execute(delete(Trips).where(Trips.trip_id.in_(trip_ids)))
+    connection.execute(delete(User).where(User.username.in_(usernames)))
+
+
+def check_concurrent_votes(base_url: str, members: int, rounds: int) -> List[str]:
+    """
+    Seed a trip per round and submit the votes of all its members at once.
+
+    :param base_url: URL of the backend.
+    :param members: Number of members of every trip, all voting at the same time.
+    :param rounds: Number of trips voted on, one after the other.
+    :return: The failures found.
+    """
+    prefix = f"vote_check_{uuid.uuid4().hex[:8]}"
+    seed_args = Namespace(members=members, days=2, complete_days=0, places=PLACES_PER_DAY, voted_fraction=0)
+    trip_ids, failures = [], []
+
+    with engine.begin() as connection:
+        usernames = seed_users(connection, prefix, members, "password")
+
+    try:
+        for number in range(1, rounds + 1):
+            with engine.begin() as connection:
+                trip = seed_trip(connection, prefix, number, usernames, seed_args)
+            trip_ids.append(trip["trip_id"])
+
+            with engine.connect() as connection:
+                dest_ids = connection.execute(
+                    select(RecommendedPlaces.dest_id)
+                    .join(TripDays, TripDays.trip_day_id == RecommendedPlaces.trip_day_id)
+                    .where(TripDays.trip_id == trip["trip_id"], TripDays.day_number == 1)
+                ).scalars().all()
+
+            statuses = submit_votes(base_url, trip["trip_id"], trip["members"], dest_ids)
+            print(f"Trip {trip['trip_id']}: {len(statuses)} votes answered {sorted(set(statuses))}")
+
+            failures += [f"trip {trip['trip_id']}: a vote was answered {status}" for status in statuses
+                         if status != 200]
+            with engine.connect() as connection:
+                failures += check_trip(connection, trip["trip_id"])
+    finally:
+        with engine.begin() as connection:
+            delete_seeded_rows(connection, trip_ids, usernames)
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check concurrent final votes complete a day exactly once.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--members", type=int, default=8, help="Members of every trip, all voting at once.")
+    parser.add_argument("--rounds", type=int, default=3, help="Number of trips voted on.")
+    args = parser.parse_args()
+
+    failures = check_concurrent_votes(args.base_url, args.members, args.rounds)
+
+    if failures:
+        print("\nConcurrent vote check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    print("\nEvery day was completed and planned exactly once.")
+
+
+if __name__ == "__main__":
+    main()
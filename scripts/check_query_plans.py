@@ -0,0 +1,258 @@
+"""
+Check that the hot queries of the application use their indexes.
+
+Seeds a dataset inside a transaction, runs EXPLAIN on every hot query and asserts the expected indexes appear in
+the query plans. The transaction is rolled back at the end, so it can run against any database migrated to head.
+
+Usage: python -m scripts.check_query_plans [--trips 1000]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.database.connection import engine
+
+MEMBERS_PER_TRIP = 3
+DAYS_PER_TRIP = 5
+PLACES_PER_DAY = 10
+ACTIVITIES_PER_DAY = 6
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO users (username, email, hashed_password, preferences)
+    SELECT 'plan_check_' || n, 'plan_check_' || n || '@example.com', '', ''
+    FROM generate_series(1, :members) AS n
+    """,
+    """
+    INSERT INTO trips (owner, trip_name, dest_name, dest_id, dest_lat, dest_lon, start_date, end_date, duration)
+    SELECT 'plan_check_1', 'Trip ' || n, 'Bangkok', 'dest_' || n, 13.75, 100.5, DATE '2025-01-01',
+           DATE '2025-01-01' + :days - 1, :days
+    FROM generate_series(1, :trips) AS n
+    """,
+    """
+    INSERT INTO trip_members (trip_id, username)
+    SELECT t.trip_id, 'plan_check_' || m
+    FROM trips t CROSS JOIN generate_series(1, :members) AS m
+    WHERE t.owner = 'plan_check_1'
+    """,
+    """
+    INSERT INTO trip_days (trip_id, day_number, date, vote_status)
+    SELECT t.trip_id, d, t.start_date + d - 1, 'voting'
+    FROM trips t CROSS JOIN generate_series(1, :days) AS d
+    WHERE t.owner = 'plan_check_1'
+    """,
+    """
+    INSERT INTO recommended_places (trip_id, trip_day_id, dest_id, dest_name)
+    SELECT td.trip_id, td.trip_day_id, 'place_' || p, 'Place ' || p
+    FROM trip_days td JOIN trips t ON t.trip_id = td.trip_id CROSS JOIN generate_series(1, :places) AS p
+    WHERE t.owner = 'plan_check_1'
+    """,
+    """
+    INSERT INTO vote_scores (recommended_place_id, username, vote_score, is_voted)
+    SELECT rp.recommended_place_id, 'plan_check_' || m, m, m = 1
+    FROM recommended_places rp JOIN trips t ON t.trip_id = rp.trip_id CROSS JOIN generate_series(1, :members) AS m
+    WHERE t.owner = 'plan_check_1'
+    """,
+    """
+    INSERT INTO activities (trip_day_id, activity_dest_id, activity_dest_name, activity_number, activity_period)
+    SELECT td.trip_day_id, 'place_' || a, 'Place ' || a, a, 'morning'
+    FROM trip_days td JOIN trips t ON t.trip_id = td.trip_id CROSS JOIN generate_series(1, :activities) AS a
+    WHERE t.owner = 'plan_check_1'
+    """,
+]
+
+# Hot queries of the application with the indexes their plans must use
+HOT_QUERIES = [
+    {
+        "name": "members of a trip (recommendation_model.get_members)",
+        "sql": "SELECT username FROM trip_members WHERE trip_id = :trip_id ORDER BY trip_member_id",
+        "indexes": {"ix_trip_members_trip_id_username"},
+    },
+    {
+        "name": "trips of a member (my_trips.get_my_trips)",
+        "sql": """
+            SELECT t.*
+            FROM trips t JOIN trip_members tm ON tm.trip_id = t.trip_id
+            WHERE tm.username = 'plan_check_2' AND tm.trip_id < :trip_id
+            ORDER BY tm.trip_id DESC
+            LIMIT 21
+        """,
+        "indexes": {"ix_trip_members_username_trip_id"},
+    },
+    {
+        "name": "trip day lookup (vote, create_new_trip)",
+        "sql": "SELECT * FROM trip_days WHERE trip_id = :trip_id AND day_number = :day_number",
+        "indexes": {"ix_trip_days_trip_id_day_number"},
+    },
+    {
+        "name": "activities of a day (planning_details.load_trip)",
+        "sql": "SELECT * FROM activities WHERE trip_day_id = :trip_day_id ORDER BY activity_number",
+        "indexes": {"ix_activities_trip_day_id_activity_number"},
+    },
+    {
+        "name": "submit vote (vote.update_vote_score)",
+        "sql": """
+            UPDATE vote_scores vs
+            SET vote_score = 5, is_voted = TRUE
+            FROM recommended_places rp
+            WHERE vs.recommended_place_id = rp.recommended_place_id
+            AND rp.trip_day_id = :trip_day_id
+            AND rp.dest_id = 'place_1'
+            AND vs.username = 'plan_check_1'
+        """,
+        "indexes": {"ix_recommended_places_trip_day_id_dest_id", "ix_vote_scores_recommended_place_id_username"},
+    },
+    {
+        "name": "number of votes (planning_details.number_of_votes_query)",
+        "sql": """
+            SELECT count(DISTINCT vs.username)
+            FROM vote_scores vs JOIN recommended_places rp ON vs.recommended_place_id = rp.recommended_place_id
+            WHERE rp.trip_day_id = :trip_day_id
+            AND vs.username IN ('plan_check_1', 'plan_check_2', 'plan_check_3')
+            AND vs.is_voted IS TRUE
+        """,
+        "indexes": {"ix_recommended_places_trip_day_id_dest_id", "ix_vote_scores_recommended_place_id_username"},
+    },
+    {
+        "name": "voted members of a trip (planning_details.get_voted_members)",
+        "sql": """
+            SELECT DISTINCT rp.trip_day_id, vs.username
+            FROM recommended_places rp JOIN vote_scores vs ON vs.recommended_place_id = rp.recommended_place_id
+            WHERE rp.trip_id = :trip_id AND vs.is_voted IS TRUE
+        """,
+        "indexes": {"ix_recommended_places_trip_id", "ix_vote_scores_recommended_place_id_username"},
+    },
+    {
+        "name": "user directory prefix search (users_data.search_users)",
+        "sql": """
+            SELECT user_id, username
+            FROM users
+            WHERE username COLLATE "C" >= 'plan_check' AND username COLLATE "C" < 'plan_checl'
+            ORDER BY username COLLATE "C"
+            LIMIT 22
+        """,
+        "indexes": {"ix_users_username_c"},
+    },
+    {
+        "name": "user directory substring search (users_data.search_users)",
+        "sql": """
+            SELECT user_id, username
+            FROM users
+            WHERE username LIKE '%check%'
+            ORDER BY username COLLATE "C"
+            LIMIT 22
+        """,
+        "indexes": {"ix_users_username_trgm"},
+        # Only created where pg_trgm is available, see migration 0005
+        "optional": True,
+    },
+]
+
+
+def seed(connection: Connection, trips: int):
+    """
+    Seed the dataset used to check the query plans.
+
+    :param connection: The database connection, inside a transaction.
+    :param trips: Number of trips to create.
+    :return: None
+    """
+    params = {
+        "trips": trips,
+        "members": MEMBERS_PER_TRIP,
+        "days": DAYS_PER_TRIP,
+        "places": PLACES_PER_DAY,
+        "activities": ACTIVITIES_PER_DAY,
+    }
+    for statement in SEED_STATEMENTS:
+        connection.execute(text(statement), params)
+
+    for table in ("users", "trips", "trip_members", "trip_days", "activities", "recommended_places", "vote_scores"):
+        connection.execute(text(f"ANALYZE {table}"))
+
+
+def get_plan_indexes(plan: Dict) -> Set[str]:
+    """
+    Get the names of the indexes used by a query plan.
+
+    :param plan: A node of the EXPLAIN (FORMAT JSON) output.
+    :return: The index names used by the node and its children.
+    """
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        indexes |= get_plan_indexes(child)
+
+    return indexes
+
+
+def check_query_plans(connection: Connection) -> List[str]:
+    """
+    Explain every hot query and check the expected indexes are used.
+
+    :param connection: The database connection, with the seeded dataset.
+    :return: The failed checks.
+    """
+    params = connection.execute(text("""
+        SELECT t.trip_id, td.trip_day_id, td.day_number
+        FROM trips t JOIN trip_days td ON td.trip_id = t.trip_id
+        WHERE t.owner = 'plan_check_1'
+        ORDER BY t.trip_id DESC, td.day_number
+        LIMIT 1
+    """)).mappings().one()
+
+    # Only an index can serve the queries, so a missing index shows up as a plan without it
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+
+    indexes = set(connection.execute(text("SELECT indexname FROM pg_indexes")).scalars())
+
+    failures = []
+    for query in HOT_QUERIES:
+        if query.get("optional") and not query["indexes"] <= indexes:
+            print(f"[SKIP] {query['name']}: {sorted(query['indexes'] - indexes)} not created")
+            continue
+
+        explain = connection.execute(text("EXPLAIN (FORMAT JSON) " + query["sql"]), params).scalar()
+        if isinstance(explain, str):
+            explain = json.loads(explain)
+
+        used = get_plan_indexes(explain[0]["Plan"])
+        missing = query["indexes"] - used
+        status = "FAIL" if missing else "OK"
+        print(f"[{status}] {query['name']}: uses {sorted(used) or 'no index'}")
+
+        if missing:
+            failures.append(f"{query['name']}: missing {sorted(missing)}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the hot queries use their indexes.")
+    parser.add_argument("--trips", type=int, default=1000, help="Number of trips to seed.")
+    args = parser.parse_args()
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    try:
+        print(f"Seeding {args.trips} trips...")
+        seed(connection, args.trips)
+        failures = check_query_plans(connection)
+    finally:
+        transaction.rollback()
+        connection.close()
+
+    if failures:
+        print("\nQuery plan check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    print("\nAll hot queries use their indexes.")
+
+
+if __name__ == "__main__":
+    main()
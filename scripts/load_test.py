@@ -0,0 +1,264 @@
+"""
+Load test of the backend's main user flows, reporting throughput and latency percentiles per endpoint.
+
+Runs virtual users against a running backend, each repeatedly picking one of the flows:
+- browse: vote details, planning details, vote status, my trips, the user directory and discover, of a seeded trip
+- login: log in as a seeded user
+- vote: submit a seeded member's vote on the day being voted on
+- new_trip: register and log in a new user, create a trip with seeded companions, vote until the first day is
+  complete and view its planning details
+
+Set up:
+    python -m scripts.mock_google --port 8090
+    GOOGLE_PLACES_BASE_URL=http://localhost:8090/v1 GOOGLE_ROUTES_BASE_URL=http://localhost:8090 \\
+        uvicorn app.main:app --port 8000 --workers 4
+    python -m scripts.seed_data --users 1000 --trips 200
+
+Usage: python -m scripts.load_test [--users 20] [--duration 60] [--mix browse=6,login=1,vote=2,new_trip=1]
+"""
+import argparse
+import json
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List
+
+import requests
+
+
+class VirtualUser:
+    """
+    A client of the backend recording the latency and status of every request it sends.
+
+    base_url: URL of the backend
+    manifest: The seeded users and trips, written by scripts/seed_data.py
+    """
+
+    def __init__(self, base_url: str, manifest: Dict):
+        self.base_url = base_url.rstrip("/")
+        self.manifest = manifest
+        self.session = requests.Session()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Send a request and record its latency under the method and path.
+
+        :param method: The HTTP method.
+        :param path: The path of the endpoint.
+        :param kwargs: Arguments of requests.Session.request.
+        :return: The response.
+        """
+        endpoint = f"{method} {path}"
+        start_time = time.perf_counter()
+
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.errors[endpoint] += 1
+            self.latencies[endpoint].append(time.perf_counter() - start_time)
+            raise
+
+        self.latencies[endpoint].append(time.perf_counter() - start_time)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        if response.status_code >= 500:
+            print(f"{endpoint} returned {response.status_code}: {response.text[:200]}")
+
+        return response
+
+    def browse(self):
+        trip = random.choice(self.manifest["trips"])
+        username = random.choice(trip["members"])
+        params = {"trip_id": trip["trip_id"], "username": username}
+
+        self.request("GET", "/api/vote/vote-details", params={**params, "day_number": trip["voting_day"]})
+        self.request("GET", "/api/planning-details/", params=params)
+        self.request("GET", "/api/vote/vote-status",
+                     params={"trip_id": trip["trip_id"], "day_number": trip["voting_day"]})
+        self.request("GET", "/api/my-trips/", params={"username": username})
+        self.request("GET", "/api/get-users-data/", params={"username": username, "q": username[:-1]})
+        self.request("GET", "/api/discover-place-details/", params={"dest_id": trip["dest_id"]})
+
+    def login(self):
+        username = random.choice(self.manifest["users"])
+        self.request("POST", "/api/auth/login/token",
+                     data={"username": username, "password": self.manifest["password"]})
+
+    def vote(self, trip: Dict = None, username: str = None, day_number: int = None):
+        trip = trip or random.choice(self.manifest["trips"])
+        username = username or random.choice(trip["members"])
+        day_number = day_number or trip["voting_day"]
+
+        response = self.request("GET", "/api/vote/vote-details",
+                                params={"trip_id": trip["trip_id"], "username": username, "day_number": day_number})
+        destinations = response.json().get("destinations") if response.status_code == 200 else None
+        if not destinations:
+            return
+
+        self.request("PATCH", "/api/vote/submit-vote", json={
+            "trip_id": trip["trip_id"],
+            "trip_day_number": day_number,
+            "voted_person": username,
+            "scores": {destination["destID"]: random.randint(0, 10) for destination in destinations},
+        })
+
+    def new_trip(self):
+        username = f"load_{uuid.uuid4().hex[:12]}"
+        password = "password"
+
+        self.request("POST", "/api/auth/register", json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "first_name": "Load",
+            "last_name": "Test",
+            "password": password,
+            "preferences": ["tourist_attraction", "museum", "park"],
+        })
+        self.request("POST", "/api/auth/login/token", data={"username": username, "password": password})
+
+        companions = random.sample(self.manifest["users"], 2)
+        start_date = date.today() + timedelta(days=30)
+        response = self.request("POST", "/api/create-new-trip/", json={
+            "owner": username,
+            "trip_name": "Load test trip",
+            "dest_id": "mock_13.7563_100.5018_0",
+            "dest_name": "Bangkok",
+            "dest_lat": 13.7563,
+            "dest_lon": 100.5018,
+            "start_date": start_date.isoformat(),
+            "end_date": (start_date + timedelta(days=1)).isoformat(),
+            "duration": 2,
+            "companion": ",".join(companions),
+        })
+        if response.status_code != 200:
+            return
+
+        trip = {"trip_id": response.json()["trip_id"], "members": companions + [username]}
+        for member in trip["members"]:
+            self.vote(trip, member, 1)
+
+        self.request("GET", "/api/planning-details/", params={"trip_id": trip["trip_id"], "username": username})
+
+    def run(self, flows: List[str], weights: List[int], deadline: float):
+        """
+        Run random flows until the deadline.
+
+        :param flows: Names of the flows.
+        :param weights: Relative frequency of every flow.
+        :param deadline: time.monotonic() at which to stop.
+        """
+        while time.monotonic() < deadline:
+            flow = random.choices(flows, weights)[0]
+            try:
+                getattr(self, flow)()
+            except requests.RequestException as e:
+                print(f"{flow} failed: {e}")
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+    """
+    Get a percentile of values, with the nearest-rank method.
+
+    :param values: The values, sorted.
+    :param percentile: The percentile, between 0 and 100.
+    :return: The percentile value.
+    """
+    return values[max(math.ceil(percentile / 100 * len(values)) - 1, 0)]
+
+
+def get_report(users: List[VirtualUser], elapsed: float) -> Dict[str, Dict]:
+    """
+    Aggregate the requests of every virtual user per endpoint.
+
+    :param users: The virtual users.
+    :param elapsed: Duration of the test in seconds.
+    :return: The count, errors, throughput and latency percentiles in ms of every endpoint.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for user in users:
+        for endpoint, values in user.latencies.items():
+            latencies[endpoint] += values
+        for endpoint, count in user.errors.items():
+            errors[endpoint] += count
+
+    report = {}
+    for endpoint in sorted(latencies):
+        values = sorted(latencies[endpoint])
+        report[endpoint] = {
+            "count": len(values),
+            "errors": errors[endpoint],
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(get_percentile(values, 50) * 1000, 1),
+            "p95_ms": round(get_percentile(values, 95) * 1000, 1),
+            "p99_ms": round(get_percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+
+    return report
+
+
+def print_report(report: Dict[str, Dict], elapsed: float):
+    print(f"\n{'Endpoint':<40} {'Count':>7} {'Errors':>7} {'Req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'Max ms':>9}")
+
+    for endpoint, stats in report.items():
+        print(f"{endpoint:<40} {stats['count']:>7} {stats['errors']:>7} {stats['rps']:>8} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}")
+
+    total = sum(stats["count"] for stats in report.values())
+    errors = sum(stats["errors"] for stats in report.values())
+    print(f"\n{total} requests in {elapsed:.1f}s, {total / elapsed:.1f} req/s, {errors} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the backend's main user flows.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default="seed_manifest.json", help="Written by scripts.seed_data.")
+    parser.add_argument("--users", type=int, default=20, help="Number of concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=60, help="Duration of the test in seconds.")
+    parser.add_argument("--mix", default="browse=6,login=1,vote=2,new_trip=1",
+                        help="Relative frequency of the flows.")
+    parser.add_argument("--random-seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file.")
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+
+    with open(args.manifest) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    mix = dict(flow.split("=") for flow in args.mix.split(","))
+    flows, weights = list(mix), [int(weight) for weight in mix.values()]
+    unknown_flows = set(flows) - {"browse", "login", "vote", "new_trip"}
+    if unknown_flows:
+        parser.error(f"Unknown flows: {', '.join(sorted(unknown_flows))}")
+
+    users = [VirtualUser(args.base_url, manifest) for _ in range(args.users)]
+
+    print(f"Running {args.users} virtual users for {args.duration:.0f}s against {args.base_url}...")
+    start_time = time.monotonic()
+    deadline = start_time + args.duration
+
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        for future in [executor.submit(user.run, flows, weights, deadline) for user in users]:
+            future.result()
+
+    elapsed = time.monotonic() - start_time
+    report = get_report(users, elapsed)
+    print_report(report, elapsed)
+
+    if args.json_path:
+        with open(args.json_path, "w") as json_file:
+            json.dump({"users": args.users, "duration": elapsed, "mix": mix, "endpoints": report}, json_file,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Mock of the Google Places and Routes APIs used by the backend, for local load tests.
+
+Places are generated from their ID, so every instance answers the same for the same place, and nearby places
+are spread around the searched location. Every response waits for a configurable latency.
+
+Usage: python -m scripts.mock_google [--port 8090] [--latency-ms 80] [--jitter-ms 40]
+Then start the backend with:
+    GOOGLE_PLACES_BASE_URL=http://localhost:8090/v1 GOOGLE_ROUTES_BASE_URL=http://localhost:8090
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+from typing import Dict, List, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse
+
+PLACE_TYPES = [
+    "tourist_attraction", "museum", "park", "art_gallery", "zoo", "aquarium", "amusement_park", "shopping_mall",
+    "restaurant", "cafe", "bar", "night_club", "church", "hindu_temple", "market", "spa",
+]
+
+# Average speed and detour used to answer route matrices
+ROUTE_SPEED_KMH = 30
+ROUTE_DETOUR_FACTOR = 1.3
+
+app = FastAPI()
+app.state.latency_ms = 80.0
+app.state.jitter_ms = 40.0
+
+
+async def simulate_latency():
+    latency = app.state.latency_ms + random.uniform(-app.state.jitter_ms, app.state.jitter_ms)
+    await asyncio.sleep(max(latency, 0) / 1000)
+
+
+def get_place_id(lat: float, lon: float, index: int) -> str:
+    return f"mock_{lat:.4f}_{lon:.4f}_{index}"
+
+
+def get_place_seed(place_id: str) -> int:
+    return int(hashlib.md5(place_id.encode()).hexdigest()[:8], 16)
+
+
+def get_place_location(place_id: str) -> Tuple[float, float]:
+    """
+    Get the location of a place, within about 5 km of the location its ID was generated for.
+
+    :param place_id: The place ID.
+    :return: The latitude and longitude.
+    """
+    try:
+        _, lat, lon, _ = place_id.split("_")
+        lat, lon = float(lat), float(lon)
+    except ValueError:
+        lat, lon = 13.7563, 100.5018
+
+    rng = random.Random(get_place_seed(place_id))
+
+    return lat + rng.uniform(-0.045, 0.045), lon + rng.uniform(-0.045, 0.045)
+
+
+def get_place(place_id: str) -> Dict:
+    """
+    Generate the details of a place.
+
+    :param place_id: The place ID.
+    :return: The place in the Google Places API format, with every field used by the backend.
+    """
+    rng = random.Random(get_place_seed(place_id))
+    lat, lon = get_place_location(place_id)
+    opening_hour = rng.choice([6, 8, 9, 10])
+
+    return {
+        "id": place_id,
+        "displayName": {"text": f"Mock Place {place_id[-6:]}", "languageCode": "en"},
+        "types": rng.sample(PLACE_TYPES, 3),
+        "editorialSummary": {"text": "A generated place for load tests.", "languageCode": "en"},
+        "rating": round(rng.uniform(3, 5), 1),
+        "formattedAddress": f"{rng.randint(1, 999)} Mock Road",
+        "internationalPhoneNumber": "+66 2 000 0000",
+        "goodForChildren": rng.random() < 0.5,
+        "accessibilityOptions": {"wheelchairAccessibleEntrance": rng.random() < 0.5},
+        "photos": [{"name": f"places/{place_id}/photos/photo_{n}"} for n in range(2)],
+        "location": {"latitude": lat, "longitude": lon},
+        "regularOpeningHours": {
+            "periods": [
+                {
+                    "open": {"day": day, "hour": opening_hour, "minute": 0},
+                    "close": {"day": day, "hour": opening_hour + 10, "minute": 0},
+                }
+                for day in range(7)
+            ]
+        },
+    }
+
+
+def get_distance_km(from_lat: float, from_lon: float, to_lat: float, to_lon: float) -> float:
+    from_lat, from_lon, to_lat, to_lon = map(math.radians, (from_lat, from_lon, to_lat, to_lon))
+    a = (math.sin((to_lat - from_lat) / 2) ** 2
+         + math.cos(from_lat) * math.cos(to_lat) * math.sin((to_lon - from_lon) / 2) ** 2)
+
+    return 2 * 6371.0088 * math.asin(math.sqrt(a)) * ROUTE_DETOUR_FACTOR
+
+
+def get_waypoint_location(waypoint: Dict) -> Tuple[float, float]:
+    lat_lng = waypoint["waypoint"]["location"]["latLng"]
+
+    return lat_lng["latitude"], lat_lng["longitude"]
+
+
+@app.get("/v1/{photo_name:path}/media")
+async def get_photo(photo_name: str):
+    await simulate_latency()
+
+    return RedirectResponse(f"https://example.com/mock-photos/{photo_name}.jpg", status_code=302)
+
+
+@app.post("/v1/places:searchNearby")
+async def search_nearby(request: Request) -> Dict:
+    body = await request.json()
+    await simulate_latency()
+
+    center = body["locationRestriction"]["circle"]["center"]
+    lat, lon = round(center["latitude"], 4), round(center["longitude"], 4)
+
+    return {"places": [get_place(get_place_id(lat, lon, index)) for index in range(body.get("maxResultCount", 20))]}
+
+
+@app.get("/v1/places/{place_id}")
+async def get_place_details(place_id: str) -> Dict:
+    await simulate_latency()
+
+    return get_place(place_id)
+
+
+@app.post("/distanceMatrix/v2:computeRouteMatrix")
+async def compute_route_matrix(request: Request) -> List[Dict]:
+    body = await request.json()
+    await simulate_latency()
+
+    elements = []
+    for origin_index, origin in enumerate(body["origins"]):
+        for destination_index, destination in enumerate(body["destinations"]):
+            distance_km = get_distance_km(*get_waypoint_location(origin), *get_waypoint_location(destination))
+            elements.append({
+                "originIndex": origin_index,
+                "destinationIndex": destination_index,
+                "distanceMeters": int(distance_km * 1000),
+                "duration": f"{int(distance_km / ROUTE_SPEED_KMH * 3600)}s",
+            })
+
+    return elements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock of the Google Places and Routes APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=80, help="Average latency of every response.")
+    parser.add_argument("--jitter-ms", type=float, default=40, help="Random variation of the latency.")
+    args = parser.parse_args()
+
+    app.state.latency_ms = args.latency_ms
+    app.state.jitter_ms = args.jitter_ms
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
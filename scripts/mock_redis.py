@@ -0,0 +1,137 @@
+"""
+Stand-in for a Redis server, answering the commands used by the redis cache backend, for local runs and load tests.
+
+Keys are kept in memory with their expiry. It is a single process, so it is shared by every worker pointed at it like
+a real Redis server.
+
+Usage: python -m scripts.mock_redis [--port 6390]
+Then start the backend with:
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://localhost:6390/0
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Values with the time.monotonic() they expire at, None when they do not expire
+store: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+
+def encode(reply) -> bytes:
+    """
+    Encode a reply in the Redis protocol (RESP2).
+
+    :param reply: None, an int, bytes, a list of replies, or an Exception for an error reply.
+    :return: The encoded reply.
+    """
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return f"-ERR {reply}\r\n".encode()
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+def get_value(key: bytes) -> Optional[bytes]:
+    item = store.get(key)
+    if item is not None and item[1] is not None and item[1] <= time.monotonic():
+        del store[key]
+        item = None
+
+    return None if item is None else item[0]
+
+
+def run_command(args: List[bytes]):
+    """
+    Run a command.
+
+    :param args: The command name and its arguments.
+    :return: The reply.
+    """
+    command, args = args[0].upper(), args[1:]
+
+    if command == b"PING":
+        return args[0] if args else b"PONG"
+    if command in (b"CLIENT", b"SELECT"):
+        return True
+    if command == b"GET":
+        return get_value(args[0])
+    if command == b"MGET":
+        return [get_value(key) for key in args]
+    if command == b"SET":
+        options = [arg.upper() for arg in args[2:]]
+        expires_at = None
+        if b"PX" in options:
+            expires_at = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            expires_at = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+        store[args[0]] = (args[1], expires_at)
+        return True
+    if command == b"DEL":
+        return sum(store.pop(key, None) is not None for key in args)
+    if command == b"SCAN":
+        pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+        return [b"0", [key for key in list(store) if get_value(key) is not None and
+                       fnmatch.fnmatchcase(key.decode(errors="replace"), pattern)]]
+    if command == b"DBSIZE":
+        return len(store)
+    if command == b"FLUSHDB":
+        store.clear()
+        return True
+
+    return ValueError(f"unknown command '{command.decode(errors='replace')}'")
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+
+    if not line.startswith(b"*"):
+        return line.split()
+
+    args = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+
+    return args
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while (args := await read_command(reader)) is not None:
+            if args:
+                writer.write(encode(run_command(args)))
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(handle_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for a Redis server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    print(f"Serving on redis://{args.host}:{args.port}/0")
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
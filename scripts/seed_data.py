@@ -0,0 +1,233 @@
+"""
+Fill the database with synthetic users, trips, recommendations and votes.
+
+Places are the ones answered by scripts/mock_google.py, so the seeded trips can be browsed and voted on with the
+backend pointed at the mock. Every trip has its first days complete with a plan, then one day being voted on and
+pending days after it. A manifest listing the seeded users and trips is written for scripts/load_test.py.
+
+Usage: python -m scripts.seed_data [--users 1000] [--trips 200] [--members 4] [--days 3] ...
+"""
+import argparse
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.engine import Connection
+
+from app.database import engine
+from app.models import User, Trips, TripMembers, TripDays, RecommendedPlaces, VoteScores, Activities
+from app.routers.auth import pwd_context
+from app.routers.discover import open_hours_format
+from scripts.mock_google import PLACE_TYPES, get_place, get_place_id
+
+# Trip destinations, the places of a trip are generated around them
+DESTINATIONS = [
+    ("Bangkok", 13.7563, 100.5018),
+    ("Chiang Mai", 18.7883, 98.9853),
+    ("Phuket", 7.8804, 98.3923),
+    ("Tokyo", 35.6762, 139.6503),
+    ("Singapore", 1.3521, 103.8198),
+]
+
+ACTIVITY_PERIODS = ["morning", "morning", "afternoon", "afternoon", "night"]
+
+BATCH_SIZE = 200
+
+
+def get_place_snapshot(place_id: str) -> Dict:
+    """
+    Get the stored details of a mock place, as get_destination_snapshot stores them.
+
+    :param place_id: The mock place ID.
+    :return: The recommended place column values.
+    """
+    place = get_place(place_id)
+    photo_name = place["photos"][0]["name"]
+    now = datetime.now(timezone.utc)
+
+    return {
+        "dest_id": place_id,
+        "dest_name": place["displayName"]["text"],
+        "dest_desc": place["editorialSummary"]["text"],
+        "dest_photo_name": photo_name,
+        "dest_opening_hours": open_hours_format(place["regularOpeningHours"]["periods"]),
+        "dest_lat": place["location"]["latitude"],
+        "dest_lon": place["location"]["longitude"],
+        "snapshot_updated_at": now,
+    }
+
+
+def seed_users(connection: Connection, prefix: str, count: int, password: str) -> List[str]:
+    """
+    Create users with random preferences, all with the same password.
+
+    :param connection: The database connection.
+    :param prefix: Prefix of the usernames.
+    :param count: Number of users.
+    :param password: The password of every user.
+    :return: The usernames.
+    """
+    # Hashing is deliberately slow, one hash is shared by every user
+    hashed_password = pwd_context.hash(password)
+    usernames = [f"{prefix}_user_{n}" for n in range(1, count + 1)]
+
+    for start in range(0, count, BATCH_SIZE):
+        connection.execute(insert(User), [
+            {
+                "username": username,
+                "email": f"{username}@example.com",
+                "first_name": "Seed",
+                "last_name": username,
+                "hashed_password": hashed_password,
+                "preferences": ",".join(random.sample(PLACE_TYPES, random.randint(2, 5))),
+            }
+            for username in usernames[start:start + BATCH_SIZE]
+        ])
+
+    return usernames
+
+
+def seed_trip(connection: Connection, prefix: str, number: int, usernames: List[str], args) -> Dict:
+    """
+    Create a trip with its members, days, recommendations, votes and plans.
+
+    :param connection: The database connection.
+    :param prefix: Prefix of the trip names.
+    :param number: Number of the trip.
+    :param usernames: The users to pick the members from.
+    :param args: The command line arguments.
+    :return: The manifest entry of the trip.
+    """
+    dest_name, lat, lon = random.choice(DESTINATIONS)
+    members = random.sample(usernames, min(args.members, len(usernames)))
+    owner = members[-1]  # Members are stored with the owner last
+    start_date = date.today() + timedelta(days=random.randint(7, 90))
+    voting_day = min(args.complete_days + 1, args.days)
+
+    trip_id = connection.execute(insert(Trips).returning(Trips.trip_id), {
+        "owner": owner,
+        "trip_name": f"{prefix} trip {number}",
+        "dest_name": dest_name,
+        "dest_id": get_place_id(lat, lon, 0),
+        "dest_lat": lat,
+        "dest_lon": lon,
+        "start_date": start_date,
+        "end_date": start_date + timedelta(days=args.days - 1),
+        "duration": args.days,
+    }).scalar()
+
+    connection.execute(insert(TripMembers), [{"trip_id": trip_id, "username": member} for member in members])
+
+    trip_day_ids = connection.execute(
+        insert(TripDays).returning(TripDays.trip_day_id, sort_by_parameter_order=True),
+        [
+            {
+                "trip_id": trip_id,
+                "day_number": day_number,
+                "date": start_date + timedelta(days=day_number),
+                "vote_status": "complete" if day_number < voting_day else
+                               "voting" if day_number == voting_day else "pending",
+            }
+            for day_number in range(1, args.days + 1)
+        ]
+    ).scalars().all()
+
+    # Recommendations and votes exist up to the day being voted on
+    for day_number, trip_day_id in enumerate(trip_day_ids[:voting_day], start=1):
+        place_ids = [get_place_id(lat, lon, (day_number - 1) * args.places + n + 1) for n in range(args.places)]
+        recommended_place_ids = connection.execute(
+            insert(RecommendedPlaces).returning(RecommendedPlaces.recommended_place_id,
+                                                sort_by_parameter_order=True),
+            [{"trip_id": trip_id, "trip_day_id": trip_day_id, **get_place_snapshot(place_id)}
+             for place_id in place_ids]
+        ).scalars().all()
+
+        is_complete = day_number < voting_day
+        voters = members if is_complete else [
+            member for member in members[:-1] if random.random() < args.voted_fraction
+        ]
+        connection.execute(insert(VoteScores), [
+            {
+                "recommended_place_id": recommended_place_id,
+                "username": member,
+                "vote_score": random.randint(0, 10) if member in voters else 0,
+                "is_voted": member in voters,
+            }
+            for recommended_place_id in recommended_place_ids
+            for member in members
+        ])
+
+        if is_complete:
+            places = [get_place(place_id) for place_id in place_ids[:len(ACTIVITY_PERIODS)]]
+            now = datetime.now(timezone.utc)
+            connection.execute(insert(Activities), [
+                {
+                    "trip_day_id": trip_day_id,
+                    "activity_dest_id": place["id"],
+                    "activity_dest_name": place["displayName"]["text"],
+                    "activity_dest_desc": place["editorialSummary"]["text"],
+                    "activity_dest_photo_name": place["photos"][0]["name"],
+                    "activity_dest_opening_hours": open_hours_format(place["regularOpeningHours"]["periods"]),
+                    "activity_dest_lat": place["location"]["latitude"],
+                    "activity_dest_lon": place["location"]["longitude"],
+                    "activity_number": activity_number,
+                    "activity_period": period,
+                    "snapshot_updated_at": now,
+                }
+                for activity_number, (place, period) in enumerate(zip(places, ACTIVITY_PERIODS), start=1)
+            ])
+
+    return {
+        "trip_id": trip_id,
+        "dest_id": get_place_id(lat, lon, 0),
+        "members": members,
+        "days": args.days,
+        "voting_day": voting_day,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic data.")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users.")
+    parser.add_argument("--trips", type=int, default=200, help="Number of trips.")
+    parser.add_argument("--members", type=int, default=4, help="Members of every trip, owner included.")
+    parser.add_argument("--days", type=int, default=3, help="Days of every trip.")
+    parser.add_argument("--complete-days", type=int, default=1, help="Leading days of every trip already planned.")
+    parser.add_argument("--places", type=int, default=10, help="Recommended places of every day.")
+    parser.add_argument("--voted-fraction", type=float, default=0.5,
+                        help="Share of the members who have voted on the day being voted on.")
+    parser.add_argument("--password", default="password", help="Password of every user.")
+    parser.add_argument("--prefix", default="seed", help="Prefix of the usernames and trip names.")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--manifest", default="seed_manifest.json", help="Where to write the seeded users and trips.")
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+
+    with engine.begin() as connection:
+        existing = connection.execute(
+            select(func.count()).select_from(User).where(User.username.startswith(f"{args.prefix}_user_"))
+        ).scalar()
+        if existing:
+            parser.error(f"{existing} users with the prefix '{args.prefix}' already exist, choose another --prefix.")
+
+        print(f"Seeding {args.users} users...")
+        usernames = seed_users(connection, args.prefix, args.users, args.password)
+
+        print(f"Seeding {args.trips} trips...")
+        trips = []
+        for number in range(1, args.trips + 1):
+            trips.append(seed_trip(connection, args.prefix, number, usernames, args))
+            if number % 100 == 0:
+                print(f"  {number} trips")
+
+    with open(args.manifest, "w") as manifest:
+        json.dump({"password": args.password, "users": usernames, "trips": trips}, manifest)
+
+    print(f"Done. Manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
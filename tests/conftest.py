@@ -0,0 +1,148 @@
+"""
+Settings of the tests, set before the app is imported as its modules read them at import time.
+
+The tests run against TEST_DATABASE_URL when it is set, a disposable PostgreSQL database whose tables are created and
+dropped by the tests, and against a temporary SQLite database otherwise. Tests relying on PostgreSQL, e.g. on row
+locks across workers, are skipped on SQLite.
+
+Google APIs are answered by scripts/mock_google.py, started by the google fixture.
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import event, text
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise TimeoutError(f"Nothing is listening on port {port}")
+
+
+TEST_DIR = tempfile.mkdtemp(prefix="togetherwherever-tests-")
+GOOGLE_PORT = get_free_port()
+
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["REPLICA_DATABASE_URLS"] = ""
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["SQL_QUERY_BUDGET_MODE"] = "raise"
+os.environ["PROFILING_SAMPLE_RATE"] = "0"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("GOOGLE_PLACES_API_KEY", "test-api-key")
+os.environ["GOOGLE_PLACES_BASE_URL"] = f"http://127.0.0.1:{GOOGLE_PORT}/v1"
+os.environ["GOOGLE_ROUTES_BASE_URL"] = f"http://127.0.0.1:{GOOGLE_PORT}"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from app.database import engine, async_engine  # noqa: E402
+from app.database.create_db import run_migrations  # noqa: E402
+from app.models import Base  # noqa: E402
+
+IS_POSTGRESQL = engine.dialect.name == "postgresql"
+
+if not IS_POSTGRESQL:
+    # The users directory orders usernames byte-wise with the "C" collation of PostgreSQL, SQLite has no such name
+    def compare_bytewise(a: str, b: str) -> int:
+        return (a > b) - (a < b)
+
+    @event.listens_for(engine, "connect")
+    def create_c_collation(dbapi_connection, connection_record):
+        dbapi_connection.create_collation("C", compare_bytewise)
+
+    # aiosqlite only forwards create_function, the collation is created in the thread of its sqlite3 connection
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def create_async_c_collation(dbapi_connection, connection_record):
+        dbapi_connection.run_async(
+            lambda connection: connection._execute(connection._conn.create_collation, "C", compare_bytewise)
+        )
+
+
+requires_postgresql = pytest.mark.skipif(not IS_POSTGRESQL, reason="Set TEST_DATABASE_URL to a PostgreSQL database.")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def google():
+    """
+    Start scripts/mock_google.py, which the app calls instead of the Google APIs.
+    """
+    server = subprocess.Popen([sys.executable, "-m", "scripts.mock_google", "--port", str(GOOGLE_PORT),
+                               "--latency-ms", "5", "--jitter-ms", "5"], stdout=subprocess.DEVNULL)
+
+    try:
+        wait_for_port(GOOGLE_PORT)
+        yield f"http://127.0.0.1:{GOOGLE_PORT}"
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    Create the tables of the app for the tests, and drop them afterward.
+
+    PostgreSQL is migrated like production databases, the migrations are PostgreSQL only so SQLite gets the tables of
+    the models.
+    """
+    if IS_POSTGRESQL:
+        run_migrations()
+    else:
+        Base.metadata.create_all(engine)
+
+    yield engine
+
+    Base.metadata.drop_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    engine.dispose()
+
+
+@pytest.fixture
+async def client(database):
+    """
+    HTTP client calling the app in the event loop of the test.
+    """
+    import httpx
+
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+    # Pooled connections belong to the event loop of this test
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def db(database):
+    """
+    Database session of the app, in the event loop of the test.
+    """
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        yield session
+
+    await async_engine.dispose()
@@ -0,0 +1,185 @@
+import hashlib
+import time
+import uuid
+from argparse import Namespace
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from passlib.context import CryptContext
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+
+from app.models import User
+from app.routers import auth
+from app.routers.auth import CurrentUser, authenticated_users, create_access_token, get_current_user, \
+    verified_tokens, verify_token
+from scripts.seed_data import seed_trip, seed_users
+
+
+@pytest.fixture
+def seed_member_trip(database):
+    """
+    Seed a trip of two users, and a user who is not a member of it.
+    """
+    prefix = f"auth_test_{uuid.uuid4().hex[:8]}"
+    args = Namespace(members=2, days=1, complete_days=0, places=2, voted_fraction=0)
+
+    with database.begin() as connection:
+        usernames = seed_users(connection, prefix, 3, "password")
+        trip = seed_trip(connection, prefix, 1, usernames[:2], args)
+
+    trip["outsider"] = usernames[2]
+    return trip
+
+
+def get_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_authorization(username: str):
+    return {"Authorization": f"Bearer {create_access_token({'sub': username}, timedelta(minutes=5))}"}
+
+
+def test_verified_tokens_are_not_decoded_again(monkeypatch):
+    token = create_access_token({"sub": f"cached_{uuid.uuid4().hex[:8]}"}, timedelta(minutes=5))
+    payload = verify_token(token)
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("The cached token was decoded again")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail_decode)
+
+    assert verify_token(token) == payload
+
+
+def test_cached_tokens_are_verified_again_once_expired(monkeypatch):
+    token = create_access_token({"sub": f"expiring_{uuid.uuid4().hex[:8]}"}, timedelta(minutes=5))
+    payload = verify_token(token)
+
+    # The cache TTL would keep the payload a little longer, its exp is past
+    monkeypatch.setattr(auth.time, "time", lambda: payload["exp"] + 1)
+    decoded = []
+
+    def record_decode(*args, **kwargs):
+        decoded.append(args[0])
+        raise jwt.ExpiredSignatureError("Signature has expired.")
+
+    monkeypatch.setattr(auth.jwt, "decode", record_decode)
+
+    with pytest.raises(HTTPException) as error:
+        verify_token(token)
+
+    assert error.value.status_code == 403
+    assert decoded == [token]
+    assert verified_tokens.get(get_token_hash(token)) is None
+
+
+def test_expired_and_invalid_tokens_are_rejected():
+    expired = create_access_token({"sub": "expired"}, timedelta(minutes=-1))
+    unsigned = jwt.encode({"sub": "forged", "exp": time.time() + 60}, "another-secret-key", algorithm="HS256")
+    anonymous = create_access_token({"user": "nobody"}, timedelta(minutes=5))
+
+    for token in (expired, unsigned, anonymous):
+        with pytest.raises(HTTPException) as error:
+            verify_token(token)
+        assert error.value.status_code == 403
+
+
+def test_tokens_without_expiry_are_not_cached():
+    token = jwt.encode({"sub": f"forever_{uuid.uuid4().hex[:8]}"}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+    assert verify_token(token)["sub"].startswith("forever_")
+    assert verified_tokens.get(get_token_hash(token)) is None
+
+
+class FailingSession:
+    async def scalar(self, *args, **kwargs):
+        raise AssertionError("The cached user was read from the database")
+
+
+@pytest.mark.anyio
+async def test_authenticated_users_are_read_once(seed_member_trip, db):
+    username = seed_member_trip["members"][0]
+    user = await get_current_user({"sub": username}, db)
+
+    assert isinstance(user, CurrentUser) and user.username == username
+    assert authenticated_users.get(username) == user.user_id
+    assert await get_current_user({"sub": username}, FailingSession()) == user
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_user({"sub": f"deleted_{uuid.uuid4().hex[:8]}"}, db)
+
+    assert error.value.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_trip_endpoints_require_a_member_when_auth_is_required(client, seed_member_trip, monkeypatch):
+    trip = seed_member_trip
+    member, outsider = trip["members"][0], trip["outsider"]
+    params = {"trip_id": trip["trip_id"], "day_number": 1}
+
+    response = await client.get("/api/vote/vote-status", params=params)
+    assert response.status_code == 200
+
+    monkeypatch.setattr(auth, "REQUIRE_AUTH", True)
+
+    response = await client.get("/api/vote/vote-status", params=params)
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+    response = await client.get("/api/vote/vote-status", params=params, headers=get_authorization(outsider))
+    assert response.status_code == 403
+
+    response = await client.get("/api/vote/vote-status", params=params, headers=get_authorization(member))
+    assert response.status_code == 200
+
+    response = await client.get("/api/my-trips/", params={"username": outsider}, headers=get_authorization(member))
+    assert response.status_code == 403
+
+    response = await client.get("/api/my-trips/", params={"username": member}, headers=get_authorization(member))
+    assert response.status_code == 200
+    assert [t["tripId"] for t in response.json()["trips"]] == [trip["trip_id"]]
+
+    response = await client.patch("/api/vote/submit-vote", headers=get_authorization(member), json={
+        "trip_id": trip["trip_id"], "trip_day_number": 1, "voted_person": trip["members"][1], "scores": {}
+    })
+    assert response.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_logins_beyond_the_hash_queue_are_rejected(client, seed_member_trip, monkeypatch):
+    monkeypatch.setattr(auth, "password_hashes_pending", auth.PASSWORD_HASH_WORKERS + auth.PASSWORD_HASH_MAX_QUEUE)
+    rejected = REGISTRY.get_sample_value("password_hashes_rejected_total") or 0
+
+    response = await client.post("/api/auth/login/token",
+                                 data={"username": seed_member_trip["members"][0], "password": "password"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert REGISTRY.get_sample_value("password_hashes_rejected_total") == rejected + 1
+
+
+@pytest.mark.anyio
+async def test_hashes_of_another_cost_are_rehashed_on_login(client, seed_member_trip, database, monkeypatch):
+    username = seed_member_trip["members"][0]
+    waits = REGISTRY.get_sample_value("password_hash_wait_seconds_count") or 0
+
+    def get_hashed_password():
+        with database.connect() as connection:
+            return connection.execute(select(User.hashed_password).where(User.username == username)).scalar()
+
+    seeded_hash = get_hashed_password()
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                                          bcrypt__rounds=auth.BCRYPT_ROUNDS + 1))
+
+    for _ in range(2):
+        response = await client.post("/api/auth/login/token", data={"username": username, "password": "password"})
+        assert response.status_code == 200
+
+    rehashed = get_hashed_password()
+    assert rehashed != seeded_hash
+    assert auth.pwd_context.verify("password", rehashed) and not auth.pwd_context.needs_update(rehashed)
+    assert REGISTRY.get_sample_value("password_hash_wait_seconds_count") == waits + 2
+    assert auth.password_hashes_pending == 0
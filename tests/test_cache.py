@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import app.cache
+from app.cache import NamespaceVersions, TTLCache, invalidate_namespace
+from app.cache.memory import MemoryBackend
+from app.cache.redis import RedisBackend
+from app.cache.serialization import Versioned, dumps, loads
+from app.cache.sqlite import SQLiteBackend
+from conftest import get_free_port, wait_for_port
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    """
+    URL of scripts/mock_redis.py, started for the tests of the module.
+    """
+    port = get_free_port()
+    server = subprocess.Popen([sys.executable, "-m", "scripts.mock_redis", "--port", str(port)],
+                              stdout=subprocess.DEVNULL)
+
+    try:
+        wait_for_port(port)
+        yield f"redis://127.0.0.1:{port}/0"
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.db"), max_entries=1000)
+
+    backend = RedisBackend(request.getfixturevalue("redis_url"), timeout=1)
+    backend.client.flushdb()
+    return backend
+
+
+@pytest.fixture
+def shared_backend(backend, monkeypatch):
+    """
+    The backend, set as the one shared by the caches, with namespace versions of its own.
+    """
+    is_shared = not isinstance(backend, MemoryBackend)
+    monkeypatch.setattr(app.cache, "get_shared_backend", lambda: backend if is_shared else None)
+    monkeypatch.setattr(app.cache, "namespace_versions", NamespaceVersions(100))
+
+    return backend
+
+
+def test_values_are_read_back_until_they_expire(backend):
+    backend.set("tw:test:json", {"places": ["a", "b"]}, 60)
+    backend.set("tw:test:bytes", b"\x00rendered", 60)
+    backend.set("tw:test:short", "expires", 0.05)
+
+    assert backend.get("tw:test:json") == {"places": ["a", "b"]}
+    assert backend.get("tw:test:bytes") == b"\x00rendered"
+    assert backend.get_many(["tw:test:json", "tw:test:missing"]) == [{"places": ["a", "b"]}, None]
+
+    time.sleep(0.1)
+    assert backend.get("tw:test:short") is None
+
+
+def test_deleted_and_cleared_values_are_gone(backend):
+    for key in ("tw:a:1", "tw:a:2", "tw:b:1"):
+        backend.set(key, key, 60)
+
+    backend.delete("tw:a:1")
+    assert backend.get("tw:a:1") is None
+
+    backend.clear("tw:a:")
+    assert backend.get("tw:a:2") is None
+    # The memory backend holds a single cache, it is cleared entirely
+    assert backend.get("tw:b:1") == (None if isinstance(backend, MemoryBackend) else "tw:b:1")
+
+
+@pytest.mark.anyio
+async def test_invalidated_namespaces_miss(shared_backend):
+    cache = TTLCache(name="test_namespaces", ttl=60)
+    await cache.aset("details", "before", namespace="trip:1")
+    await cache.aset("details", "other trip", namespace="trip:2")
+    assert await cache.aget("details", namespace="trip:1") == "before"
+
+    await invalidate_namespace("trip:1")
+
+    assert await cache.aget("details", namespace="trip:1") is None
+    assert await cache.aget("details", namespace="trip:2") == "other trip"
+
+    await cache.aset("details", "after", namespace="trip:1")
+    assert await cache.aget("details", namespace="trip:1") == "after"
+
+
+@pytest.mark.anyio
+async def test_shared_namespace_lookups_are_one_round_trip_off_the_event_loop(shared_backend, monkeypatch):
+    if isinstance(shared_backend, MemoryBackend):
+        pytest.skip("In-memory caches are read on the event loop.")
+
+    cache = TTLCache(name="test_round_trips", ttl=60)
+    await cache.aset("details", "value", namespace="trip:1")
+
+    calls = []
+    get_many = shared_backend.get_many
+
+    def record_get_many(keys):
+        calls.append(threading.get_ident())
+        return get_many(keys)
+
+    def fail_get(key):
+        raise AssertionError("The namespace version and the entry are read separately")
+
+    monkeypatch.setattr(shared_backend, "get_many", record_get_many)
+    monkeypatch.setattr(shared_backend, "get", fail_get)
+
+    assert await cache.aget("details", namespace="trip:1") == "value"
+    assert len(calls) == 1 and calls[0] != threading.get_ident()
+
+
+def test_evicted_namespaces_do_not_serve_stale_entries(monkeypatch):
+    versions = NamespaceVersions(2)
+    monkeypatch.setattr(app.cache, "get_shared_backend", lambda: None)
+    monkeypatch.setattr(app.cache, "namespace_versions", versions)
+
+    cache = TTLCache(ttl=60)
+    cache.set("details", "stale", namespace="trip:1")
+    asyncio.run(invalidate_namespace("trip:1"))
+    # Evicts the version of trip:1
+    asyncio.run(invalidate_namespace("trip:2"))
+    asyncio.run(invalidate_namespace("trip:3"))
+
+    assert len(versions._data) == 2
+    assert cache.get("details", namespace="trip:1") is None
+
+
+@pytest.mark.parametrize("value", [b"rendered", {"places": ["a", "b"]}, "x" * 4096, b"x" * 4096])
+def test_versioned_values_are_serialized(value):
+    data = dumps(Versioned(2 ** 62, value))
+
+    assert loads(data) == Versioned(2 ** 62, value)
+    assert loads(dumps(value)) == value
+    if len(value) > 1024:
+        assert len(data) < 1024
+
+
+def test_unavailable_redis_is_bypassed(monkeypatch, caplog):
+    backend = RedisBackend(f"redis://127.0.0.1:{get_free_port()}/0", timeout=0.2)
+
+    with caplog.at_level(logging.WARNING, logger="app.cache.redis"):
+        assert backend.get("tw:test:key") is None
+
+    assert "bypassing it" in caplog.text
+    assert not backend.is_available()
+
+    def fail_scan(*args, **kwargs):
+        raise AssertionError("The unavailable server was contacted")
+
+    monkeypatch.setattr(backend.client, "scan_iter", fail_scan)
+    backend.clear("tw:test:")
+    backend.set("tw:test:key", "value", 60)
+    assert backend.get_many(["tw:test:key"]) == [None]
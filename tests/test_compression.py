@@ -0,0 +1,134 @@
+import gzip
+import json
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app import compression
+from app.compression import COMPRESSION_MIN_BYTES, CompressionMiddleware, get_accepted_encoding
+
+pytestmark = pytest.mark.anyio
+
+LARGE_BODY = {"places": [{"name": f"Place {n}", "desc": "A generated place."} for n in range(100)]}
+
+
+async def large_json(request):
+    return JSONResponse(LARGE_BODY, headers={"ETag": '"trip-1"'})
+
+
+async def small_json(request):
+    return JSONResponse({"name": "Place"})
+
+
+async def threshold_json(request):
+    # A JSON string exactly as long as the threshold, or one byte shorter
+    return Response(json.dumps("x" * (COMPRESSION_MIN_BYTES - 2 - int(request.query_params["under"]))),
+                    media_type="application/json")
+
+
+async def weak_etag(request):
+    return JSONResponse(LARGE_BODY, headers={"ETag": 'W/"trip-1"'})
+
+
+async def image(request):
+    return Response(b"\x89PNG" + bytes(COMPRESSION_MIN_BYTES * 2), media_type="image/png")
+
+
+async def streamed(request):
+    async def records():
+        for place in LARGE_BODY["places"]:
+            yield json.dumps(place).encode() * 20 + b"\n"
+
+    return StreamingResponse(records(), media_type="application/x-ndjson")
+
+
+app = Starlette(routes=[
+    Route("/large", large_json), Route("/small", small_json), Route("/threshold", threshold_json),
+    Route("/weak", weak_etag), Route("/image", image), Route("/streamed", streamed),
+])
+app.add_middleware(CompressionMiddleware)
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def get_scope(accept_encoding: str):
+    return {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []}
+
+
+@pytest.mark.parametrize("accept_encoding, with_brotli, without_brotli", [
+    ("", None, None),
+    ("identity", None, None),
+    ("gzip", "gzip", "gzip"),
+    ("gzip, deflate, br", "br", "gzip"),
+    ("BR;q=0.5, GZIP;q=1", "br", "gzip"),
+    ("br;q=0, gzip", "gzip", "gzip"),
+    ("br, gzip;q=0", "br", None),
+    ("*", "br", "gzip"),
+    ("*;q=0, gzip", "gzip", "gzip"),
+    ("br;q=invalid, gzip;q=0", None, None),
+])
+async def test_brotli_is_preferred_when_available(monkeypatch, accept_encoding, with_brotli, without_brotli):
+    assert get_accepted_encoding(get_scope(accept_encoding)) == with_brotli
+
+    monkeypatch.setattr(compression, "brotli", None)
+
+    assert get_accepted_encoding(get_scope(accept_encoding)) == without_brotli
+
+
+@pytest.mark.parametrize("accept_encoding", ["br", "gzip"])
+async def test_large_json_responses_are_compressed(client, accept_encoding):
+    response = await client.get("/large", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.headers["content-encoding"] == accept_encoding
+    assert int(response.headers["content-length"]) < len(json.dumps(LARGE_BODY)) / 4
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == LARGE_BODY
+
+
+async def test_gzip_bodies_are_reproducible(client):
+    bodies = []
+    for _ in range(2):
+        async with client.stream("GET", "/large", headers={"Accept-Encoding": "gzip"}) as response:
+            bodies.append(b"".join([chunk async for chunk in response.aiter_raw()]))
+
+    # The gzip header would otherwise hold the time of compression
+    assert bodies[0] == bodies[1]
+    assert json.loads(gzip.decompress(bodies[0])) == LARGE_BODY
+
+
+@pytest.mark.parametrize("under, content_encoding", [(0, "br"), (1, None)])
+async def test_only_responses_from_the_size_threshold_are_compressed(client, under, content_encoding):
+    response = await client.get("/threshold", params={"under": under}, headers={"Accept-Encoding": "br"})
+
+    assert len(response.content) == COMPRESSION_MIN_BYTES - under
+    assert response.headers.get("content-encoding") == content_encoding
+
+
+@pytest.mark.parametrize("path", ["/small", "/image", "/streamed"])
+async def test_small_binary_and_streamed_responses_are_sent_as_they_are(client, path):
+    async with client.stream("GET", path, headers={"Accept-Encoding": "br, gzip"}) as response:
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    if path == "/streamed":
+        assert raw.count(b"\n") == len(LARGE_BODY["places"])
+
+
+async def test_etags_of_compressed_responses_are_weak(client):
+    response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == 'W/"trip-1"'
+
+    response = await client.get("/weak", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == 'W/"trip-1"'
+
+    response = await client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert response.headers["etag"] == '"trip-1"'
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,56 @@
+import uuid
+from argparse import Namespace
+
+import pytest
+
+from app.routers import photos
+from scripts.seed_data import seed_trip, seed_users
+
+
+@pytest.mark.anyio
+async def test_photos_redirect_to_the_google_url(client, google, monkeypatch):
+    photo_url = photos.get_photo_url("places/mock_1/photos/photo_0", 800)
+    assert photo_url == "/api/photos/places/mock_1/photos/photo_0?size=800"
+
+    response = await client.get(photo_url)
+    assert response.status_code == 302
+    assert response.headers["location"] == "https://example.com/mock-photos/places/mock_1/photos/photo_0.jpg"
+    assert response.headers["cache-control"] == f"max-age={int(photos.PHOTO_URL_CACHE_TTL)}"
+
+    async def fail_get_photo(*args):
+        raise AssertionError("The cached photo URL was fetched again")
+
+    monkeypatch.setattr(photos, "get_photo", fail_get_photo)
+
+    response = await client.get(photo_url)
+    assert response.headers["location"] == "https://example.com/mock-photos/places/mock_1/photos/photo_0.jpg"
+
+
+@pytest.mark.anyio
+async def test_only_place_photos_are_served(client):
+    response = await client.get("/api/photos/places:searchNearby")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_planning_details_serve_photo_urls_that_do_not_expire(client, google, database):
+    prefix = f"photo_test_{uuid.uuid4().hex[:8]}"
+    args = Namespace(members=2, days=2, complete_days=1, places=3, voted_fraction=0)
+
+    with database.begin() as connection:
+        usernames = seed_users(connection, prefix, args.members, "password")
+        trip = seed_trip(connection, prefix, 1, usernames, args)
+
+    params = {"trip_id": trip["trip_id"], "username": usernames[0], "include": "activities,candidates,photos"}
+    response = await client.get("/api/planning-details/", params=params)
+    assert response.status_code == 200
+
+    details = response.json()
+    complete_day, voting_day = details["trip_day"]
+    photo_urls = [details["photo"]] + [
+        place["photo"] for place in complete_day["voted_dests"] + voting_day["suitableDests"]
+    ]
+
+    assert len(photo_urls) == 1 + 3 + 3
+    assert all(url.startswith("/api/photos/places/") for url in photo_urls)
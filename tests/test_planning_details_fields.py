@@ -0,0 +1,75 @@
+import uuid
+from argparse import Namespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.planning_details import PLANNING_DETAILS_PARTS, PlanningDetailsFields, parse_planning_details_fields
+from scripts.seed_data import seed_trip, seed_users
+
+
+@pytest.mark.parametrize("days, ranges", [
+    (None, None),
+    ("", ()),
+    ("2", ((2, 2),)),
+    ("1,3-5", ((1, 1), (3, 5))),
+    (" 3-5 , 1 ,", ((1, 1), (3, 5))),
+    # Overlapping and adjacent ranges are merged
+    ("4-6,1-2,3", ((1, 6),)),
+    ("1-3,2-5,8,8", ((1, 5), (8, 8))),
+])
+def test_day_ranges_are_sorted_and_merged(days, ranges):
+    assert parse_planning_details_fields(days, None).days == ranges
+
+
+@pytest.mark.parametrize("days", ["x", "1-x", "1,,two", "-2", "1.5", "0", "2-1", "0-3"])
+def test_invalid_day_ranges_are_rejected(days):
+    with pytest.raises(HTTPException) as error:
+        parse_planning_details_fields(days, None)
+
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("include, parts", [
+    (None, set(PLANNING_DETAILS_PARTS)),
+    ("", set()),
+    ("photos", {"photos"}),
+    (" activities , distances ,", {"activities", "distances"}),
+])
+def test_included_parts_are_selected(include, parts):
+    assert parse_planning_details_fields(None, include).include == parts
+
+
+def test_unknown_parts_are_rejected():
+    with pytest.raises(HTTPException) as error:
+        parse_planning_details_fields(None, "photos,votes,weather")
+
+    assert error.value.status_code == 400
+    assert error.value.detail == "Unknown include values: votes, weather"
+
+
+def test_equivalent_selections_share_a_cache_key():
+    fields = parse_planning_details_fields("3,1-2", "distances,photos")
+
+    assert fields.key == parse_planning_details_fields("1-3", "photos,distances").key
+    assert fields.key != parse_planning_details_fields("1-3", "photos").key
+    assert fields.key != PlanningDetailsFields().key
+    assert fields.last_day == 3
+    assert [day for day in range(1, 6) if fields.has_day(day)] == [1, 2, 3]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("days, status_code", [("1-2", 200), ("2-3", 400), ("4", 400)])
+async def test_days_past_the_end_of_the_trip_are_rejected(client, google, database, days, status_code):
+    prefix = f"fields_test_{uuid.uuid4().hex[:8]}"
+    args = Namespace(members=2, days=2, complete_days=0, places=2, voted_fraction=0)
+
+    with database.begin() as connection:
+        usernames = seed_users(connection, prefix, args.members, "password")
+        trip = seed_trip(connection, prefix, 1, usernames, args)
+
+    response = await client.get("/api/planning-details/", params={
+        "trip_id": trip["trip_id"], "username": usernames[0], "days": days, "include": ""
+    })
+
+    assert response.status_code == status_code
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import uuid
+from argparse import Namespace
+
+import pytest
+
+from app.routers import planning_details
+from scripts.seed_data import seed_trip, seed_users
+
+DAYS = 6
+
+
+@pytest.fixture
+def stream_trip(database):
+    """
+    Seed a trip of two members with planned days, a day being voted on and pending days.
+    """
+    prefix = f"stream_test_{uuid.uuid4().hex[:8]}"
+    args = Namespace(members=2, days=DAYS, complete_days=3, places=3, voted_fraction=0)
+
+    with database.begin() as connection:
+        usernames = seed_users(connection, prefix, args.members, "password")
+        trip = seed_trip(connection, prefix, 1, usernames, args)
+
+    return trip
+
+
+@pytest.fixture
+def day_calls(monkeypatch):
+    """
+    Make later days finish first, so the records are only in order if the stream waits for the earlier ones, and
+    record how many days are assembled at the same time.
+    """
+    calls = {"running": 0, "max_running": 0, "fail_day": None}
+    get_trip_day_details = planning_details.get_trip_day_details
+
+    async def get_trip_day_details_slowly(trip_day, *args):
+        calls["running"] += 1
+        calls["max_running"] = max(calls["max_running"], calls["running"])
+        try:
+            await asyncio.sleep((DAYS - trip_day.day_number) / 100)
+            if trip_day.day_number == calls["fail_day"]:
+                raise RuntimeError(f"Day {trip_day.day_number} failed")
+            return await get_trip_day_details(trip_day, *args)
+        finally:
+            calls["running"] -= 1
+
+    monkeypatch.setattr(planning_details, "PLANNING_DAY_CONCURRENCY", 2)
+    monkeypatch.setattr(planning_details, "get_trip_day_details", get_trip_day_details_slowly)
+
+    return calls
+
+
+async def get_records(client, trip):
+    params = {"trip_id": trip["trip_id"], "username": trip["members"][0], "stream": "true"}
+
+    async with client.stream("GET", "/api/planning-details/", params=params) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.headers["cache-control"] == "no-store"
+
+        return [json.loads(line) async for line in response.aiter_lines() if line]
+
+
+@pytest.mark.anyio
+async def test_days_are_streamed_in_order(client, google, stream_trip, day_calls):
+    records = await get_records(client, stream_trip)
+
+    assert [record["type"] for record in records] == ["trip"] + ["day"] * DAYS
+    assert [record["day"] for record in records[1:]] == list(range(1, DAYS + 1))
+    assert [record["status"] for record in records[1:4]] == ["complete"] * 3
+    assert day_calls["max_running"] == 2
+
+    # The streamed records hold the same details as the JSON response
+    response = await client.get("/api/planning-details/", params={
+        "trip_id": stream_trip["trip_id"], "username": stream_trip["members"][0]
+    })
+    details = response.json()
+    trip_days = details.pop("trip_day")
+
+    assert records[0] == {"type": "trip", **details}
+    # Without the travel legs, whose estimates may have been refined in the meantime
+    for trip_day in trip_days + records[1:]:
+        trip_day.pop("distance", None)
+    assert [{"type": "day", **trip_day} for trip_day in trip_days] == records[1:]
+
+
+@pytest.mark.anyio
+async def test_a_failing_day_ends_the_stream_with_an_error(client, google, stream_trip, day_calls):
+    day_calls["fail_day"] = 3
+
+    records = await get_records(client, stream_trip)
+
+    assert [record["type"] for record in records] == ["trip", "day", "day", "error"]
+    assert [record["day"] for record in records[1:3]] == [1, 2]
+    # The days after the failing one are cancelled
+    await asyncio.sleep(0)
+    assert day_calls["running"] == 0
@@ -0,0 +1,108 @@
+"""
+Every endpoint with a query budget, called with the budgets raising as set by conftest. A request running more
+statements than its endpoint's budget fails with QueryBudgetExceeded.
+"""
+import uuid
+from argparse import Namespace
+from datetime import date, timedelta
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+
+from app.database.connection import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from app.models import RecommendedPlaces, TripDays, User
+from app.routers import auth
+from conftest import IS_POSTGRESQL
+from scripts.mock_google import PLACE_TYPES
+from scripts.seed_data import seed_trip, seed_users
+from test_auth import get_authorization
+
+
+@pytest.fixture(params=[False, True], ids=["open", "require_auth"])
+def require_auth(request, monkeypatch):
+    """
+    Run the test with and without REQUIRE_AUTH, which checks the token and the trip members in the same requests.
+    """
+    monkeypatch.setattr(auth, "REQUIRE_AUTH", request.param)
+    return request.param
+
+
+@pytest.fixture
+def budget_trip(database):
+    """
+    Seed a trip of three members with a planned day, a day being voted on and a pending day.
+    """
+    prefix = f"budget_test_{uuid.uuid4().hex[:8]}"
+    args = Namespace(members=3, days=3, complete_days=1, places=3, voted_fraction=0)
+
+    with database.begin() as connection:
+        usernames = seed_users(connection, prefix, args.members, "password")
+        # Shared preferences, so the planned day always has recommendations for the next one
+        connection.execute(User.__table__.update().where(User.username.in_(usernames)).values(
+            preferences=",".join(PLACE_TYPES[:4])
+        ))
+        trip = seed_trip(connection, prefix, 1, usernames, args)
+        trip["dest_ids"] = connection.execute(
+            select(RecommendedPlaces.dest_id)
+            .join(TripDays, TripDays.trip_day_id == RecommendedPlaces.trip_day_id)
+            .where(TripDays.trip_id == trip["trip_id"], TripDays.day_number == 2)
+        ).scalars().all()
+
+    trip["prefix"] = prefix
+    return trip
+
+
+@pytest.mark.anyio
+async def test_read_endpoints_stay_within_their_budgets(client, google, budget_trip, require_auth):
+    trip = budget_trip
+    username = trip["members"][0]
+    headers = get_authorization(username)
+    trip_params = {"trip_id": trip["trip_id"], "username": username}
+
+    for params in ({}, {"days": "2"}, {"include": "activities,distances"}, {"stream": "true"}):
+        response = await client.get("/api/planning-details/", params={**trip_params, **params}, headers=headers)
+        assert response.status_code == 200
+
+    response = await client.get("/api/vote/vote-details", params={**trip_params, "day_number": 2}, headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()["destinations"]) == 3
+
+    response = await client.get("/api/vote/vote-status", params={"trip_id": trip["trip_id"], "day_number": 2},
+                                headers=headers)
+    assert response.status_code == 200
+
+    response = await client.get("/api/my-trips/", params={"username": username}, headers=headers)
+    assert response.status_code == 200
+
+    response = await client.get("/api/get-users-data/", params={"username": username, "q": trip["prefix"]},
+                                headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
+@pytest.mark.anyio
+async def test_write_endpoints_stay_within_their_budgets(client, google, budget_trip, require_auth):
+    trip = budget_trip
+
+    for member in trip["members"]:
+        response = await client.patch("/api/vote/submit-vote", headers=get_authorization(member), json={
+            "trip_id": trip["trip_id"], "trip_day_number": 2, "voted_person": member,
+            "scores": {dest_id: 5 for dest_id in trip["dest_ids"]}
+        })
+        assert response.status_code == 200
+
+    owner, *companions = trip["members"][::-1]
+    start_date = date.today() + timedelta(days=30)
+    response = await client.post("/api/create-new-trip/", headers=get_authorization(owner), json={
+        "owner": owner, "trip_name": "Budget trip", "dest_id": "mock_13.7563_100.5018_0", "dest_name": "Bangkok",
+        "dest_lat": 13.7563, "dest_lon": 100.5018, "start_date": str(start_date),
+        "end_date": str(start_date + timedelta(days=2)), "duration": 3, "companion": ",".join(companions)
+    })
+    assert response.status_code == 200
+
+
+def test_pool_size_is_exported_from_the_engine_options():
+    max_connections = REGISTRY.get_sample_value("db_pool_connections_max", {"engine": "primary_async"})
+
+    assert max_connections == (DB_POOL_SIZE + DB_MAX_OVERFLOW if IS_POSTGRESQL else None)
@@ -0,0 +1,89 @@
+import logging
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import routing
+from app.database.routing import RoutingSession, get_replica, record_write
+
+pytestmark = pytest.mark.anyio
+
+metadata = MetaData()
+
+# Single row naming the database it is read from
+servers = Table("servers", metadata, Column("server_id", Integer, primary_key=True), Column("name", String))
+
+
+@pytest.fixture
+async def engines(tmp_path, monkeypatch):
+    """
+    SQLite stand-ins of the primary and of a replica, used as the replicas of the app.
+    """
+    engines = {}
+    for name in ("primary", "replica"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+        async with engine.begin() as connection:
+            await connection.run_sync(metadata.create_all)
+            await connection.execute(insert(servers), {"server_id": 1, "name": name})
+        engines[name] = engine
+
+    monkeypatch.setattr(routing, "replica_engines", [engines["replica"]])
+    monkeypatch.setattr(routing, "replica_lags", {})
+
+    yield engines
+
+    for engine in engines.values():
+        await engine.dispose()
+
+
+def open_session(engines, replica):
+    session_factory = async_sessionmaker(engines["primary"], sync_session_class=RoutingSession, autoflush=False,
+                                         expire_on_commit=False)
+    return session_factory(info={"replica": replica})
+
+
+async def read_server(db) -> str:
+    return await db.scalar(select(servers.c.name).where(servers.c.server_id == 1))
+
+
+async def test_reads_go_to_the_replica(engines):
+    async with open_session(engines, engines["replica"]) as db:
+        assert await read_server(db) == "replica"
+
+
+async def test_sessions_without_a_replica_read_the_primary(engines):
+    async with open_session(engines, None) as db:
+        assert await read_server(db) == "primary"
+
+
+async def test_writes_pin_the_session_to_the_primary(engines):
+    async with open_session(engines, engines["replica"]) as db:
+        assert await read_server(db) == "replica"
+
+        await db.execute(update(servers).where(servers.c.server_id == 1).values(name="primary, updated"))
+
+        # The session reads its own uncommitted write, from the primary
+        assert await read_server(db) == "primary, updated"
+
+
+async def test_recently_written_data_is_read_from_the_primary(engines):
+    await record_write(("trip", 1001))
+
+    assert await get_replica(("trip", 1001)) is None
+    assert await get_replica(("trip", 1002)) is engines["replica"]
+
+    async with open_session(engines, await get_replica(("trip", 1001))) as db:
+        assert await read_server(db) == "primary"
+
+
+async def test_unavailable_replicas_are_skipped(monkeypatch, caplog):
+    unavailable = create_async_engine("postgresql+asyncpg://user@127.0.0.1:1/db")
+    monkeypatch.setattr(routing, "replica_engines", [unavailable])
+    monkeypatch.setattr(routing, "replica_lags", {})
+
+    with caplog.at_level(logging.WARNING, logger=routing.__name__):
+        assert await get_replica() is None
+
+    assert "is unavailable" in caplog.text
+    await unavailable.dispose()
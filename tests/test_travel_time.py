@@ -0,0 +1,80 @@
+import asyncio
+import math
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.routers import planning_details, travel_time
+from app.routers.travel_time import EARTH_RADIUS_KM, TRAVEL_SPEED_KMH, estimate_legs, haversine_km
+
+# Great-circle distance of one degree along a meridian
+DEGREE_KM = EARTH_RADIUS_KM * math.pi / 180
+
+
+@pytest.mark.parametrize("from_lat, from_lon, to_lat, to_lon, distance_km", [
+    (0, 0, 0, 0, 0),
+    (0, 0, 1, 0, DEGREE_KM),
+    (0, 0, 0, 1, DEGREE_KM),
+    # Meridians get closer towards the poles
+    (60, 0, 60, 1, 55.5),
+    (0, 0, 0, 180, DEGREE_KM * 180),
+    (13.7563, 100.5018, 18.7883, 98.9853, 582.5),
+])
+def test_haversine_is_the_great_circle_distance(from_lat, from_lon, to_lat, to_lon, distance_km):
+    assert haversine_km(from_lat, from_lon, to_lat, to_lon) == pytest.approx(distance_km, abs=0.1)
+
+
+@pytest.mark.parametrize("travel_mode", TRAVEL_SPEED_KMH)
+def test_legs_are_estimated_at_the_speed_of_the_travel_mode(travel_mode):
+    (distance_km, duration_min), = estimate_legs([0, 1], [0, 0], travel_mode)
+
+    assert distance_km == pytest.approx(DEGREE_KM * travel_time.TRAVEL_DETOUR_FACTOR, abs=0.001)
+    assert duration_min == pytest.approx(distance_km / TRAVEL_SPEED_KMH[travel_mode] * 60, abs=0.1)
+
+
+@pytest.mark.parametrize("detour_factor", [1.0, 1.3, 2.0])
+def test_distances_are_scaled_by_the_detour_factor(monkeypatch, detour_factor):
+    monkeypatch.setattr(travel_time, "TRAVEL_DETOUR_FACTOR", detour_factor)
+
+    legs = estimate_legs([0, 1, 1], [0, 0, 1], "WALK")
+
+    assert [distance_km for distance_km, _ in legs] == pytest.approx([
+        DEGREE_KM * detour_factor, haversine_km(1, 0, 1, 1) * detour_factor
+    ], abs=0.001)
+
+
+@pytest.mark.parametrize("lats, lons, known_legs", [
+    ([], [], []),
+    ([0], [0], []),
+    ([None, 1], [0, 0], [False]),
+    ([0, None, 1, 2], [0, 0, 0, 0], [False, False, True]),
+    ([0, 1, 2], [0, None, 0], [False, False]),
+])
+def test_unknown_locations_only_drop_their_legs(lats, lons, known_legs):
+    legs = estimate_legs(lats, lons)
+
+    assert [leg != (None, None) for leg in legs] == known_legs
+    assert all(distance_km > 0 for distance_km, _ in legs if distance_km is not None)
+
+
+@pytest.mark.anyio
+async def test_estimates_are_replaced_once_the_routes_are_refined(google, monkeypatch):
+    monkeypatch.setattr(planning_details, "TRAVEL_TIME_STRATEGY", "estimate")
+    activities = [
+        SimpleNamespace(activity_dest_id=f"travel_test_{uuid.uuid4().hex}", activity_dest_name=f"Stop {n}",
+                        activity_dest_lat=13.75 + n / 100, activity_dest_lon=100.5)
+        for n in range(3)
+    ]
+
+    legs = await planning_details.get_distance_details(activities)
+    assert [leg["estimated"] for leg in legs] == [True, True]
+
+    await asyncio.gather(*planning_details.route_refinements.values())
+
+    refined_legs = await planning_details.get_distance_details(activities)
+    assert [leg["estimated"] for leg in refined_legs] == [False, False]
+
+    for leg in refined_legs:
+        route = await planning_details.route_cache.aget((leg["fromID"], leg["toID"], planning_details.TRAVEL_MODE))
+        assert (leg["distance_km"], leg["duration_min"]) == route
@@ -0,0 +1,110 @@
+import sys
+import uuid
+from urllib.parse import unquote
+
+import pytest
+from sqlalchemy import insert
+
+from app.models import User
+from app.routers.users_data import get_prefix_upper_bound
+
+MAX_CHAR = chr(sys.maxunicode)
+
+
+@pytest.fixture
+def directory(database):
+    """
+    Create users sharing a new prefix, which searches are limited to.
+    """
+    prefix = f"ud{uuid.uuid4().hex[:8]}"
+
+    def add_users(*names: str):
+        with database.begin() as connection:
+            connection.execute(insert(User), [
+                {"username": prefix + name, "email": f"{uuid.uuid4().hex}@example.com", "first_name": "Directory",
+                 "last_name": name, "hashed_password": "not a hash", "preferences": "museum,park"}
+                for name in names
+            ])
+
+        return [prefix + name for name in names]
+
+    return prefix, add_users
+
+
+async def get_users(client, username: str, **params):
+    response = await client.get("/api/get-users-data/", params={"username": username, **params})
+    assert response.status_code == 200
+
+    return [user["name"] for user in response.json()], response.headers.get("x-next-cursor")
+
+
+@pytest.mark.parametrize("prefix, upper_bound", [
+    ("abc", "abd"),
+    ("a" + MAX_CHAR, "b"),
+    ("ab" + MAX_CHAR * 2, "ac"),
+    (MAX_CHAR, None),
+    # The surrogates are skipped
+    ("a\ud7ff", "a\ue000"),
+    ("\u00e9", "\u00ea"),
+])
+def test_prefix_upper_bound_is_the_next_string_in_byte_order(prefix, upper_bound):
+    assert get_prefix_upper_bound(prefix) == upper_bound
+    if upper_bound is not None:
+        assert prefix.encode() < upper_bound.encode()
+        assert (prefix + MAX_CHAR * 3).encode() < upper_bound.encode()
+
+
+@pytest.mark.anyio
+async def test_prefixes_match_a_byte_wise_range(client, directory):
+    prefix, add_users = directory
+    alice, zed, bob, max_user, after_max = add_users("_alice", "_Zed", "_bob", "_z" + MAX_CHAR + "x", "_{")
+
+    # Upper case letters come before lower case ones in byte-wise order
+    assert (await get_users(client, alice, q=prefix + "_")) == ([zed, bob, max_user, after_max], None)
+    assert (await get_users(client, alice, q=prefix + "_b")) == ([bob], None)
+    # The prefix ends with the last code point, its range ends after the next character of the prefix
+    assert (await get_users(client, alice, q=prefix + "_z" + MAX_CHAR)) == ([max_user], None)
+
+
+@pytest.mark.anyio
+async def test_wildcards_are_searched_as_text(client, directory):
+    prefix, add_users = directory
+    # Not a hex digit, so the searches cannot match across the end of the prefix
+    alice, percent, underscore, other = add_users("_alice", "_q%q", "_q_q", "_qxq")
+
+    assert (await get_users(client, alice, q="q%q", match="substring")) == ([percent], None)
+    assert (await get_users(client, alice, q="q_q", match="substring")) == ([underscore], None)
+    assert (await get_users(client, alice, q=f"{prefix}_q", match="substring"))[0] == [percent, underscore, other]
+
+
+@pytest.mark.anyio
+async def test_pages_follow_the_next_cursor_without_the_requester(client, directory):
+    prefix, add_users = directory
+    usernames = add_users(*(f"_{n}" for n in range(7)))
+    requester = usernames[1]
+
+    pages, cursor = [], None
+    while True:
+        params = {"q": prefix, "limit": 3, **({"cursor": unquote(cursor)} if cursor else {})}
+        users, cursor = await get_users(client, requester, **params)
+        pages.append(users)
+        if cursor is None:
+            break
+
+    # The requester is dropped from the first page, which still holds a full page thanks to the extra users fetched
+    assert pages == [[usernames[0], usernames[2], usernames[3]], [usernames[4], usernames[5], usernames[6]]]
+
+
+@pytest.mark.anyio
+async def test_first_pages_are_shared_until_they_expire(client, directory):
+    prefix, add_users = directory
+    first, second = add_users("_a", "_b")
+
+    assert (await get_users(client, first, q=prefix)) == ([second], None)
+
+    later, = add_users("_c")
+
+    # The cached page is shared by every user, without the one requesting it
+    assert (await get_users(client, second, q=prefix)) == ([first], None)
+    # Other pages are not cached
+    assert (await get_users(client, first, q=prefix, cursor=first)) == ([second, later], None)
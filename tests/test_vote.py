@@ -0,0 +1,133 @@
+import asyncio
+import os
+import subprocess
+import sys
+import uuid
+from argparse import Namespace
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models import TripDays, RecommendedPlaces, VoteScores, Activities, User
+from app.routers import vote
+from conftest import get_free_port, requires_postgresql, wait_for_port
+from scripts.check_concurrent_votes import check_concurrent_votes, check_trip
+from scripts.mock_google import PLACE_TYPES
+from scripts.seed_data import seed_trip, seed_users
+
+
+@pytest.fixture
+def seed_voting_trip(database):
+    """
+    Seed trips whose members have not voted on their first day yet.
+
+    They are left for the database fixture to drop: SQLite would reuse the IDs of deleted trips, which the caches of
+    the app still hold. The members share their preferences, so the next day always has recommendations.
+    """
+    def seed(members: int):
+        prefix = f"vote_test_{uuid.uuid4().hex[:8]}"
+        args = Namespace(members=members, days=2, complete_days=0, places=3, voted_fraction=0)
+
+        with database.begin() as connection:
+            usernames = seed_users(connection, prefix, args.members, "password")
+            connection.execute(
+                update(User).where(User.username.in_(usernames)).values(preferences=",".join(PLACE_TYPES[:4]))
+            )
+            trip = seed_trip(connection, prefix, 1, usernames, args)
+            trip["dest_ids"] = connection.execute(
+                select(RecommendedPlaces.dest_id)
+                .join(TripDays, TripDays.trip_day_id == RecommendedPlaces.trip_day_id)
+                .where(TripDays.trip_id == trip["trip_id"], TripDays.day_number == 1)
+            ).scalars().all()
+
+        return trip
+
+    return seed
+
+
+def get_vote_payload(trip, member):
+    return {"trip_id": trip["trip_id"], "trip_day_number": 1, "voted_person": member,
+            "scores": {dest_id: 5 for dest_id in trip["dest_ids"]}}
+
+
+@pytest.mark.anyio
+async def test_failed_plan_reopens_the_day_for_voting(client, google, seed_voting_trip, database, monkeypatch):
+    trip = seed_voting_trip(members=2)
+    first, last = trip["members"]
+
+    response = await client.patch("/api/vote/submit-vote", json=get_vote_payload(trip, first))
+    assert response.status_code == 200
+
+    async def fail(dest_id_lst):
+        raise RuntimeError("Google Places API is unavailable")
+
+    monkeypatch.setattr(vote, "get_destinations", fail)
+
+    response = await client.patch("/api/vote/submit-vote", json=get_vote_payload(trip, last))
+    assert response.status_code == 500
+
+    with database.connect() as connection:
+        days = dict(connection.execute(
+            select(TripDays.day_number, TripDays.vote_status).where(TripDays.trip_id == trip["trip_id"])
+        ).all())
+        voted = dict(connection.execute(
+            select(VoteScores.username, VoteScores.is_voted)
+            .join(RecommendedPlaces, RecommendedPlaces.recommended_place_id == VoteScores.recommended_place_id)
+            .where(RecommendedPlaces.trip_id == trip["trip_id"])
+        ).all())
+        activities = connection.execute(
+            select(Activities.activity_id)
+            .join(TripDays, TripDays.trip_day_id == Activities.trip_day_id)
+            .where(TripDays.trip_id == trip["trip_id"])
+        ).all()
+
+    # The votes are kept and the day is reopened, so submitting a vote again plans it
+    assert days == {1: "voting", 2: "pending"}
+    assert voted == {first: True, last: True}
+    assert activities == []
+
+    monkeypatch.undo()
+
+    response = await client.patch("/api/vote/submit-vote", json=get_vote_payload(trip, last))
+    assert response.status_code == 200
+
+    with database.connect() as connection:
+        assert check_trip(connection, trip["trip_id"]) == []
+
+
+@pytest.mark.anyio
+async def test_unknown_trip_day_is_not_found(client):
+    response = await client.patch("/api/vote/submit-vote", json={
+        "trip_id": 0, "trip_day_number": 1, "voted_person": "nobody", "scores": {}
+    })
+
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_concurrent_final_votes_plan_the_day_once(client, google, seed_voting_trip, database):
+    trip = seed_voting_trip(members=6)
+
+    responses = await asyncio.gather(*(
+        client.patch("/api/vote/submit-vote", json=get_vote_payload(trip, member)) for member in trip["members"]
+    ))
+
+    assert [response.status_code for response in responses] == [200] * len(trip["members"])
+    with database.connect() as connection:
+        assert check_trip(connection, trip["trip_id"]) == []
+
+
+# Votes submitted to several workers, which wait for each other on the row lock of the day
+@requires_postgresql
+def test_concurrent_final_votes_across_workers_plan_the_day_once(google, database):
+    app_port = get_free_port()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+                               "--workers", "2", "--log-level", "warning"], env=os.environ)
+
+    try:
+        wait_for_port(app_port)
+
+        assert check_concurrent_votes(f"http://127.0.0.1:{app_port}", members=6, rounds=2) == []
+    finally:
+        server.terminate()
+        server.wait(timeout=30)